@@ -1,29 +1,8 @@
-from pickhardtpayments.pickhardtpayments import *
+from pickhardtpayments.pickhardtpayments.GraphSnapshot import load_channel_graph
+from pickhardtpayments.pickhardtpayments.OracleLightningNetwork import OracleLightningNetwork
 
 
-def remove_channels_with_min_fee(_graph: ChannelGraph, base_threshold=0):
-    ebunch = []
-    for edge in _graph.network.edges:
-        ch = _graph.get_channel(edge[1], edge[0], edge[2])
-        if ch and ch.base_fee > base_threshold:
-            ebunch.append((edge[0], edge[1], edge[2]))
-    _graph.network.remove_edges_from(ebunch)
-    return _graph
-
-
-def only_channels_with_return_channels(_graph: ChannelGraph):
-    ebunch = []
-    for edge in _graph.network.edges:
-        return_edge = _graph.get_channel(edge[1], edge[0], edge[2])
-        if not return_edge:
-            ebunch.append((edge[0], edge[1], edge[2]))
-    _graph.network.remove_edges_from(ebunch)
-    return _graph
-
-
-graph = ChannelGraph("listchannels20230114.json")
-graph = remove_channels_with_min_fee(graph, 0)
-graph = only_channels_with_return_channels(graph)
+graph = load_channel_graph("listchannels20230114.json", base_threshold=0, return_channels_only=True)
 
 oracle_lightning_network = OracleLightningNetwork(graph)
 
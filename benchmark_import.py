@@ -0,0 +1,82 @@
+"""
+Measures the cold import time of the simulation modules and checks that importing them has no side effects.
+
+Every module is imported in a fresh interpreter, in an empty working directory, several times. The median import
+time has to stay within the budget, the import must not add handlers to the root logger or change its level, must not
+create files and must not load the solver and graph backends (OR-Tools, networkx), which are only imported when they
+are first used.
+
+    python benchmark_import.py [--budget 0.25] [--repeat 5]
+
+The script exits with status 1 if a check fails.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+MODULES = ["pickhardtpayments.pickhardtpayments.Payment",
+           "pickhardtpayments.pickhardtpayments.SyncSimulatedPaymentSession",
+           "pickhardtpayments.pickhardtpayments.Simulation"]
+LAZY_PACKAGES = ("networkx", "ortools")
+
+PROBE = """
+import json, logging, sys, time
+level = logging.getLogger().level
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+root = logging.getLogger()
+print(json.dumps({{"seconds": seconds, "handlers": len(root.handlers), "level_changed": root.level != level,
+                   "lazy_loaded": sorted({{name.split(".")[0] for name in sys.modules}} & set({lazy}))}}))
+"""
+
+
+def measure(module: str, repeat: int) -> dict:
+    """
+    imports `module` `repeat` times in a fresh interpreter and returns the median import time and the side effects
+    """
+    environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+                       PYTHONDONTWRITEBYTECODE="1")
+    times = []
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, "-c", PROBE.format(module=module, lazy=list(LAZY_PACKAGES))],
+                                    cwd=directory, env=environment, capture_output=True, text=True, check=True)
+            result = json.loads(output.stdout)
+            times.append(result["seconds"])
+        result["files"] = os.listdir(directory)
+    result["seconds"] = statistics.median(times)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=0.25, help="maximal median import time in seconds")
+    parser.add_argument("--repeat", type=int, default=5, help="number of imports per module")
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        result = measure(module, args.repeat)
+        problems = []
+        if result["seconds"] > args.budget:
+            problems.append("over budget of {:.0f} ms".format(args.budget * 1000))
+        if result["handlers"]:
+            problems.append("adds {} handler(s) to the root logger".format(result["handlers"]))
+        if result["level_changed"]:
+            problems.append("changes the level of the root logger")
+        if result["lazy_loaded"]:
+            problems.append("loads {}".format(", ".join(result["lazy_loaded"])))
+        if result["files"]:
+            problems.append("creates {}".format(", ".join(result["files"])))
+        failed |= bool(problems)
+        print("{:<70} {:>7.1f} ms  {}".format(module, result["seconds"] * 1000, "; ".join(problems) or "ok"))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
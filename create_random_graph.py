@@ -1,44 +1,14 @@
-import logging
 import os
 import random
 import networkx as nx
 
-from pickhardtpayments.pickhardtpayments import *
-
-
-def remove_channels_with_min_fee(_graph: ChannelGraph, base_threshold=0):
-    ebunch = []
-    for edge in _graph.network.edges:
-        ch = _graph.get_channel(edge[1], edge[0], edge[2])
-        if ch and ch.base_fee > base_threshold:
-            ebunch.append((edge[0], edge[1], edge[2]))
-    _graph.network.remove_edges_from(ebunch)
-    if len(ebunch) == 0:
-        logging.info("no channels with base fee.")
-    else:
-        logging.info("channels with base fee removed.")
-    return _graph
-
-
-def only_channels_with_return_channels(_graph: ChannelGraph):
-    ebunch = []
-    for edge in _graph.network.edges:
-        return_edge = _graph.get_channel(edge[1], edge[0], edge[2])
-        if not return_edge:
-            ebunch.append((edge[0], edge[1], edge[2]))
-    _graph.network.remove_edges_from(ebunch)
-    if len(ebunch) == 0:
-        logging.info("channel graph only had channels in both directions.")
-    else:
-        logging.info("channel graph had unannounced channels.")
-    return _graph
+from pickhardtpayments.pickhardtpayments.GraphSnapshot import load_channel_graph
+from pickhardtpayments.pickhardtpayments.OracleLightningNetwork import OracleLightningNetwork
 
 
 seed = 12345
 
-graph = ChannelGraph("listchannels20230114.json")
-graph = remove_channels_with_min_fee(graph, 0)
-graph = only_channels_with_return_channels(graph)
+graph = load_channel_graph("listchannels20230114.json", base_threshold=0, return_channels_only=True)
 oln = OracleLightningNetwork(graph)
 print("original edges:", len(oln.network.edges))
 number_of_vertices = len(oln.network.nodes)
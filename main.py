@@ -2,43 +2,18 @@ import json
 import logging
 import ndjson
 import random
-import networkx as nx
+import sys
 
-from pickhardtpayments.pickhardtpayments.ChannelGraph import ChannelGraph
-from pickhardtpayments.pickhardtpayments.OracleLightningNetwork import OracleLightningNetwork
-from pickhardtpayments.pickhardtpayments.SyncSimulatedPaymentSession import SyncSimulatedPaymentSession
-from pickhardtpayments.pickhardtpayments.UncertaintyNetwork import UncertaintyNetwork
+from pickhardtpayments.pickhardtpayments.BetweennessCentrality import central_nodes as get_central_nodes
+from pickhardtpayments.pickhardtpayments.GraphSnapshot import load_channel_graph
+from pickhardtpayments.pickhardtpayments.LoggingSetup import configure_logging
+from pickhardtpayments.pickhardtpayments.PaymentSetRunner import DELIVERY_METHODS, SEQUENTIAL
+from pickhardtpayments.pickhardtpayments.ReachabilityIndex import ReachabilityIndex
+from pickhardtpayments.pickhardtpayments.Simulation import Simulation, methods_from_config
+from pickhardtpayments.pickhardtpayments.Tracing import start_tracing, stop_tracing
 
 
 # ===== UTILITY FUNCTIONS FOR GRAPH PREPARATION =====
-def remove_channels_with_min_fee(_graph: ChannelGraph, base_threshold=0):
-    channels_to_remove = []
-    for edge in _graph.network.edges:
-        ch = _graph.get_channel(edge[1], edge[0], edge[2])
-        if ch and ch.base_fee > base_threshold:
-            channels_to_remove.append((edge[0], edge[1], edge[2]))
-    _graph.network.remove_edges_from(channels_to_remove)
-    if len(channels_to_remove) == 0:
-        logging.info("no channels with base fee.")
-    else:
-        logging.info("channels with base fee removed.")
-    return _graph
-
-
-def only_channels_with_return_channels(_graph: ChannelGraph):
-    channels_to_remove = []
-    for edge in _graph.network.edges:
-        return_edge = _graph.get_channel(edge[1], edge[0], edge[2])
-        if not return_edge:
-            channels_to_remove.append((edge[0], edge[1], edge[2]))
-    _graph.network.remove_edges_from(channels_to_remove)
-    if len(channels_to_remove) == 0:
-        logging.info("channel graph only had channels in both directions.")
-    else:
-        logging.info("channel graph had unannounced channels.")
-    return _graph
-
-
 def create_payments(_graph, _number_of_payments, min_amount, max_amount):
     logging.info("## Generating the initial payment pairs")
     random.seed(1337)
@@ -62,27 +37,13 @@ def create_payments(_graph, _number_of_payments, min_amount, max_amount):
 
 def eliminate_payments_between_unconnected_nodes(min_capacity: int):
     logging.info("## Eliminating payments between nodes that are not connected")
-    G = nx.MultiDiGraph()
-    for edge in graph.network.edges(data="channel", keys=True):
-        if edge[3].capacity > min_capacity:
-            G.add_edge(edge[0], edge[1], weight=edge[3].ppm, capacity=edge[3].capacity, short_id=edge[2])
-
-    logging.info(f"Graph has {len(G.edges)} edges")
-    successful_payments = 0
-    failed_payments = 0
-    payment_simulation = []
+    reachability_index = ReachabilityIndex(graph, min_capacity)
+    logging.info(f"Graph has {reachability_index.number_of_components} strongly connected components")
 
     _payment_set = ndjson.load(open(initial_payments_file_name, "r"))
-
-    for payment in _payment_set:
-        try:
-            node_path = nx.dijkstra_path(G, payment["sender"], payment["receiver"])
-        except:
-            failed_payments += 1
-            continue
-        else:
-            successful_payments += 1
-            payment_simulation.append(payment)
+    payment_simulation = reachability_index.filter_payments(_payment_set)
+    successful_payments = len(payment_simulation)
+    failed_payments = len(_payment_set) - successful_payments
 
     ndjson.dump(payment_simulation, open(connected_pairs_file_name, "w"))
     logging.info("{} successful, {} failed.".format(successful_payments, failed_payments))
@@ -90,651 +51,156 @@ def eliminate_payments_between_unconnected_nodes(min_capacity: int):
     logging.warning("eliminating disconnected payment pairs finished.")
 
 
-def write_central_nodes():
-    oracle_lightning_network = OracleLightningNetwork(graph)
-    betweenness_centrality = nx.betweenness_centrality(oracle_lightning_network.network, normalized=True,
-                                                       endpoints=False)
-    sorted_nodes_by_centrality = sorted(betweenness_centrality.items(), key=lambda x: x[1], reverse=True)
-    with open("data/nodes_sorted_by_betweenness_centrality_basecase.json", "w") as write_file:
-        json.dump(sorted_nodes_by_centrality, write_file, indent=4)
-
-
-def get_central_nodes(n: int) -> list:
-    with open('data/nodes_sorted_by_betweenness_centrality_basecase.json', 'r') as f:
-        nodes = json.load(f)
-    return nodes[0:n]
-
+# ===== CONFIGURATION =====
+# the defaults can be overwritten by a json file that is passed as first argument, e.g.
+# {"methods": ["dijkstra_fee", {"method": "pickhardtpay_prob", "mu": 100}], "mode": "sequential", "max_workers": 4}
+config = {
+    "listchannels": "listchannels20230114.json",
+    "payments": "data/1337_initial_payments.ndjson",
+    "number_of_payments": 1,
+    "results_prefix": "random_graph",
+    "delete_n_central_nodes": 0,
+    # betweenness centrality from k sampled pivots (None: exact), cached in data/ for the filtered graph
+    "centrality_pivots": None,
+    "centrality_seed": 1337,
+    # delivery methods, see DELIVERY_METHODS in PaymentSetRunner
+    "methods": ["dijkstra_fee"],
+    # "sequential": the liquidity of the oracle evolves from payment to payment, "independent": every payment
+    # starts from the initial liquidity
+    "mode": "sequential",
+    "max_workers": 1,
+    # distribution of the liquidity of the oracle, e.g. "uniform", {"prior": "bimodal", "scale": 0.1} or "legacy"
+    # for the oracle of earlier results, see LiquidityPriors
+    "liquidity_prior": "uniform",
+    "liquidity_seed": 12345,
+    # solve the min cost flow problems on the region around sender and receiver first, e.g. True or
+    # {"slacks": [1, 4, 16], "report_gap": True}, see CandidateRegion. None solves on the full network.
+    "candidate_region": None,
+    "retained_knowledge": True,
+    # file to write a trace of the payment loop to (NDJSON, see Tracing), None disables tracing
+    "trace_file": None,
+    # log file of the simulation (truncated on start), None only logs to stdout
+    "log_file": "pickhardt_pay.log",
+    # also write the flows of every payment to the columnar flow log data/<results_prefix>_<method>_flow/, see FlowLog
+    "write_flows": False,
+    # the results are synced to disk and checkpointed every sync_every payments. With resume, the runs of a crashed
+    # simulation continue after their last checkpoint, see ResultWriter
+    "sync_every": 100,
+    "resume": False,
+}
+if len(sys.argv) > 1:
+    with open(sys.argv[1]) as config_file:
+        config.update(json.load(config_file))
+configure_logging(config["log_file"])
 
 # ===== SETUP =====
-# Create base graph from gossip in LN
-graph = ChannelGraph("listchannels20230114.json")
-
 # Definition of payment sample for simulation
 min_payment_amount = 10000
 max_payment_amount = 1000000
 payment_pairs = 10000
 
-# remove channels with base fee larger than 0
-graph = remove_channels_with_min_fee(graph, 0)
 
-# only include channels with return channels in graph.
-# Without return channels, no settlement is possible.
+# Create base graph from gossip in LN. The filtered graph is cached in a snapshot next to the gossip file.
+# Channels with base fee larger than 0 are removed while the gossip is read.
+# Only channels with return channels are included in the graph. Without return channels, no settlement is possible.
 # We prefer deletion to assume details about return channel characteristics.
-graph = only_channels_with_return_channels(graph)
+graph = load_channel_graph(config["listchannels"], base_threshold=0, return_channels_only=True)
 # eliminate_payments_between_unconnected_nodes(min_payment_amount)
 
 # Setup area for further graph manipulation, centrality
-delete_n_central_nodes = 0
-central_nodes = get_central_nodes(delete_n_central_nodes)
-oln = OracleLightningNetwork(graph)
-
+delete_n_central_nodes = config["delete_n_central_nodes"]
+central_nodes = []
 if delete_n_central_nodes > 0:
-    for i in range(0, delete_n_central_nodes):
-        oln.network.remove_node(central_nodes[i][0])
-
-# Defining location for data sets.
-initial_payments_file_name = "data/1337_initial_payments.ndjson"
-connected_pairs_file_name = "data/connected_pairs_payments.ndjson"
-
-# == Creation of payment sets for analysis (comment out if working on existing data set) ===
-# create_payments(oln, payment_pairs, min_payment_amount, max_payment_amount)
-
+    central_nodes = get_central_nodes(graph, delete_n_central_nodes, k=config["centrality_pivots"],
+                                      seed=config["centrality_seed"], max_workers=config["max_workers"],
+                                      cache_dir="data")
 logging.info("Setup finished")
 logging_level = logging.ERROR
 logger = logging.getLogger()
 logger.setLevel(logging_level)
 loglevel = "error"
 
-# ===== SIMULATION/LOOP METHODS CALLING SPECIFIC PAYMENT DELIVERY METHODS =====
-
-# to organize file output, determine prefix
-results_prefix = "random_graph"
-
-
-def dijkstra_fee(_payment_set, _graph):
-    logging.error("===== Dijkstra on fees =====")
-    # initialisation
-    _uncertainty_network = UncertaintyNetwork(_graph)
-    _oracle_lightning_network = OracleLightningNetwork(_graph)
-    if delete_n_central_nodes > 0:
-        for i in range(0, delete_n_central_nodes):
-            _oracle_lightning_network.network.remove_node(central_nodes[i][0])
-            _uncertainty_network.network.remove_node(central_nodes[i][0])
-    logging.warning("deleting {} most central nodes done".format(delete_n_central_nodes))
-
-    _sim_session = SyncSimulatedPaymentSession(_oracle_lightning_network, _uncertainty_network, prune_network=False)
-    c = 0
-    _successful_payments = []
-    _failed_payments = []
-    _all_payments = []
-    sent_amount = 0
-    failed_amount = 0
-    total_amount = 0
-    total_fees = 0
-
-    for payment in _payment_set:
-        c += 1
-        logging.debug(f"{c} of {len(_payment_set)}")
-        _sim_session.forget_information()
-        ret, fees = _sim_session.dijkstra_pay(payment["sender"], payment["receiver"], payment["amount"], "fee",
-                                              loglevel=loglevel)
-        total_amount += payment["amount"]
-        payment["delivery_method"] = "dijkstra_fees"
-        payment["fees"] = fees
-        total_fees += fees
-        if ret == 0:
-            _successful_payments.append(payment)
-            sent_amount += payment["amount"]
-            payment["residual_amount"] = 0
-            logging.warning("{:4d}: success: {:,} paid.".format(c, payment["amount"]))
-            logging.debug("Payment {} was successful.".format(c))
-            payment['success'] = "success"
-        elif ret == -1:
-            _failed_payments.append(payment)
-            payment['success'] = "no_path_found"
-            payment["residual_amount"] = payment["amount"]
-            failed_amount += payment["amount"]
-            logging.warning("{:4d}: no path: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.debug("Payment {} failed.".format(c))
-        elif ret > 0:
-            _failed_payments.append(payment)
-            payment['success'] = "delivery_failure"
-            payment["residual_amount"] = ret
-            failed_amount += payment["residual_amount"]
-            logging.warning("{:4d}: failed: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.debug("Payment {} failed.".format(c))
-        _all_payments.append(payment)
-
-    # write all payments to file
-    file = "data/" + results_prefix + "_dijkstra_fee.ndjson"
-    ndjson.dump(_all_payments, open(file, "w"))
-
-    logger.setLevel(logging_level)
-    logging.error(f"=== {c} payments. {len(_successful_payments)} successful, {len(_failed_payments)} failed. ===")
-    if sent_amount:
-        logging.error(f"=== fee paid for {len(_successful_payments)} successful payments: {total_fees:,.0f} sats; "
-                      f"ppm =  {total_fees * 1000 / sent_amount :,.0f}===")
-    logging.error("=== of {:,} total sats, {:,} sats successful, {:,} sats failed. ===".format(total_amount,
-                                                                                               sent_amount,
-                                                                                               failed_amount))
-
-
-def dijkstra_probability(_payment_set, _graph):
-    logging.error("===== Dijkstra on probabilities =====")
-    # initialisation
-    _uncertainty_network = UncertaintyNetwork(_graph)
-    _oracle_lightning_network = OracleLightningNetwork(_graph)
-    if delete_n_central_nodes > 0:
-        for i in range(0, delete_n_central_nodes):
-            _oracle_lightning_network.network.remove_node(central_nodes[i][0])
-            _uncertainty_network.network.remove_node(central_nodes[i][0])
-    logging.warning("deleting {} most central nodes done".format(delete_n_central_nodes))
-    _sim_session = SyncSimulatedPaymentSession(_oracle_lightning_network, _uncertainty_network, prune_network=False)
-    c = 0
-    _successful_payments = []
-    _failed_payments = []
-    _all_payments = []
-    sent_amount = 0
-    failed_amount = 0
-    total_amount = 0
-    total_fees = 0
-
-    for payment in _payment_set:
-        c += 1
-        logging.debug(f"{c} of {len(_payment_set)}")
-        _sim_session.forget_information()
-        ret, fees = _sim_session.dijkstra_pay(payment["sender"], payment["receiver"],
-                                              payment["amount"], "probability", loglevel=loglevel)
-        total_amount += payment["amount"]
-        payment["delivery_method"] = "dijkstra_probabilities"
-        payment["fees"] = fees
-        total_fees += fees
-
-        if ret == 0:
-            _successful_payments.append(payment)
-            payment['success'] = "success"
-            payment["residual_amount"] = 0
-            sent_amount += payment["amount"]
-            logging.warning("{:4d}: success: {:,} paid.".format(c, payment["amount"]))
-            logging.debug("Payment {} was successful.".format(c))
-        elif ret == -1:
-            _failed_payments.append(payment)
-            payment['success'] = "no_path_found"
-            payment["residual_amount"] = payment["amount"]
-            failed_amount += payment["amount"]
-            logging.warning("{:4d}: no path: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.debug("Payment {} failed.".format(c))
-        elif ret > 0:
-            _failed_payments.append(payment)
-            payment['success'] = "delivery_failure"
-            payment["residual_amount"] = ret
-            failed_amount += payment["residual_amount"]
-            logging.warning("{:4d}: failed: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.debug("Payment {} failed.".format(c))
-        _all_payments.append(payment)
-
-    # write all payments to file
-    file = "data/" + results_prefix + "_dijkstra_probability.ndjson"
-    ndjson.dump(_all_payments, open(file, "w"))
-
-    logger.setLevel(logging_level)
-    logging.error(f"=== {c} payments. {len(_successful_payments)} successful, {len(_failed_payments)} failed. ===")
-    if sent_amount:
-        logging.error(f"=== fee paid for {len(_successful_payments)} successful payments: {total_fees:,.0f} sats; "
-                      f"ppm =  {total_fees * 1000 / sent_amount :,.0f}===")
-    logging.error("=== of {:,} total sats, {:,} sats successful, {:,} sats failed. ===".format(total_amount,
-                                                                                               sent_amount,
-                                                                                               failed_amount))
-
-
-def dijkstra_mixed(_payment_set, _graph):
-    logging.error("===== Dijkstra mixed =====")
-    # initialisation
-    _uncertainty_network = UncertaintyNetwork(_graph)
-    _oracle_lightning_network = OracleLightningNetwork(_graph)
-    if delete_n_central_nodes > 0:
-        for i in range(0, delete_n_central_nodes):
-            _oracle_lightning_network.network.remove_node(central_nodes[i][0])
-            _uncertainty_network.network.remove_node(central_nodes[i][0])
-    logging.warning("deleting {} most central nodes done".format(delete_n_central_nodes))
-    _sim_session = SyncSimulatedPaymentSession(_oracle_lightning_network, _uncertainty_network, prune_network=False)
-    c = 0
-    _successful_payments = []
-    _failed_payments = []
-    _all_payments = []
-    sent_amount = 0
-    failed_amount = 0
-    total_amount = 0
-    total_fees = 0
-
-    for payment in _payment_set:
-        c += 1
-        logging.debug(f"{c} of {len(_payment_set)}")
-        _sim_session.forget_information()
-        ret, fees = _sim_session.dijkstra_pay(payment["sender"], payment["receiver"],
-                                              payment["amount"], "mixed", loglevel=loglevel)
-        total_amount += payment["amount"]
-        payment["delivery_method"] = "dijkstra_mixed"
-        payment["fees"] = fees
-        total_fees += fees
-
-        if ret == 0:
-            _successful_payments.append(payment)
-            payment['success'] = "success"
-            payment["residual_amount"] = 0
-            sent_amount += payment["amount"]
-            logging.warning("{:4d}: success: {:,} paid.".format(c, payment["amount"]))
-            logging.debug("Payment {} was successful.".format(c))
-        elif ret == -1:
-            _failed_payments.append(payment)
-            payment['success'] = "no_path_found"
-            payment["residual_amount"] = payment["amount"]
-            failed_amount += payment["amount"]
-            logging.warning("{:4d}: no path: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.debug("Payment {} failed.".format(c))
-        elif ret > 0:
-            _failed_payments.append(payment)
-            payment['success'] = "delivery_failure"
-            payment["residual_amount"] = ret
-            failed_amount += payment["residual_amount"]
-            logging.warning("{:4d}: failed: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.debug("Payment {} failed.".format(c))
-        _all_payments.append(payment)
-
-    # write all payments to file
-    file = "data/" + results_prefix + "_dijkstra_mixed.ndjson"
-    ndjson.dump(_all_payments, open(file, "w"))
-
-    logger.setLevel(logging_level)
-    logging.error(f"=== {c} payments. {len(_successful_payments)} successful, {len(_failed_payments)} failed. ===")
-    if sent_amount:
-        logging.error(f"=== fee paid for {len(_successful_payments)} successful payments: {total_fees:,.0f} sats; "
-                      f"ppm =  {total_fees * 1000 / sent_amount :,.0f}===")
-    logging.error("=== of {:,} total sats, {:,} sats successful, {:,} sats failed. ===".format(total_amount,
-                                                                                               sent_amount,
-                                                                                               failed_amount))
-
-
-def pickhardtpay_fee(_payment_set, _graph):
-    logging.error("===== Multipart Payments - MinCostFlow on fees =====")
-    # initialisation
-    _uncertainty_network = UncertaintyNetwork(_graph)
-    _oracle_lightning_network = OracleLightningNetwork(_graph)
-    if delete_n_central_nodes > 0:
-        for i in range(0, delete_n_central_nodes):
-            _oracle_lightning_network.network.remove_node(central_nodes[i][0])
-            _uncertainty_network.network.remove_node(central_nodes[i][0])
-    logging.warning("deleting {} most central nodes done".format(delete_n_central_nodes))
-    _sim_session = SyncSimulatedPaymentSession(_oracle_lightning_network, _uncertainty_network, prune_network=False)
-    c = 0
-    _successful_payments = []
-    _failed_payments = []
-    _all_payments = []
-    sent_amount = 0
-    failed_amount = 0
-    total_amount = 0
-    flow_list = []
-    total_fees = 0
+# the networks are built once and set back to their initial state for every delivery method
+simulation = Simulation.from_config(graph, dict(config, loglevel=loglevel),
+                                    [node for node, _ in central_nodes[0:delete_n_central_nodes]])
 
-    for payment in _payment_set:
-        c += 1
-        logging.debug(f"{c} of {len(_payment_set)}")
-        _sim_session.forget_information()
-        ret, fees = _sim_session.pickhardt_pay(c, flow_list, payment["sender"], payment["receiver"],
-                                               payment["amount"], mu=1000, loglevel=loglevel)
-        total_amount += payment["amount"]
-        payment["delivery_method"] = "pickhardt_pay_fees"
-        payment["fees"] = fees
-        total_fees += fees
-
-        if ret == 0:
-            _successful_payments.append(payment)
-            sent_amount += payment["amount"]
-            payment["residual_amount"] = 0
-            logging.warning("{:4d}: success: {:,} paid.".format(c, payment["amount"]))
-            logging.debug("Payment {} was successful.".format(c))
-            payment['success'] = "success"
-        elif ret == -1:
-            _failed_payments.append(payment)
-            payment['success'] = "no_path_found"
-            payment["residual_amount"] = payment["amount"]
-            failed_amount += payment["amount"]
-            logging.warning("{:4d}: no path: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.debug("Payment {} failed.".format(c))
-        elif ret > 0:
-            _failed_payments.append(payment)
-            payment['success'] = "delivery_failure"
-            payment["residual_amount"] = ret
-            failed_amount += payment["residual_amount"]
-            logging.warning("{:4d}: failed: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.debug("Payment {} failed.".format(c))
-        _all_payments.append(payment)
-
-    # write all payments to file
-    file = "data/" + results_prefix + "_pickhardtpay_fee.ndjson"
-    ndjson.dump(_all_payments, open(file, "w"))
-    # ndjson.dump(flow_list, open("data/pickhardtpay_fee_flow.ndjson", "w"))
-
-    logger.setLevel(logging_level)
-    logging.error(f"=== {c} payments. {len(_successful_payments)} successful, {len(_failed_payments)} failed. ===")
-    if sent_amount:
-        logging.error(f"=== fee paid for {len(_successful_payments)} successful payments: {total_fees:,.0f} sats; "
-                      f"ppm =  {total_fees * 1000 / sent_amount :,.0f}===")
-    logging.error("=== of {:,} total sats, {:,} sats successful, {:,} sats failed. ===".format(total_amount,
-                                                                                               sent_amount,
-                                                                                               failed_amount))
-
-
-def pickhardtpay_probability(_payment_set, _graph):
-    logging.error("===== Multipart Payments - MinCostFlow on probabilities =====")
-    # initialisation
-    _uncertainty_network = UncertaintyNetwork(_graph)
-    _oracle_lightning_network = OracleLightningNetwork(_graph)
-    if delete_n_central_nodes > 0:
-        for i in range(0, delete_n_central_nodes):
-            _oracle_lightning_network.network.remove_node(central_nodes[i][0])
-            _uncertainty_network.network.remove_node(central_nodes[i][0])
-    logging.warning("deleting {} most central nodes done".format(delete_n_central_nodes))
-    _sim_session = SyncSimulatedPaymentSession(_oracle_lightning_network, _uncertainty_network, prune_network=False)
-    c = 0
-    _successful_payments = []
-    _failed_payments = []
-    _all_payments = []
-    sent_amount = 0
-    failed_amount = 0
-    total_amount = 0
-    flow_list = []
-    total_fees = 0
-
-    for payment in _payment_set:
-        logger.setLevel(logging_level)
-        c += 1
-        logging.debug(f"{c} of {len(_payment_set)}")
-        _sim_session.forget_information()
-
-        ret, fees = _sim_session.pickhardt_pay(c, flow_list, payment["sender"], payment["receiver"],
-                                               payment["amount"], mu=0, loglevel=loglevel)
-        total_amount += payment["amount"]
-        payment["delivery_method"] = "pickhardt_pay_probability"
-        payment["fees"] = fees
-        total_fees += fees
-
-        if ret == 0:
-            _successful_payments.append(payment)
-            payment['success'] = "success"
-            sent_amount += payment["amount"]
-            payment["residual_amount"] = 0
-            logging.warning("{:4d}: success: {:,} paid.".format(c, payment["amount"]))
-            logging.info("Payment {} was successful.".format(c))
-        elif ret == -1:
-            _failed_payments.append(payment)
-            payment['success'] = "no_path_found"
-            payment["residual_amount"] = payment["amount"]
-            failed_amount += payment["amount"]
-            logging.warning("{:4d}: no path: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.info("Payment {} failed.".format(c))
-        elif ret > 0:
-            _failed_payments.append(payment)
-            payment['success'] = "delivery_failure"
-            payment["residual_amount"] = ret
-            failed_amount += payment["residual_amount"]
-            logging.warning("{:4d}: failed: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.info("Payment {} failed.".format(c))
-        _all_payments.append(payment)
-
-    # write all payments to file
-    file = "data/" + results_prefix + "_pickhardtpay_prob.ndjson"
-    ndjson.dump(_all_payments, open(file, "w"))
-    # ndjson.dump(flow_list, open("data/pickhardtpay_prob_flow.ndjson", "w"))
-
-    logger.setLevel(logging_level)
-    logging.error(f"=== {c} payments. {len(_successful_payments)} successful, {len(_failed_payments)} failed. ===")
-    if sent_amount:
-        logging.error(f"=== fee paid for {len(_successful_payments)} successful payments: {total_fees:,.0f} sats; "
-                      f"ppm =  {total_fees * 1000 / sent_amount :,.0f}===")
-    logging.error("=== of {:,} total sats, {:,} sats successful, {:,} sats failed. ===".format(total_amount,
-                                                                                               sent_amount,
-                                                                                               failed_amount))
-
-
-def pickhardtpay_mixed(_payment_set, _graph):
-    logging.error("===== Multipart Payments - MinCostFlow mixed =====")
-    # initialisation
-    _uncertainty_network = UncertaintyNetwork(_graph)
-    _oracle_lightning_network = OracleLightningNetwork(_graph)
-    if delete_n_central_nodes > 0:
-        for i in range(0, delete_n_central_nodes):
-            _oracle_lightning_network.network.remove_node(central_nodes[i][0])
-            _uncertainty_network.network.remove_node(central_nodes[i][0])
-    logging.warning("deleting {} most central nodes done".format(delete_n_central_nodes))
-    _sim_session = SyncSimulatedPaymentSession(_oracle_lightning_network, _uncertainty_network, prune_network=False)
-    c = 0
-    _successful_payments = []
-    _failed_payments = []
-    _all_payments = []
-    sent_amount = 0
-    failed_amount = 0
-    total_amount = 0
-    flow_list = []
-    total_fees = 0
-
-    for payment in _payment_set:
-        logger.setLevel(logging_level)
-        c += 1
-        logging.debug(f"{c} of {len(_payment_set)}")
-        _sim_session.forget_information()
-
-        ret, fees = _sim_session.pickhardt_pay(c, flow_list, payment["sender"], payment["receiver"],
-                                               payment["amount"], mu=500, loglevel=loglevel)
-        total_amount += payment["amount"]
-        payment["delivery_method"] = "pickhardt_pay_mixed"
-        payment["fees"] = fees
-        total_fees += fees
-
-        if ret == 0:
-            _successful_payments.append(payment)
-            payment['success'] = "success"
-            sent_amount += payment["amount"]
-            payment["residual_amount"] = 0
-            logging.warning("{:4d}: success: {:,} paid.".format(c, payment["amount"]))
-            logging.info("Payment {} was successful.".format(c))
-        elif ret == -1:
-            _failed_payments.append(payment)
-            payment['success'] = "no_path_found"
-            payment["residual_amount"] = payment["amount"]
-            failed_amount += payment["amount"]
-            logging.warning("{:4d}: no path: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.info("Payment {} failed.".format(c))
-        elif ret > 0:
-            _failed_payments.append(payment)
-            payment['success'] = "delivery_failure"
-            payment["residual_amount"] = ret
-            failed_amount += payment["residual_amount"]
-            logging.warning("{:4d}: failed: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.info("Payment {} failed.".format(c))
-        _all_payments.append(payment)
-
-    # write all payments to file
-    file = "data/" + results_prefix + "_pickhardtpay_mixed.ndjson"
-    ndjson.dump(_all_payments, open(file, "w"))
-    # ndjson.dump(flow_list, open("data/pickhardtpay_prob_flow.ndjson", "w"))
-
-    logger.setLevel(logging_level)
-    logging.error(f"=== {c} payments. {len(_successful_payments)} successful, {len(_failed_payments)} failed. ===")
-    if sent_amount:
-        logging.error(f"=== fee paid for {len(_successful_payments)} successful payments: {total_fees:,.0f} sats; "
-                      f"ppm =  {total_fees * 1000 / sent_amount :,.0f}===")
-    logging.error("=== of {:,} total sats, {:,} sats successful, {:,} sats failed. ===".format(total_amount,
-                                                                                               sent_amount,
-                                                                                               failed_amount))
-
-
-def pickhardtpay_probability_with_retained_knowledge(_payment_set, _oracle_lightning_network, _uncertainty_network):
-    logging.error("===== Multipart Payments - MinCostFlow on probabilities (retained) =====")
-    # initialisation
-    _sim_session = SyncSimulatedPaymentSession(_oracle_lightning_network, _uncertainty_network, prune_network=False)
-    c = 0
-    _successful_payments = []
-    _failed_payments = []
-    _all_payments = []
-    sent_amount = 0
-    failed_amount = 0
-    total_amount = 0
-    flow_list = []
-    total_fees = 0
-
-    for payment in _payment_set:
-        logger.setLevel(logging_level)
-        c += 1
-        logging.debug(f"{c} of {len(_payment_set)}")
-        # _sim_session.forget_information()
-
-        ret, fees = _sim_session.pickhardt_pay(c, flow_list, payment["sender"], payment["receiver"],
-                                               payment["amount"], mu=0, loglevel=loglevel)
-
-        total_amount += payment["amount"]
-        payment["delivery_method"] = "pickhardt_pay_probability_retained"
-        payment["fees"] = fees
-        total_fees += fees
-
-        if ret == 0:
-            payment['success'] = "success"
-            _successful_payments.append(payment)
-            sent_amount += payment["amount"]
-            payment["residual_amount"] = 0
-            logging.warning("{:4d}: success: {:,} paid.".format(c, payment["amount"]))
-            logging.info("Payment {} was successful.".format(c))
-        elif ret == -1:
-            payment['success'] = "no_path_found"
-            _failed_payments.append(payment)
-            payment["residual_amount"] = payment["amount"]
-            failed_amount += payment["amount"]
-            logging.warning("{:4d}: no path: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.info("Payment {} failed.".format(c))
-        elif ret > 0:
-            payment['success'] = "delivery_failure"
-            _failed_payments.append(payment)
-            payment["residual_amount"] = ret
-            failed_amount += payment["residual_amount"]
-            logging.warning("{:4d}: failed: residual amount: {:,}, original amount {:,}".
-                            format(c, payment["residual_amount"], payment["amount"]))
-            logging.info("Payment {} failed.".format(c))
-        else:
-            print("gone through else - ret = {}. ret == -1 {}; ret == 0 {}".format(ret, (ret == -1), ret == 0))
-            logging.warning(
-                "gone through else - ret = {}. ret == -1 {}; ret == 0 {}".format(ret, (ret == -1), ret == 0))
-            payment['success'] = "no_path_found"
-            payment["residual_amount"] = payment["amount"]
-            logging.info("Payment {} failed.".format(c))
-            logging.error("_sim_session.pickhardt_pay returns {}".format(ret))
-        _all_payments.append(payment)
-
-    # write all payments to file
-    file = "data/" + results_prefix + "_retained_knowledge_pickhardtpay_prob.ndjson"
-    ndjson.dump(_all_payments, open(file, "w"))
-    # ndjson.dump(flow_list, open("data/_retained_knowledge_pickhardtpay_prob_flow.ndjson", "w"))
+# Defining location for data sets.
+initial_payments_file_name = config["payments"]
+connected_pairs_file_name = "data/connected_pairs_payments.ndjson"
 
-    logger.setLevel(logging_level)
-    logging.error(f"=== {c} payments. {len(_successful_payments)} successful, {len(_failed_payments)} failed. ===")
-    if sent_amount:
-        logging.error(f"=== fee paid for {len(_successful_payments)} successful payments: {total_fees:,.0f} sats; "
-                      f"ppm =  {total_fees * 1000 / sent_amount :,.0f}===")
-    logging.error(
-        "=== of {:,} total sats, {:,} sats successful, {:,} sats failed. ===".format(total_amount, sent_amount,
-                                                                                     failed_amount))
+# == Creation of payment sets for analysis (comment out if working on existing data set) ===
+# create_payments(simulation.oracle_network, payment_pairs, min_payment_amount, max_payment_amount)
 
+# to organize file output, determine prefix
+results_prefix = config["results_prefix"]
 
 # ===== SIMULATION =====
 
 logging.info("===== start simulation =====")
 payment_set = ndjson.load(open(initial_payments_file_name, "r"))
-payment_set = payment_set[0:1]
-
-# == select which payment delivery methods to run the simulation for ==
-
-dijkstra_fee(payment_set, graph)
-# dijkstra_probability(payment_set, graph)
-# dijkstra_mixed(payment_set, graph)
-# pickhardtpay_fee(payment_set, graph)
-# pickhardtpay_probability(payment_set, graph)
-# pickhardtpay_mixed(payment_set, graph)
+payment_set = payment_set[0:config["number_of_payments"]]
+
+methods = methods_from_config(config["methods"])
+if config["trace_file"]:
+    start_tracing(config["trace_file"])
+simulation.run(payment_set, methods, "data/" + results_prefix, write_flows=config["write_flows"],
+               resume=config["resume"])
+stop_tracing()
+logger.setLevel(logging_level)
 
 
 # == TESTING INTEGRITY OF THE SIMULATION ==
 
-# did the liquidity guess improve?
-uncertainty_network = UncertaintyNetwork(graph)
-oracle_network = OracleLightningNetwork(graph)
-liquidity_guess_apriori = []
-# uncomment following line, if working on existing data
-# liquidity_guess_apriori = ndjson.load(open("data/liquidity_guess_apriori.ndjson", "r"))
-
-for ch in uncertainty_network.network.edges:
-    channel = uncertainty_network.get_channel(ch[0], ch[1], ch[2])
-    liquidity_range = channel.max_liquidity - channel.min_liquidity
-    oracle_channel = oracle_network.get_channel(ch[0], ch[1], ch[2])
-    liquidity_hit = (oracle_channel.actual_liquidity <= channel.max_liquidity) and \
-                    (oracle_channel.actual_liquidity >= channel.min_liquidity)
-    liquidity_guess_apriori.append(
-        (liquidity_range, channel.capacity, liquidity_range / channel.capacity, liquidity_hit,
-         ch[0], ch[1], ch[2], oracle_channel.actual_liquidity))
-
-# uncomment following line so save data for further analysis
-# ndjson.dump(liquidity_guess_apriori, open("data/_liquidity_guess_apriori.ndjson", "w"))
-
-pickhardtpay_probability_with_retained_knowledge(payment_set, oracle_network, uncertainty_network)
-
-liquidity_guess_aposteriori = []
-# liquidity_guess_aposteriori = ndjson.load(open("data/liquidity_guess_aposteriori.ndjson", "r"))
-
-for ch in uncertainty_network.network.edges:
-    channel = uncertainty_network.get_channel(ch[0], ch[1], ch[2])
-    liquidity_range = channel.max_liquidity - channel.min_liquidity
-    oracle_channel = oracle_network.get_channel(ch[0], ch[1], ch[2])
-    liquidity_hit = (oracle_channel.actual_liquidity <= channel.max_liquidity) and \
-                    (oracle_channel.actual_liquidity >= channel.min_liquidity)
-    liquidity_guess_aposteriori.append(
-        (liquidity_range, channel.capacity, "{:.2f}".format(liquidity_range / channel.capacity),
-         liquidity_hit, ch[0], ch[1], ch[2], oracle_channel.actual_liquidity,
-         channel.min_liquidity, channel.max_liquidity))
-# ndjson.dump(liquidity_guess_aposteriori, open("data/_liquidity_guess_aposteriori.ndjson", "w"))
-
-prediction_range_difference = 0
-false_guess = 0
-initial_range = 0
-
-for i in range(len(liquidity_guess_apriori)):
-    initial_range += liquidity_guess_apriori[i][0]
-    prediction_range_difference += liquidity_guess_apriori[i][0] - liquidity_guess_aposteriori[i][0]
-    if not liquidity_guess_aposteriori[i][3]:
-        print(liquidity_guess_aposteriori[i])
-        false_guess += 1
-
-print("number of false guesses: ", false_guess)
-print(f"overall estimate improved by {prediction_range_difference:,}, was initially: {initial_range:,}")
-print(f"improvement by {prediction_range_difference / initial_range:,}")
+def liquidity_guesses(uncertainty_network, oracle_network) -> list:
+    guesses = []
+    for ch in uncertainty_network.network.edges:
+        channel = uncertainty_network.get_channel(ch[0], ch[1], ch[2])
+        liquidity_range = channel.max_liquidity - channel.min_liquidity
+        oracle_channel = oracle_network.get_channel(ch[0], ch[1], ch[2])
+        liquidity_hit = (oracle_channel.actual_liquidity <= channel.max_liquidity) and \
+                        (oracle_channel.actual_liquidity >= channel.min_liquidity)
+        guesses.append(
+            (liquidity_range, channel.capacity, liquidity_range / channel.capacity, liquidity_hit,
+             ch[0], ch[1], ch[2], oracle_channel.actual_liquidity, channel.min_liquidity, channel.max_liquidity))
+    return guesses
+
+
+if config["retained_knowledge"]:
+    # did the liquidity guess improve?
+    retained_knowledge = DELIVERY_METHODS["retained_knowledge_pickhardtpay_prob"]
+    methods.append(retained_knowledge)
+    simulation.reset()
+    liquidity_guess_apriori = liquidity_guesses(simulation.uncertainty_network, simulation.oracle_network)
+    # uncomment following line so save data for further analysis
+    # ndjson.dump(liquidity_guess_apriori, open("data/_liquidity_guess_apriori.ndjson", "w"))
+
+    # the knowledge of a payment depends on all earlier payments, so it is made in SEQUENTIAL mode in any case
+    retained_prefix = "data/" + results_prefix + "_" + retained_knowledge.name
+    simulation.run_method(payment_set, retained_knowledge, retained_prefix + ".ndjson",
+                          retained_prefix + "_flow" if config["write_flows"] else None, resume=config["resume"],
+                          mode=SEQUENTIAL)
+    liquidity_guess_aposteriori = liquidity_guesses(simulation.uncertainty_network, simulation.oracle_network)
+    # ndjson.dump(liquidity_guess_aposteriori, open("data/_liquidity_guess_aposteriori.ndjson", "w"))
+
+    prediction_range_difference = 0
+    false_guess = 0
+    initial_range = 0
+
+    for i in range(len(liquidity_guess_apriori)):
+        initial_range += liquidity_guess_apriori[i][0]
+        prediction_range_difference += liquidity_guess_apriori[i][0] - liquidity_guess_aposteriori[i][0]
+        if not liquidity_guess_aposteriori[i][3]:
+            print(liquidity_guess_aposteriori[i])
+            false_guess += 1
+
+    print("number of false guesses: ", false_guess)
+    print(f"overall estimate improved by {prediction_range_difference:,}, was initially: {initial_range:,}")
+    print(f"improvement by {prediction_range_difference / initial_range:,}")
 
 # == aggregate results in one file ==
-method_all = ["_dijkstra_fee", "_dijkstra_probability", "_dijkstra_mixed", "_pickhardtpay_fee", "_pickhardtpay_prob",
-              "_pickhardtpay_mixed", "_retained_knowledge_pickhardtpay_prob"]
-method_short = ["_dijkstra_fee", "_dijkstra_probability", "_pickhardtpay_fee", "_pickhardtpay_prob",
-                "_retained_knowledge_pickhardtpay_prob"]
 all_results = []
-for m in method_short:
-    file = "data/" + results_prefix + m + ".ndjson"
+for method in methods:
+    file = "data/" + results_prefix + "_" + method.name + ".ndjson"
     all_results += ndjson.load(open(file, "r"))
 
 ndjson.dump(all_results, open("data/all_results.ndjson", "w"))
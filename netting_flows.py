@@ -1,66 +1,48 @@
-import ndjson
-
-all_flow = ndjson.load(open("data/pickhardtpay_prob_flow.ndjson", "r"))
-print(f"Total number of flows: {len(all_flow):,}")
-
-print("- selecting only settled flows")
-settled_flows = []
-for e in all_flow:
-    if e[7] == "SETTLED":
-        settled_flows.append(e)
-print(f"Number of flows after removing non-settled flows: {len(settled_flows):,}")
-
-gross_flow = 0
-for e in settled_flows:
-    gross_flow += e[5]
-print(f"Gross flow amount over all {len(settled_flows):,} settled flows: {gross_flow:,}")
-print("-----------------------------------------------------------------------------")
-print("- aggregating flows on each edge")
-total_number_of_settled_flows = len(settled_flows)
-idx = 0
-
-for e in settled_flows:
-    idx += 1
-    idy = 0
-    for f in settled_flows:
-        idy += 1
-        if e == f:
-            continue
-        if f[0] == e[0] and f[1] == e[1] and f[2] == e[2]:
-            e[5] += f[5]
-            settled_flows.remove(f)
-        if idy % 500000 == 0:
-            print(f"({idx:,} - {idy:,})")
-gross_flow = 0
-print("     calculating gross flow...")
-for e in settled_flows:
-    gross_flow += e[5]
-
-print(f"Number of flows/edges after aggregating flow on edge: {len(settled_flows):,} "
-      f"({(total_number_of_settled_flows - len(settled_flows)):,} flows collapsed)")
-
-print("-----------------------------------------------------------------------------")
-print("- calculating sum of net flow amount, netting bi-directional flows on an edge")
-edges_with_flow_on_return_channel = 0
-for e in settled_flows:
-    for f in settled_flows:
-        if e[0] == f[1] and e[1] == f[0] and e[2] == f[2] and e[5] > 0 and f[5] > 0:
-            e[5] -= f[5]
-            edges_with_flow_on_return_channel += 1
-            settled_flows.remove(f)
-
-for e in settled_flows:
-    if e[5] < 0:
-        receiver = e[1]
-        e[1] = e[0]
-        e[0] = receiver
-        e[5] = -e[5]
-
-print(f"Number of flows after netting: {len(settled_flows):,} "
-      f"({edges_with_flow_on_return_channel:,} edges with bi-directional flows.)")
-ndjson.dump(settled_flows, open("data/1337_12345_edges_with_netted_flows.ndjson", "w"))
-
-net_flow = 0
-for e in settled_flows:
-    net_flow += e[5]
-print(f"Net flow amount over all edges: {net_flow:,}")
+"""
+Aggregates the settled flows of a simulation run per channel, nets the flows of channels and their return channels and
+writes the netted flows and the flow totals of the nodes.
+
+    python netting_flows.py [flows] [--edges-file FILE] [--nodes-file FILE]
+
+`flows` is the directory of a flow log (see `FlowLog`) or an NDJSON file of flows in the list format of earlier
+versions.
+"""
+import argparse
+import os
+
+from pickhardtpayments.pickhardtpayments.FlowNetting import FlowNetting
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("flows", nargs="?", default="data/random_graph_pickhardtpay_prob_flow",
+                        help="flow log directory (data/<results_prefix>_<method>_flow/ of main.py with write_flows) "
+                             "or NDJSON file of flows")
+    parser.add_argument("--edges-file", default="data/1337_12345_edges_with_netted_flows.ndjson",
+                        help="NDJSON file for the netted flows")
+    parser.add_argument("--nodes-file", default="data/1337_12345_node_flows.ndjson",
+                        help="NDJSON file for the gross and net flows of the nodes")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.flows):
+        netting = FlowNetting.from_flow_log(args.flows)
+    else:
+        netting = FlowNetting.from_ndjson(args.flows)
+
+    print(f"Total number of flows: {netting.number_of_flows:,}")
+    print(f"Number of flows after removing non-settled flows: {netting.number_of_settled_flows:,}")
+    print(f"Gross flow amount over all {netting.number_of_settled_flows:,} settled flows: {netting.gross_flow:,}")
+    print("-----------------------------------------------------------------------------")
+    print(f"Number of flows/edges after aggregating flow on edge: {len(netting.edges):,} "
+          f"({(netting.number_of_settled_flows - len(netting.edges)):,} flows collapsed)")
+    print("-----------------------------------------------------------------------------")
+    print(f"Number of flows after netting: {len(netting.netted_edges):,} "
+          f"({netting.edges_with_flow_on_return_channel:,} edges with bi-directional flows.)")
+    netting.write_edges(args.edges_file)
+    number_of_nodes = netting.write_node_totals(args.nodes_file)
+    print(f"Net flow amount over all edges: {netting.net_flow:,}")
+    print(f"Flow totals of {number_of_nodes:,} nodes written to {args.nodes_file}")
+
+
+if __name__ == "__main__":
+    main()
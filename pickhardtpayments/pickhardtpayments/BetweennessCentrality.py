@@ -0,0 +1,179 @@
+"""
+BetweennessCentrality.py
+====================================
+Betweenness centrality of the nodes of a ChannelGraph for experiments that remove the most central nodes.
+
+The exact betweenness centrality needs a breadth first search from every node. On the mainnet graph this takes hours,
+so the sources can be distributed over several processes or the centrality is approximated from `k` sampled sources
+(pivots). The sorted result is cached on disk under the hash of the topology of the network, so sweeping over the
+number of removed nodes computes the centrality only once.
+"""
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .ChannelGraph import ChannelGraph
+from .GraphSnapshot import network_hash
+
+# set in the worker processes
+_worker_adjacency = None
+
+
+def approximation_error(number_of_nodes: int, k: int, confidence: float = 0.95) -> float:
+    """
+    returns the bound on the absolute error of the normalized betweenness of a single node that is estimated from `k`
+    uniformly sampled pivots and holds with probability `confidence` (Hoeffding's inequality).
+
+    Every pivot contributes a value between 0 and n / (n - 1) to the estimate, as a pivot is at most on the shortest
+    paths to the n - 2 other nodes.
+    """
+    if k <= 0 or number_of_nodes <= 2:
+        return math.inf
+    value_range = number_of_nodes / (number_of_nodes - 1)
+    return value_range * math.sqrt(math.log(2 / (1 - confidence)) / (2 * k))
+
+
+def pivots_for_error(number_of_nodes: int, epsilon: float, confidence: float = 0.95) -> int:
+    """
+    returns the number of pivots that is needed so that the error of the betweenness of a node is at most `epsilon`
+    with probability `confidence`
+    """
+    value_range = number_of_nodes / (number_of_nodes - 1) if number_of_nodes > 1 else 1
+    k = math.ceil(value_range ** 2 * math.log(2 / (1 - confidence)) / (2 * epsilon ** 2))
+    return min(k, number_of_nodes)
+
+
+def _adjacency(channel_graph: ChannelGraph) -> tuple:
+    """
+    returns the node ids and for every node the positions of its successors. Parallel channels are counted once.
+    """
+    network = channel_graph.network
+    nodes = list(network.nodes())
+    position = {node: k for k, node in enumerate(nodes)}
+    return nodes, [[position[neighbor] for neighbor in network.adj[node]] for node in nodes]
+
+
+def _accumulate(adjacency: list, sources: list) -> list:
+    """
+    returns the sum of the dependencies of every node on the shortest paths from `sources` (Brandes' algorithm)
+    """
+    number_of_nodes = len(adjacency)
+    betweenness = [0.0] * number_of_nodes
+    for s in sources:
+        # breadth first search with the number of shortest paths and the predecessors on them
+        stack = []
+        predecessors = [[] for _ in range(number_of_nodes)]
+        sigma = [0.0] * number_of_nodes
+        distance = [-1] * number_of_nodes
+        sigma[s] = 1.0
+        distance[s] = 0
+        queue = deque([s])
+        while queue:
+            v = queue.popleft()
+            stack.append(v)
+            next_distance = distance[v] + 1
+            sigma_v = sigma[v]
+            for w in adjacency[v]:
+                if distance[w] < 0:
+                    queue.append(w)
+                    distance[w] = next_distance
+                if distance[w] == next_distance:
+                    sigma[w] += sigma_v
+                    predecessors[w].append(v)
+
+        delta = [0.0] * number_of_nodes
+        while stack:
+            w = stack.pop()
+            coefficient = (1 + delta[w]) / sigma[w]
+            for v in predecessors[w]:
+                delta[v] += sigma[v] * coefficient
+            if w != s:
+                betweenness[w] += delta[w]
+    return betweenness
+
+
+def _init_worker(adjacency: list):
+    global _worker_adjacency
+    _worker_adjacency = adjacency
+
+
+def _accumulate_in_worker(sources: list) -> list:
+    return _accumulate(_worker_adjacency, sources)
+
+
+def betweenness_centrality(channel_graph: ChannelGraph, k: int = None, seed: int = None,
+                           max_workers: int = 1) -> dict:
+    """
+    computes the normalized betweenness centrality of the nodes of the network of `channel_graph` (shortest paths by
+    number of hops, endpoints excluded). The result is the same as `nx.betweenness_centrality(network, k, True,
+    seed=seed)`.
+
+    :param k: number of sampled pivots. `None` computes the exact centrality from all nodes.
+    :type: int
+    :param seed: seed of the sampling of the pivots
+    :type: int
+    :param max_workers: number of processes among which the sources are partitioned
+    :type: int
+    :return: the centrality by node id
+    :rtype: dict
+    """
+    nodes, adjacency = _adjacency(channel_graph)
+    number_of_nodes = len(nodes)
+    if k is None:
+        sources = list(range(number_of_nodes))
+    else:
+        sources = random.Random(seed).sample(range(number_of_nodes), k)
+
+    if max_workers > 1 and len(sources) > 1:
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        partitions = [sources[w::max_workers] for w in range(max_workers)]
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(adjacency,)) as executor:
+            partial_sums = list(executor.map(_accumulate_in_worker, partitions))
+        betweenness = [sum(values) for values in zip(*partial_sums)]
+    else:
+        betweenness = _accumulate(adjacency, sources)
+
+    scale = 1 / ((number_of_nodes - 1) * (number_of_nodes - 2)) if number_of_nodes > 2 else 1
+    if k is not None:
+        scale *= number_of_nodes / k
+        logging.info("betweenness centrality from {} pivots, error below {:.2g} with 95% confidence".format(
+            k, approximation_error(number_of_nodes, k)))
+    return {node: value * scale for node, value in zip(nodes, betweenness)}
+
+
+def central_nodes(channel_graph: ChannelGraph, n: int = None, k: int = None, seed: int = None, max_workers: int = 1,
+                  cache_dir: str = None) -> list:
+    """
+    returns the `n` nodes with the highest betweenness centrality as list of (node id, centrality), see
+    `betweenness_centrality` for the other parameters.
+
+    If `cache_dir` is given, the sorted centrality of all nodes is stored there under the hash of the topology of
+    the network and the parameters, and is read again by later calls for the same network.
+    """
+    cache_file = None
+    if cache_dir is not None:
+        mode = "exact" if k is None else f"k{k}_seed{seed}"
+        cache_file = os.path.join(cache_dir, f"betweenness_centrality.{network_hash(channel_graph)[:16]}.{mode}.json")
+    if cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file) as f:
+            sorted_nodes = [tuple(item) for item in json.load(f)]
+        logging.info(f"betweenness centrality loaded from {cache_file}")
+    else:
+        centrality = betweenness_centrality(channel_graph, k, seed, max_workers)
+        sorted_nodes = sorted(centrality.items(), key=lambda x: x[1], reverse=True)
+        if cache_file is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_file + ".tmp", "w") as f:
+                json.dump(sorted_nodes, f)
+            os.replace(cache_file + ".tmp", cache_file)
+            logging.info(f"betweenness centrality written to {cache_file}")
+    return sorted_nodes if n is None else sorted_nodes[:n]
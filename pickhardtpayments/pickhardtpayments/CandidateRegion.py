@@ -0,0 +1,124 @@
+"""
+CandidateRegion.py
+====================================
+Restricts the min cost flow problem of a payment to a cost-bounded region around its sender and receiver.
+
+The optimal flow of a payment only uses channels close to the cheapest paths between sender and receiver, yet the
+full problem contains the arcs of every channel of the network. The region of a payment consists of all nodes `v`
+with `d(sender, v) + d(v, receiver) <= d(sender, receiver) + slack * d(sender, receiver)`, where `d` is the distance
+over the cheapest linearized arcs. The distances from the sender and to the receiver are computed by `arc_distances`,
+a vectorized label-correcting search over the arcs of the whole network that runs until no distance changes. It does
+not stop early, so every solve costs O(rounds * arcs) on the full network before the solver runs, where the number
+of rounds is the number of arcs on the longest of the cheapest paths. Only the arcs between nodes of the region are
+given to the solver.
+
+If the flow is infeasible on the region, the next larger slack is tried and eventually the full problem is solved.
+
+    uncertainty_network.candidate_region = CandidateRegion(slacks=(1, 4, 16), report_gap=True)
+"""
+import logging
+
+import numpy as np
+
+
+def arc_distances(tails: np.ndarray, heads: np.ndarray, costs: np.ndarray, number_of_nodes: int,
+                  source: int) -> np.ndarray:
+    """
+    returns the distance from `source` to every node over the arcs (`tails`, `heads`) with non-negative `costs`.
+    Unreachable nodes have an infinite distance.
+
+    In every round the arcs leaving the nodes whose distance changed in the previous round are relaxed, until no
+    distance changes. The number of rounds is the number of arcs on the longest of the cheapest paths. Every round
+    scans all arcs to select the active ones, so the search takes O(rounds * arcs) time on the full network.
+    """
+    distance = np.full(number_of_nodes, np.inf)
+    distance[source] = 0
+    changed = np.zeros(number_of_nodes, dtype=bool)
+    changed[source] = True
+    costs = costs.astype(float)
+    while True:
+        active = changed[tails]
+        relaxed = distance.copy()
+        np.minimum.at(relaxed, heads[active], distance[tails[active]] + costs[active])
+        changed = relaxed < distance
+        if not changed.any():
+            return distance
+        distance = relaxed
+
+
+class CandidateRegion:
+    """
+    Settings and statistics of the candidate regions of the `MinCostFlowModel`.
+
+    The statistics count how often the flow was found on the region of every slack and how often the full problem was
+    needed. With `report_gap` the full problem is solved as well, and the relative difference of the optimal costs is
+    recorded (0 if the region contains an optimal flow of the full problem). The statistics are kept per process.
+    """
+
+    def __init__(self, slacks: tuple = (1.0, 4.0, 16.0), report_gap: bool = False):
+        """
+        :param slacks: the regions that are tried one after the other, relative to the cost of the cheapest path
+        :type: tuple
+        :param report_gap: solve the full problem as well to compare the optimal costs
+        :type: bool
+        """
+        self.slacks = tuple(sorted(slacks))
+        self.report_gap = report_gap
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.solved = {slack: 0 for slack in self.slacks}
+        self.full_solves = 0
+        self.gaps = []
+
+    @classmethod
+    def from_config(cls, entry):
+        """
+        returns the region for a config entry: `True` for the default settings or a dictionary with the arguments,
+        e.g. `{"slacks": [1, 4], "report_gap": true}`
+        """
+        if isinstance(entry, CandidateRegion):
+            return entry
+        if entry is True:
+            return cls()
+        return cls(**entry)
+
+    def nodes(self, tails: np.ndarray, heads: np.ndarray, costs: np.ndarray, number_of_nodes: int, sender: int,
+              receiver: int) -> list:
+        """
+        returns a boolean mask of the nodes for every slack. The list is empty if there is no path from `sender` to
+        `receiver`.
+        """
+        from_sender = arc_distances(tails, heads, costs, number_of_nodes, sender)
+        shortest = from_sender[receiver]
+        if np.isinf(shortest):
+            return []
+        to_receiver = arc_distances(heads, tails, costs, number_of_nodes, receiver)
+        detour = from_sender + to_receiver
+        return [detour <= shortest + slack * max(shortest, 1) for slack in self.slacks]
+
+    def record(self, slack, gap: float = None):
+        """
+        counts a solve on the region of `slack` (None for the full problem) and its optimality gap
+        """
+        if slack is None:
+            self.full_solves += 1
+        else:
+            self.solved[slack] += 1
+        if gap is not None:
+            self.gaps.append(gap)
+            logging.debug("optimality gap of the candidate region with slack {}: {:.4%}".format(slack, gap))
+
+    @property
+    def number_of_solves(self) -> int:
+        return sum(self.solved.values()) + self.full_solves
+
+    def summary(self) -> dict:
+        """
+        returns the number of solves per slack, the number of full solves and the mean and maximum optimality gap
+        """
+        summary = {"solved": dict(self.solved), "full_solves": self.full_solves}
+        if self.gaps:
+            summary["mean_gap"] = float(np.mean(self.gaps))
+            summary["max_gap"] = float(np.max(self.gaps))
+        return summary
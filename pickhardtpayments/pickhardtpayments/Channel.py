@@ -25,66 +25,94 @@ class Channel:
     """
     Stores the public available information of a channel.
 
-    The `Channel` Class is intended to be read only and internally stores
-    the data from core lightning's `lightning-cli listchannels` command as a json.
-    If you retrieve data from a different implementation I suggest to overload
-    the constructor and transform the information into the given json format
+    The `Channel` Class is intended to be read only. It is a lightweight view on one row of a `ChannelTable` which
+    stores the data from core lightning's `lightning-cli listchannels` command in columns.
+    If you retrieve data from a different implementation I suggest to transform the information into the given
+    json format and use `Channel.from_cln_jsn`
     """
 
-    def __init__(self, cln_jsn):
-        self._cln_jsn = cln_jsn
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index: int):
+        self._table = table
+        self._index = index
+
+    @classmethod
+    def from_cln_jsn(cls, cln_jsn: dict):
+        """
+        creates a channel that is not part of a ChannelGraph from a listchannels json entry
+        """
+        from .ChannelTable import ChannelTable
+        return cls(ChannelTable.from_cln_jsn([cln_jsn]), 0)
+
+    @property
+    def table(self):
+        return self._table
+
+    @property
+    def index(self) -> int:
+        """
+        the row of the channel in the `ChannelTable`
+        """
+        return self._index
 
     @property
     def cln_jsn(self):
-        return self._cln_jsn
+        return self._table.cln_jsn(self._index)
 
     @property
     def src(self):
-        return self._cln_jsn[ChannelFields.SRC]
+        return self._table.nodes[self._table.src[self._index]]
 
     @property
     def htlc_min_msat(self):
-        return self._cln_jsn[ChannelFields.HTLC_MINIMUM_MSAT]
+        return self._table.cold_field(self._index, ChannelFields.HTLC_MINIMUM_MSAT)
 
     @property
     def htlc_max_msat(self):
-        return self._cln_jsn[ChannelFields.HTLC_MAXIMUM_MSAT]
+        return self._table.cold_field(self._index, ChannelFields.HTLC_MAXIMUM_MSAT)
 
     @property
     def base_fee(self):
-        return self._cln_jsn[ChannelFields.BASE_FEE_MSAT]
+        return self._table.base_fee.item(self._index)
 
     @property
     def is_announced(self):
-        return self._cln_jsn[ChannelFields.ANNOUNCED]
+        return self._table.cold_field(self._index, ChannelFields.ANNOUNCED)
 
     @property
     def dest(self):
-        return self._cln_jsn[ChannelFields.DEST]
+        return self._table.nodes[self._table.dest[self._index]]
 
     @property
     def ppm(self):
-        return self._cln_jsn[ChannelFields.FEE_RATE]
+        return self._table.ppm.item(self._index)
 
     @property
     def capacity(self):
-        return self._cln_jsn[ChannelFields.CAP]
+        return self._table.capacity.item(self._index)
 
     @property
     def is_active(self):
-        return self._cln_jsn[ChannelFields.ACTIVE]
+        return self._table.cold_field(self._index, ChannelFields.ACTIVE)
 
     @property
     def cltv_delta(self):
-        return self._cln_jsn[ChannelFields.CLTV]
+        return self._table.cold_field(self._index, ChannelFields.CLTV)
 
     @property
     def flags(self):
-        return self._cln_jsn[ChannelFields.FLAGS]
+        return self._table.cold_field(self._index, ChannelFields.FLAGS)
 
     @property
     def short_channel_id(self):
-        return self._cln_jsn[ChannelFields.SHORT_CHANNEL_ID]
+        return self._table.short_channel_ids[self._table.scid[self._index]]
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._table is self._table and other._index == self._index
+
+    def __hash__(self):
+        return hash((id(self._table), self._index))
 
     def __str__(self):
-        return str(self._cln_jsn)
+        return str(self.cln_jsn)
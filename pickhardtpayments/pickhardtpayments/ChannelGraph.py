@@ -1,44 +1,185 @@
-import networkx as nx
-import json
+import numpy as np
 from .Channel import Channel
+from .ChannelTable import ChannelTable
+from .ListChannelsReader import iter_channels, read_channel_table
+from .NodeIndex import NodeIndex
+
+
+class TopologyVersion:
+    """
+    Counts changes to the topology of a `nx.MultiDiGraph`, see `ChannelMultiDiGraph`.
+
+    Vectorized computations over the `ChannelTable` need to know which rows are still part of a network. As the
+    networks can be changed directly via networkx (e.g. `network.remove_node`) the graph keeps a `version` that is
+    increased on every added or removed node or edge.
+    """
+
+    def __init__(self, incoming_graph_data=None, **attr):
+        self.version = 0
+        super().__init__(incoming_graph_data, **attr)
+
+    def add_node(self, node_for_adding, **attr):
+        self.version += 1
+        super().add_node(node_for_adding, **attr)
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        self.version += 1
+        super().add_nodes_from(nodes_for_adding, **attr)
+
+    def remove_node(self, n):
+        self.version += 1
+        super().remove_node(n)
+
+    def remove_nodes_from(self, nodes):
+        self.version += 1
+        super().remove_nodes_from(nodes)
+
+    def add_edge(self, u_for_edge, v_for_edge, key=None, **attr):
+        self.version += 1
+        return super().add_edge(u_for_edge, v_for_edge, key, **attr)
+
+    def remove_edge(self, u, v, key=None):
+        self.version += 1
+        super().remove_edge(u, v, key)
+
+    def clear(self):
+        self.version += 1
+        super().clear()
+
+    def clear_edges(self):
+        self.version += 1
+        super().clear_edges()
+
+
+_channel_multi_di_graph = None
+
+
+def __getattr__(name: str):
+    """
+    creates the class `ChannelMultiDiGraph`, a `nx.MultiDiGraph` with a `TopologyVersion`, on first access. networkx
+    is only imported when the first network is created, not when the module is imported.
+    """
+    global _channel_multi_di_graph
+    if name != "ChannelMultiDiGraph":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _channel_multi_di_graph is None:
+        import networkx as nx
+        _channel_multi_di_graph = type("ChannelMultiDiGraph", (TopologyVersion, nx.MultiDiGraph),
+                                       {"__module__": __name__})
+    return _channel_multi_di_graph
+
+
+def new_network():
+    """
+    returns an empty `ChannelMultiDiGraph`
+    """
+    return __getattr__("ChannelMultiDiGraph")()
 
 
 class ChannelGraph:
     """
-    Represents the public information about the Lightning Network that we see from Gossip and the 
-    Bitcoin Blockchain. 
+    Represents the public information about the Lightning Network that we see from Gossip and the
+    Bitcoin Blockchain.
 
     The channels of the Channel Graph are directed and identified uniquely by a triple consisting of
-    (source_node_id, destination_node_id, short_channel_id). This allows the ChannelGraph to also 
+    (source_node_id, destination_node_id, short_channel_id). This allows the ChannelGraph to also
     contain parallel channels.
+
+    The data of the channels is stored in a columnar `ChannelTable`. The `network` holds a lightweight `Channel`
+    view on every edge.
     """
 
     def _get_channel_json(self, filename: str):
         """
-        extracts the dictionary from the file that contains lightning-cli listchannels json string
+        yields the channel dictionaries from the file that contains lightning-cli listchannels json string without
+        loading the whole document (see `ListChannelsReader`)
         """
-        f = open(filename)
-        return json.load(f)["channels"]
+        return iter_channels(filename)
 
     def __init__(self, lightning_cli_listchannels_json_file: str):
         """
-        Importing the channel_graph from core lightning listchannels command the file can be received by 
+        Importing the channel_graph from core lightning listchannels command the file can be received by
         #$ lightning-cli listchannels > listchannels01.json
 
         """
 
-        self._channel_graph = nx.MultiDiGraph()
-        channels = self._get_channel_json(lightning_cli_listchannels_json_file)
-        for channel in channels:
-            channel = Channel(channel)
+        self._build(ChannelTable.from_cln_jsn(self._get_channel_json(lightning_cli_listchannels_json_file)))
+
+    def _build(self, table: ChannelTable, nodes: list = None):
+        """
+        creates the network with a Channel for every row of `table`. If `nodes` is given, the nodes are added first
+        in this order.
+        """
+        self._channel_graph = new_network()
+        self._table = table
+        if nodes is not None:
+            self._channel_graph.add_nodes_from(nodes)
+        for index in range(len(self._table)):
+            channel = Channel(self._table, index)
 
             self._channel_graph.add_edge(
                 channel.src, channel.dest, key=channel.short_channel_id, channel=channel)
 
+    @classmethod
+    def from_listchannels(cls, lightning_cli_listchannels_json_file: str, base_threshold: int = None,
+                          return_channels_only: bool = False):
+        """
+        creates a ChannelGraph from a listchannels dump (optionally gzip or zstd compressed) and filters the channels
+        while they are read. The result is the same as removing the channels from the complete ChannelGraph.
+
+        :param base_threshold: removes channels whose return channel has a base fee larger than `base_threshold`
+        :type: int
+        :param return_channels_only: removes channels without return channel
+        :type: bool
+        """
+        table, nodes = read_channel_table(lightning_cli_listchannels_json_file, base_threshold, return_channels_only)
+        return cls.from_table(table, nodes)
+
+    @classmethod
+    def from_table(cls, table: ChannelTable, nodes: list = None):
+        """
+        creates a ChannelGraph from a ChannelTable without reading a listchannels file
+
+        :param nodes: node ids in the order in which they are added to the network (default: order of the channels)
+        :type: list
+        """
+        channel_graph = cls.__new__(cls)
+        channel_graph._build(table, nodes)
+        return channel_graph
+
     @property
     def network(self):
         return self._channel_graph
 
+    @property
+    def table(self) -> ChannelTable:
+        return self._table
+
+    def channel_indices(self) -> np.ndarray:
+        """
+        returns the rows of the `ChannelTable` of all channels that are part of the network in the order of
+        `network.edges`.
+
+        The result is cached until the topology of the network changes.
+        """
+        version = (id(self.network), self.network.version)
+        if getattr(self, "_channel_indices_version", None) != version:
+            self._channel_indices = np.fromiter((channel.index for _, _, channel in self.network.edges(data="channel")),
+                                                dtype=np.int64)
+            self._channel_indices_version = version
+        return self._channel_indices
+
+    def node_index(self) -> NodeIndex:
+        """
+        returns the positions of the nodes of the network, see `NodeIndex`.
+
+        The index is cached until the topology of the network changes.
+        """
+        index = getattr(self, "_node_index", None)
+        if index is None or index.version != (id(self.network), self.network.version):
+            self._node_index = index = NodeIndex(self)
+        return index
+
     def get_channel(self, src: str, dest: str, short_channel_id: str):
         """
         returns a specific channel object identified by source, destination and short_channel_id
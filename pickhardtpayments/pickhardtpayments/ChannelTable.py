@@ -0,0 +1,206 @@
+import json
+
+import numpy as np
+
+from .Channel import ChannelFields
+
+# fields of the listchannels json that are not needed in any computation. They are kept per row so that
+# `Channel.cln_jsn` can still be reconstructed but they are not stored as columns
+COLD_FIELDS = (ChannelFields.HTLC_MINIMUM_MSAT,
+               ChannelFields.HTLC_MAXIMUM_MSAT,
+               ChannelFields.ANNOUNCED,
+               ChannelFields.LAST_UPDATE,
+               ChannelFields.FEATURES,
+               ChannelFields.ACTIVE,
+               ChannelFields.CLTV,
+               ChannelFields.FLAGS)
+
+
+class ChannelTable:
+    """
+    Columnar storage of all directed channels of a ChannelGraph.
+
+    Every directed channel is a row of the table. The public information of a channel (source, destination,
+    short_channel_id, capacity, fee rate and base fee) is stored in NumPy arrays that are shared between all
+    networks built from the same ChannelGraph. The state of a channel (`actual_liquidity` and `in_flight` for the
+    OracleLightningNetwork, `min_liquidity`, `max_liquidity` and `in_flight` for the UncertaintyNetwork) is stored
+    in columns that are owned by each network. Use `fork` to get a table that shares the public columns but has its
+    own state columns.
+
+    Node ids and short channel ids are dictionary encoded. `nodes[src[i]]` is the node id of the source of row `i`
+    and `short_channel_ids[scid[i]]` its short channel id. `reverse[i]` is the row of the channel in the opposite
+    direction or -1 if the return channel was not announced.
+    """
+
+    def __init__(self, nodes: list, short_channel_ids: list, src: np.ndarray, dest: np.ndarray, scid: np.ndarray,
+                 capacity: np.ndarray, ppm: np.ndarray, base_fee: np.ndarray, cold=None):
+        """
+        :param cold: the values of the COLD_FIELDS of every row, either as a list of tuples or as a JSON string that is
+        only decoded when a cold field is accessed
+        """
+        self._nodes = nodes
+        self._node_index = {node_id: k for k, node_id in enumerate(nodes)}
+        self._short_channel_ids = short_channel_ids
+        self._scid_index = {short_channel_id: k for k, short_channel_id in enumerate(short_channel_ids)}
+        self.src = src
+        self.dest = dest
+        self.scid = scid
+        self.capacity = capacity
+        self.ppm = ppm
+        self.base_fee = base_fee
+        self._cold = cold if cold is not None else [()] * len(src)
+
+        self._row_index = {}
+        for row in range(len(src)):
+            self._row_index[(int(src[row]), int(dest[row]), int(scid[row]))] = row
+        self.reverse = np.full(len(src), -1, dtype=np.int64)
+        for (s, d, c), row in self._row_index.items():
+            self.reverse[row] = self._row_index.get((d, s, c), -1)
+
+        self._allocate_state()
+
+    def _allocate_state(self):
+        size = len(self.src)
+        self.actual_liquidity = np.zeros(size, dtype=np.int64)
+        self.in_flight = np.zeros(size, dtype=np.int64)
+        self.min_liquidity = np.zeros(size, dtype=np.int64)
+        self.max_liquidity = self.capacity.copy()
+        # journal of the rows whose state was changed through the channels of the network, see `StateSnapshot`
+        self.changed_rows = set()
+
+    @classmethod
+    def from_cln_jsn(cls, channels):
+        """
+        builds the table from an iterable of channel dictionaries as returned by `lightning-cli listchannels`
+        """
+        nodes, node_index = [], {}
+        short_channel_ids, scid_index = [], {}
+        src, dest, scid, capacity, ppm, base_fee, cold = [], [], [], [], [], [], []
+
+        def encode(value, values, index):
+            k = index.get(value)
+            if k is None:
+                k = len(values)
+                index[value] = k
+                values.append(value)
+            return k
+
+        for channel in channels:
+            src.append(encode(channel[ChannelFields.SRC], nodes, node_index))
+            dest.append(encode(channel[ChannelFields.DEST], nodes, node_index))
+            scid.append(encode(channel[ChannelFields.SHORT_CHANNEL_ID], short_channel_ids, scid_index))
+            capacity.append(channel[ChannelFields.CAP])
+            ppm.append(channel[ChannelFields.FEE_RATE])
+            base_fee.append(channel[ChannelFields.BASE_FEE_MSAT])
+            cold.append(tuple(channel.get(field) for field in COLD_FIELDS))
+
+        return cls(nodes, short_channel_ids,
+                   np.array(src, dtype=np.int32),
+                   np.array(dest, dtype=np.int32),
+                   np.array(scid, dtype=np.int32),
+                   np.array(capacity, dtype=np.int64),
+                   np.array(ppm, dtype=np.int64),
+                   np.array(base_fee, dtype=np.int64),
+                   cold)
+
+    def fork(self):
+        """
+        returns a table that shares all public columns with this table but has its own, freshly initialized state
+        columns. This is used by the OracleLightningNetwork and the UncertaintyNetwork so that several networks can
+        be created from the same ChannelGraph without influencing each other.
+        """
+        table = ChannelTable.__new__(ChannelTable)
+        table.__dict__.update(self.__dict__)
+        table._allocate_state()
+        return table
+
+    def __len__(self):
+        return len(self.src)
+
+    @property
+    def nodes(self) -> list:
+        return self._nodes
+
+    @property
+    def short_channel_ids(self) -> list:
+        return self._short_channel_ids
+
+    def node_index(self, node_id: str) -> int:
+        return self._node_index[node_id]
+
+    def row(self, src: str, dest: str, short_channel_id: str) -> int:
+        """
+        returns the row of the channel identified by source, destination and short_channel_id or -1
+        """
+        try:
+            key = (self._node_index[src], self._node_index[dest], self._scid_index[short_channel_id])
+        except KeyError:
+            return -1
+        return self._row_index.get(key, -1)
+
+    def cln_jsn(self, row: int) -> dict:
+        """
+        reconstructs the listchannels json entry of the channel in `row`
+        """
+        jsn = {ChannelFields.SRC: self._nodes[self.src[row]],
+               ChannelFields.DEST: self._nodes[self.dest[row]],
+               ChannelFields.SHORT_CHANNEL_ID: self._short_channel_ids[self.scid[row]],
+               ChannelFields.CAP: int(self.capacity[row]),
+               ChannelFields.FEE_RATE: int(self.ppm[row]),
+               ChannelFields.BASE_FEE_MSAT: int(self.base_fee[row])}
+        for field, value in zip(COLD_FIELDS, self.cold_values(row)):
+            if value is not None:
+                jsn[field] = value
+        return jsn
+
+    def cold_values(self, row: int) -> tuple:
+        """
+        returns the values of the COLD_FIELDS of `row` or an empty tuple if they are not known
+        """
+        if isinstance(self._cold, str):
+            self._cold = [tuple(values) for values in json.loads(self._cold)]
+        return self._cold[row]
+
+    def cold_field(self, row: int, field: str):
+        values = self.cold_values(row)
+        return values[COLD_FIELDS.index(field)] if values else None
+
+
+class StateSnapshot:
+    """
+    The state of a network relative to its initial state: the rows of the `ChannelTable` whose state may differ from
+    the initial state and the values of the state columns in these rows.
+
+    Snapshots are created with `snapshot()` of the OracleLightningNetwork and the UncertaintyNetwork and are only
+    valid for the topology of the network at the time of the snapshot.
+    """
+
+    __slots__ = ("rows", "values", "topology")
+
+    def __init__(self, rows: np.ndarray, values: tuple, topology: tuple):
+        self.rows = rows
+        self.values = values
+        self.topology = topology
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def capture(cls, table: ChannelTable, columns: tuple, rows, network) -> "StateSnapshot":
+        """
+        returns the values of `columns` of `table` in `rows` (any iterable of row numbers)
+        """
+        rows = np.array(sorted(rows), dtype=np.int64)
+        return cls(rows, tuple(getattr(table, column)[rows] for column in columns), network.version)
+
+    def check_topology(self, network):
+        if self.topology != network.version:
+            raise ValueError("the topology of the network changed since the snapshot was taken. Use fork() to create "
+                             "networks with different topologies")
+
+    def write(self, table: ChannelTable, columns: tuple):
+        """
+        writes the values of the snapshot to `table`
+        """
+        for column, values in zip(columns, self.values):
+            getattr(table, column)[self.rows] = values
@@ -0,0 +1,359 @@
+"""
+FlowDecomposition.py
+====================================
+Dissects the flow that the min cost flow solver found into paths from the sender to the receiver.
+
+The flows of all arcs are read from the solver in one call (if the installed OR-Tools supports it) and the arcs with a
+positive flow are aggregated per channel into a compact adjacency. The paths are then extracted with one of the
+strategies:
+
+* SHORTEST: the path with the fewest hops first, on parallel channels the one with the lowest linearized unit cost.
+  This is the decomposition of earlier versions and the default.
+* DFS: depth first search with bottleneck tracking. Every channel is visited a constant number of times, so the
+  decomposition takes linear time in the number of channels with flow plus the length of the paths.
+* WIDEST: the path with the largest bottleneck first, which results in few large attempts.
+* MOST_PROBABLE: the path whose channels are most likely to carry their flow first.
+* EQUAL_PROBABILITY: the paths of DFS, split into parts of equal amount until every part is about as likely to
+  succeed as the most likely path.
+
+    decomposition = FlowDecomposition(min_cost_flow, arc_to_channel)
+    for channels, amount in decomposition.paths(sender, receiver, WIDEST):
+        ...
+"""
+from heapq import heappush, heappop
+from math import log
+
+import numpy as np
+
+SHORTEST = "shortest"
+DFS = "dfs"
+WIDEST = "widest"
+MOST_PROBABLE = "most_probable"
+EQUAL_PROBABILITY = "equal_probability"
+STRATEGIES = (SHORTEST, DFS, WIDEST, MOST_PROBABLE, EQUAL_PROBABILITY)
+
+# a path is split into at most this many parts by EQUAL_PROBABILITY
+MAX_PARTS = 8
+
+
+def read_flows(min_cost_flow) -> np.ndarray:
+    """
+    returns the flow of every arc of the solved `min_cost_flow`
+    """
+    number_of_arcs = min_cost_flow.NumArcs()
+    if hasattr(min_cost_flow, "flows"):
+        # vectorized accessor of newer OR-Tools versions
+        return np.asarray(min_cost_flow.flows(np.arange(number_of_arcs, dtype=np.int32)))
+    return np.fromiter((min_cost_flow.Flow(i) for i in range(number_of_arcs)), dtype=np.int64, count=number_of_arcs)
+
+
+class FlowDecomposition:
+    """
+    The channels with a positive flow in a solved min cost flow problem.
+
+    Every channel with flow is an edge of the compact adjacency. The edges are numbered in the order in which the
+    solver reports their first arc, the nodes in the order in which they first appear on an edge. The flow of an edge
+    is the sum of the flows of the arcs of the piecewise linearization of the channel.
+    """
+
+    def __init__(self, min_cost_flow, arc_to_channel: dict):
+        """
+        :param arc_to_channel: look-up table from arc indices of `min_cost_flow` to (src, dest, channel, _) as it is
+            returned by `MinCostFlowModel.solve`
+        :type: dict
+        """
+        flows = read_flows(min_cost_flow)
+        self._node_ids = {}
+        self.tails, self.heads, self.flows, self.channels = [], [], [], []
+        edge_of_channel = {}
+        for i, flow in zip(np.flatnonzero(flows).tolist(), flows[flows != 0].tolist()):
+            src, dest, channel, _ = arc_to_channel[i]
+            e = edge_of_channel.get(channel.index)
+            if e is None:
+                e = edge_of_channel[channel.index] = len(self.channels)
+                self.tails.append(self._node_ids.setdefault(src, len(self._node_ids)))
+                self.heads.append(self._node_ids.setdefault(dest, len(self._node_ids)))
+                self.flows.append(flow)
+                self.channels.append(channel)
+            else:
+                self.flows[e] += flow
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self._node_ids)
+
+    def paths(self, sender: str, receiver: str, strategy: str = SHORTEST) -> list:
+        """
+        dissects the flow into paths from `sender` to `receiver`. The flow of the edges is used up.
+
+        :param strategy: one of STRATEGIES
+        :type: str
+        :return: the channels of every path and the amount that is sent along it
+        :rtype: list[tuple]
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown decomposition strategy {strategy}, expected one of {STRATEGIES}")
+        if sender == receiver or sender not in self._node_ids or receiver not in self._node_ids:
+            return []
+        s, t = self._node_ids[sender], self._node_ids[receiver]
+        if strategy == SHORTEST:
+            edge_paths = self._shortest_paths(s, t)
+        elif strategy == WIDEST:
+            edge_paths = self._best_paths(s, t, self._widest_path)
+        elif strategy == MOST_PROBABLE:
+            costs = [-log(max(channel.success_probability(flow), 1e-12))
+                     for channel, flow in zip(self.channels, self.flows)]
+            edge_paths = self._best_paths(s, t, self._most_probable_path, costs)
+        else:
+            edge_paths = self._dfs_paths(s, t)
+        paths = [([self.channels[e] for e in path], amount) for path, amount in edge_paths]
+        if strategy == EQUAL_PROBABILITY:
+            paths = equal_probability_parts(paths)
+        return paths
+
+    def _adjacency(self) -> list:
+        out_edges = [[] for _ in range(self.number_of_nodes)]
+        for e, tail in enumerate(self.tails):
+            out_edges[tail].append(e)
+        return out_edges
+
+    def _shortest_paths(self, s: int, t: int) -> list:
+        """
+        repeatedly takes the path with the fewest hops. The bidirectional breadth first search visits the nodes in the
+        same order as `nx.shortest_path` on a MultiDiGraph of the channels with flow, so the paths do not change.
+        """
+        succ = [{} for _ in range(self.number_of_nodes)]
+        pred = [{} for _ in range(self.number_of_nodes)]
+        for e, (tail, head) in enumerate(zip(self.tails, self.heads)):
+            succ[tail].setdefault(head, []).append(e)
+            pred[head].setdefault(tail, []).append(e)
+        flows = self.flows
+        weights = {}
+
+        paths = []
+        while True:
+            nodes = _bidirectional_shortest_path(succ, pred, s, t)
+            if nodes is None:
+                return paths
+            path = []
+            bottleneck = 2 ** 63
+            for u, v in zip(nodes, nodes[1:]):
+                parallel = succ[u][v]
+                e = parallel[0]
+                if len(parallel) > 1:
+                    for candidate in parallel:
+                        if candidate not in weights:
+                            weights[candidate] = self.channels[candidate].combined_linearized_unit_cost()
+                    e = min(parallel, key=weights.__getitem__)
+                path.append(e)
+                bottleneck = min(bottleneck, flows[e])
+            paths.append((path, bottleneck))
+            for u, v, e in zip(nodes, nodes[1:], path):
+                flows[e] -= bottleneck
+                if flows[e] == 0:
+                    succ[u][v].remove(e)
+                    pred[v][u].remove(e)
+                    if not succ[u][v]:
+                        del succ[u][v]
+                        del pred[v][u]
+
+    def _dfs_paths(self, s: int, t: int) -> list:
+        """
+        walks along edges with flow from `s` until `t` is reached and subtracts the bottleneck of the walk. Edges
+        without flow are skipped for good, cycles of flow that the walk runs into are cancelled.
+        """
+        out_edges = self._adjacency()
+        flows = self.flows
+        pointer = [0] * self.number_of_nodes
+        position = [-1] * self.number_of_nodes
+
+        paths = []
+        while True:
+            nodes, path = [s], []
+            position[s] = 0
+            while nodes[-1] != t:
+                v = nodes[-1]
+                edges = out_edges[v]
+                while pointer[v] < len(edges) and flows[edges[pointer[v]]] == 0:
+                    pointer[v] += 1
+                if pointer[v] == len(edges):
+                    # dead end, no flow leaves v
+                    if v == s:
+                        return paths
+                    position[v] = -1
+                    nodes.pop()
+                    flows[path.pop()] = 0
+                    continue
+                e = edges[pointer[v]]
+                w = self.heads[e]
+                if position[w] >= 0:
+                    # cancel the cycle from w back to w
+                    cycle = path[position[w]:] + [e]
+                    cycle_flow = min(flows[c] for c in cycle)
+                    for c in cycle:
+                        flows[c] -= cycle_flow
+                    for u in nodes[position[w] + 1:]:
+                        position[u] = -1
+                    del nodes[position[w] + 1:], path[position[w]:]
+                    continue
+                position[w] = len(nodes)
+                nodes.append(w)
+                path.append(e)
+
+            bottleneck = min(flows[e] for e in path)
+            for e in path:
+                flows[e] -= bottleneck
+            for u in nodes:
+                position[u] = -1
+            paths.append((path, bottleneck))
+
+    def _best_paths(self, s: int, t: int, search, *arguments) -> list:
+        """
+        repeatedly takes the path that `search` finds and subtracts its bottleneck
+        """
+        out_edges = self._adjacency()
+        paths = []
+        while True:
+            path = search(out_edges, s, t, *arguments)
+            if path is None:
+                return paths
+            bottleneck = min(self.flows[e] for e in path)
+            for e in path:
+                self.flows[e] -= bottleneck
+            paths.append((path, bottleneck))
+
+    def _widest_path(self, out_edges: list, s: int, t: int) -> list:
+        """
+        returns the edges of the path with the largest bottleneck flow or None
+        """
+        width = {s: 2 ** 63}
+        pred = {}
+        done = set()
+        fringe = [(-width[s], s)]
+        while fringe:
+            _, v = heappop(fringe)
+            if v in done:
+                continue
+            if v == t:
+                return _edges_to(pred, self.tails, t)
+            done.add(v)
+            for e in out_edges[v]:
+                w = self.heads[e]
+                edge_width = min(width[v], self.flows[e])
+                if edge_width > 0 and w not in done and edge_width > width.get(w, 0):
+                    width[w] = edge_width
+                    pred[w] = e
+                    heappush(fringe, (-edge_width, w))
+        return None
+
+    def _most_probable_path(self, out_edges: list, s: int, t: int, costs: list) -> list:
+        """
+        returns the edges of the path with flow that minimizes the sum of `costs`, i.e. maximizes the product of the
+        success probabilities of its channels for their initial flow, or None
+        """
+        distance = {s: 0.}
+        pred = {}
+        done = set()
+        fringe = [(0., s)]
+        while fringe:
+            d, v = heappop(fringe)
+            if v in done:
+                continue
+            if v == t:
+                return _edges_to(pred, self.tails, t)
+            done.add(v)
+            for e in out_edges[v]:
+                w = self.heads[e]
+                if self.flows[e] > 0 and w not in done and d + costs[e] < distance.get(w, float("inf")):
+                    distance[w] = d + costs[e]
+                    pred[w] = e
+                    heappush(fringe, (distance[w], w))
+        return None
+
+
+def _edges_to(pred: dict, tails: list, t: int) -> list:
+    path = []
+    v = t
+    while v in pred:
+        path.append(pred[v])
+        v = tails[pred[v]]
+    path.reverse()
+    return path
+
+
+def _bidirectional_shortest_path(succ: list, pred: list, s: int, t: int) -> list:
+    """
+    breadth first search from both ends as in `nx.bidirectional_shortest_path`
+
+    :return: the nodes of the path or None
+    """
+    forward, backward = {s: None}, {t: None}
+    forward_fringe, backward_fringe = [s], [t]
+    meet = None
+    while forward_fringe and backward_fringe and meet is None:
+        if len(forward_fringe) <= len(backward_fringe):
+            this_level, forward_fringe = forward_fringe, []
+            for v in this_level:
+                for w in succ[v]:
+                    if w not in forward:
+                        forward_fringe.append(w)
+                        forward[w] = v
+                    if w in backward:
+                        meet = w
+                        break
+                if meet is not None:
+                    break
+        else:
+            this_level, backward_fringe = backward_fringe, []
+            for v in this_level:
+                for w in pred[v]:
+                    if w not in backward:
+                        backward[w] = v
+                        backward_fringe.append(w)
+                    if w in forward:
+                        meet = w
+                        break
+                if meet is not None:
+                    break
+    if meet is None:
+        return None
+    nodes = []
+    v = meet
+    while v is not None:
+        nodes.append(v)
+        v = forward[v]
+    nodes.reverse()
+    v = backward[meet]
+    while v is not None:
+        nodes.append(v)
+        v = backward[v]
+    return nodes
+
+
+def equal_probability_parts(paths: list, max_parts: int = MAX_PARTS) -> list:
+    """
+    splits every path into parts of equal amount until the success probability of a part is at least the success
+    probability of the most likely path with its complete amount (or the path is split into `max_parts` parts)
+
+    :param paths: the channels of every path and its amount
+    :type: list
+    """
+    probabilities = [_path_probability(channels, amount) for channels, amount in paths]
+    if not probabilities:
+        return paths
+    target = max(probabilities)
+    parts = []
+    for (channels, amount), probability in zip(paths, probabilities):
+        k = 1
+        while probability < target and k < min(max_parts, amount):
+            k += 1
+            probability = _path_probability(channels, amount // k)
+        parts += [(channels, amount // k + (1 if j < amount % k else 0)) for j in range(k)]
+    return parts
+
+
+def _path_probability(channels: list, amount: int) -> float:
+    probability = 1.
+    for channel in channels:
+        probability *= channel.success_probability(amount)
+    return probability
@@ -0,0 +1,222 @@
+"""
+FlowLog.py
+====================================
+Columnar log of the flows of the payments: one entry for every hop of every attempt.
+
+`pickhardt_pay` records the hops of the attempts of a payment in a `FlowRecorder` as arrays: the row of the channel in
+the `ChannelTable`, the payment run, the number of the attempt, the amount and the `AttemptStatus`. A `FlowLogWriter`
+stores the hops in a directory of `.npz` chunks. Node ids and short channel ids are dictionary encoded as in the
+ChannelTable: the chunks hold integer codes and `dictionary.npz` the strings, which are written only once.
+
+    for chunk in iter_chunks("data/random_graph_pickhardtpay_prob_flow"):
+        settled = chunk["status"] == AttemptStatus.SETTLED.value
+        ...
+
+Scanning the log chunk by chunk needs memory for one chunk only. `iter_flows` yields the hops in the list format of
+earlier versions (`[src, dest, short_channel_id, payment run, attempt, amount, "1", status name]`).
+"""
+import os
+import re
+
+import numpy as np
+
+from .Attempt import AttemptStatus
+
+# maximal number of hops in a chunk
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+COLUMNS = ("src", "dest", "scid", "run", "attempt", "amount", "status")
+DICTIONARY_FILE = "dictionary.npz"
+CHUNK_FILE = "flows_{:06d}.npz"
+_CHUNK_PATTERN = re.compile(r"flows_(\d{6})\.npz$")
+
+
+class FlowRecorder:
+    """
+    The hops of the attempts of one or more payments as columns: `rows` (row of the channel in the ChannelTable),
+    `run`, `attempt`, `amount` and `status` (value of the `AttemptStatus`).
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._columns = None
+
+    def add_attempts(self, payment_run: int, attempts: list):
+        """
+        records every hop of `attempts` with the current status of its attempt. Attempts are numbered from 1.
+        """
+        rows, numbers, amounts, statuses = [], [], [], []
+        for c, attempt in enumerate(attempts, 1):
+            hops = len(attempt.path)
+            rows.extend(channel.index for channel in attempt.path)
+            numbers.extend([c] * hops)
+            amounts.extend([attempt.amount] * hops)
+            statuses.extend([attempt.status.value] * hops)
+        self._parts.append((np.array(rows, dtype=np.int64), np.full(len(rows), payment_run, dtype=np.int64),
+                            np.array(numbers, dtype=np.int32), np.array(amounts, dtype=np.int64),
+                            np.array(statuses, dtype=np.int8)))
+        self._columns = None
+
+    def extend(self, other: "FlowRecorder"):
+        """
+        appends the hops of `other`
+        """
+        self._parts.extend(other._parts)
+        self._columns = None
+
+    def clear(self):
+        self._parts = []
+        self._columns = None
+
+    def columns(self) -> tuple:
+        """
+        returns the arrays `rows`, `run`, `attempt`, `amount` and `status` of all hops
+        """
+        if self._columns is None:
+            if not self._parts:
+                self._parts = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                                np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8))]
+            self._parts = [tuple(np.concatenate(column) for column in zip(*self._parts))]
+            self._columns = self._parts[0]
+        return self._columns
+
+    def __len__(self):
+        return sum(len(part[0]) for part in self._parts)
+
+    def __eq__(self, other):
+        if not isinstance(other, FlowRecorder):
+            return NotImplemented
+        return all(np.array_equal(a, b) for a, b in zip(self.columns(), other.columns()))
+
+    def as_lists(self, table) -> list:
+        """
+        returns the hops in the list format of earlier versions, see `iter_flows`
+        """
+        rows, run, attempt, amount, status = self.columns()
+        return _flow_lists(table.nodes, table.short_channel_ids, table.src[rows], table.dest[rows], table.scid[rows],
+                           run, attempt, amount, status)
+
+
+def _flow_lists(nodes: list, short_channel_ids: list, src, dest, scid, run, attempt, amount, status) -> list:
+    names = {status.value: status.name for status in AttemptStatus}
+    return [[nodes[s], nodes[d], short_channel_ids[k], r, a, m, "1", names[t]]
+            for s, d, k, r, a, m, t in zip(src.tolist(), dest.tolist(), scid.tolist(), run.tolist(),
+                                           attempt.tolist(), amount.tolist(), status.tolist())]
+
+
+def attempt_flow_lists(payment_run: int, attempts: list) -> list:
+    """
+    returns the hops of `attempts` in the list format of earlier versions
+    """
+    return [[channel.src, channel.dest, channel.short_channel_id, payment_run, c, attempt.amount, "1",
+             attempt.status.name]
+            for c, attempt in enumerate(attempts, 1) for channel in attempt.path]
+
+
+def _write_npz(file: str, **arrays):
+    tmp_file = file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, file)
+
+
+def chunk_files(directory: str) -> list:
+    """
+    returns the chunk files of the flow log in `directory` in the order in which they were written
+    """
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if _CHUNK_PATTERN.match(name)]
+
+
+class FlowLogWriter:
+    """
+    Writes the hops of `FlowRecorder`s to the chunks of a flow log in `directory`.
+    """
+
+    def __init__(self, directory: str, table, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        :param table: the ChannelTable of the channels of the recorded hops
+        :type: ChannelTable
+        :param chunk_size: maximal number of hops in a chunk
+        :type: int
+        """
+        self.directory = directory
+        self._table = table
+        self.chunk_size = chunk_size
+        self.chunks = 0
+        self._pending = FlowRecorder()
+
+    def open(self, chunks: int = 0):
+        """
+        keeps the first `chunks` chunks of the log and removes the others, e.g. to continue after a checkpoint
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for file in chunk_files(self.directory)[chunks:]:
+            os.remove(file)
+        self.chunks = chunks
+        self._pending.clear()
+        _write_npz(os.path.join(self.directory, DICTIONARY_FILE),
+                   nodes=np.array(self._table.nodes, dtype=str),
+                   short_channel_ids=np.array(self._table.short_channel_ids, dtype=str))
+
+    def write(self, flows: FlowRecorder):
+        """
+        appends the hops of `flows`. A chunk is written as soon as `chunk_size` hops are pending.
+        """
+        self._pending.extend(flows)
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        writes the pending hops to disk
+
+        :return: the number of chunks of the log
+        :rtype: int
+        """
+        if len(self._pending):
+            rows, run, attempt, amount, status = self._pending.columns()
+            table = self._table
+            for start in range(0, len(rows), self.chunk_size):
+                part = slice(start, start + self.chunk_size)
+                _write_npz(os.path.join(self.directory, CHUNK_FILE.format(self.chunks)),
+                           src=table.src[rows[part]], dest=table.dest[rows[part]], scid=table.scid[rows[part]],
+                           run=run[part], attempt=attempt[part], amount=amount[part], status=status[part])
+                self.chunks += 1
+            self._pending.clear()
+        return self.chunks
+
+    def clear(self):
+        """
+        drops the pending hops
+        """
+        self._pending.clear()
+
+
+def read_dictionary(directory: str) -> tuple:
+    """
+    returns the node ids and the short channel ids of the codes in the chunks of the flow log in `directory`
+    """
+    with np.load(os.path.join(directory, DICTIONARY_FILE)) as data:
+        return data["nodes"].tolist(), data["short_channel_ids"].tolist()
+
+
+def iter_chunks(directory: str):
+    """
+    yields the chunks of the flow log in `directory` as dictionaries of the COLUMNS
+    """
+    for file in chunk_files(directory):
+        with np.load(file) as data:
+            yield {column: data[column] for column in COLUMNS}
+
+
+def iter_flows(directory: str):
+    """
+    yields the hops of the flow log in `directory` in the list format of earlier versions
+    """
+    nodes, short_channel_ids = read_dictionary(directory)
+    for chunk in iter_chunks(directory):
+        yield from _flow_lists(nodes, short_channel_ids, *(chunk[column] for column in COLUMNS))
@@ -0,0 +1,251 @@
+"""
+FlowNetting.py
+====================================
+Aggregates and nets the settled flows of a simulation run.
+
+The settled hops are grouped by channel (source, destination, short channel id) and their amounts are added up. The
+flows of a channel and its return channel (same short channel id, opposite direction) are then netted: only the
+difference remains, in the direction of the larger flow. Both steps are sort-based group-bys over the integer codes of
+the flow log (see `FlowLog`). The hops are read chunk by chunk, so the memory depends on the number of channels with
+flow and not on the number of hops.
+
+    netting = FlowNetting.from_flow_log("data/random_graph_pickhardtpay_prob_flow")
+    netting.write_edges("data/1337_12345_edges_with_netted_flows.ndjson")
+    netting.write_node_totals("data/1337_12345_node_flows.ndjson")
+
+Flows in the NDJSON list format of earlier versions are read with `FlowNetting.from_ndjson`.
+"""
+import json
+
+import numpy as np
+
+from .Attempt import AttemptStatus
+from .FlowLog import DEFAULT_CHUNK_SIZE, iter_chunks, read_dictionary
+
+SETTLED = AttemptStatus.SETTLED.value
+
+
+def iter_ndjson_chunks(file: str, nodes: list, short_channel_ids: list, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    yields the hops of an NDJSON file of flows in the list format of earlier versions as chunks of a flow log. The
+    node ids and short channel ids are dictionary encoded into `nodes` and `short_channel_ids`, which are extended.
+    """
+    node_index = {node_id: k for k, node_id in enumerate(nodes)}
+    scid_index = {short_channel_id: k for k, short_channel_id in enumerate(short_channel_ids)}
+    statuses = {status.name: status.value for status in AttemptStatus}
+
+    def encode(value, values, index):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(values)
+            values.append(value)
+        return code
+
+    columns = ([], [], [], [], [], [], [])
+    with open(file) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            src, dest, short_channel_id, run, attempt, amount, _, status = json.loads(line)
+            for column, value in zip(columns, (encode(src, nodes, node_index), encode(dest, nodes, node_index),
+                                               encode(short_channel_id, short_channel_ids, scid_index), run,
+                                               attempt, amount, statuses[status])):
+                column.append(value)
+            if len(columns[0]) >= chunk_size:
+                yield _chunk(columns)
+                columns = ([], [], [], [], [], [], [])
+    if columns[0]:
+        yield _chunk(columns)
+
+
+def _chunk(columns: tuple) -> dict:
+    src, dest, scid, run, attempt, amount, status = columns
+    return {"src": np.array(src, dtype=np.int64), "dest": np.array(dest, dtype=np.int64),
+            "scid": np.array(scid, dtype=np.int64), "run": np.array(run, dtype=np.int64),
+            "attempt": np.array(attempt, dtype=np.int64), "amount": np.array(amount, dtype=np.int64),
+            "status": np.array(status, dtype=np.int8)}
+
+
+class EdgeFlows:
+    """
+    Flows per channel: the channel as codes of `src`, `dest` and `scid`, the `amount`, and the `run` and `attempt`
+    of the first settled hop over the channel, whose position among all settled hops is `first`.
+    """
+
+    __slots__ = ("src", "dest", "scid", "amount", "run", "attempt", "first")
+
+    def __init__(self, src, dest, scid, amount, run, attempt, first):
+        self.src = src
+        self.dest = dest
+        self.scid = scid
+        self.amount = amount
+        self.run = run
+        self.attempt = attempt
+        self.first = first
+
+    @classmethod
+    def empty(cls):
+        return cls(*(np.zeros(0, dtype=np.int64) for _ in cls.__slots__))
+
+    def __len__(self):
+        return len(self.src)
+
+    def take(self, positions: np.ndarray) -> "EdgeFlows":
+        return EdgeFlows(*(getattr(self, name)[positions] for name in self.__slots__))
+
+    @staticmethod
+    def concatenate(first: "EdgeFlows", second: "EdgeFlows") -> "EdgeFlows":
+        return EdgeFlows(*(np.concatenate((getattr(first, name), getattr(second, name)))
+                           for name in EdgeFlows.__slots__))
+
+
+def aggregate(edges: EdgeFlows) -> EdgeFlows:
+    """
+    adds up the amounts of the entries of the same channel. The run, attempt and position of the earliest entry are
+    kept, the result is ordered by the channel codes.
+    """
+    if not len(edges):
+        return edges
+    # the earliest entry of a channel comes first in its group
+    edges = edges.take(np.lexsort((edges.first, edges.scid, edges.dest, edges.src)))
+    starts = np.flatnonzero(np.concatenate(([True], (edges.src[1:] != edges.src[:-1])
+                                            | (edges.dest[1:] != edges.dest[:-1])
+                                            | (edges.scid[1:] != edges.scid[:-1]))))
+    amount = np.add.reduceat(edges.amount, starts)
+    groups = edges.take(starts)
+    groups.amount = amount
+    return groups
+
+
+def net(edges: EdgeFlows) -> tuple:
+    """
+    nets the flows of every channel with the flow of its return channel. The entry of the channel with the earlier
+    first hop is kept with the difference of both amounts; if the difference is negative, the direction of the entry
+    is turned around. The result is ordered by the first hop.
+
+    :param edges: aggregated flows, see `aggregate`
+    :return: the netted flows and the number of channels with flow in both directions
+    :rtype: tuple
+    """
+    low, high = np.minimum(edges.src, edges.dest), np.maximum(edges.src, edges.dest)
+    order = np.lexsort((edges.first, edges.scid, high, low))
+    edges = edges.take(order)
+    low, high = low[order], high[order]
+    same_pair = (low[1:] == low[:-1]) & (high[1:] == high[:-1]) & (edges.scid[1:] == edges.scid[:-1])
+    # positions of the kept entries that have a partner in the opposite direction right after them
+    paired = np.flatnonzero(same_pair)
+    keep = np.ones(len(edges), dtype=bool)
+    keep[paired + 1] = False
+    amount = edges.amount.copy()
+    amount[paired] -= edges.amount[paired + 1]
+    edges = EdgeFlows(edges.src, edges.dest, edges.scid, amount, edges.run, edges.attempt, edges.first).take(
+        np.flatnonzero(keep))
+    negative = edges.amount < 0
+    edges.src, edges.dest = np.where(negative, edges.dest, edges.src), np.where(negative, edges.src, edges.dest)
+    edges.amount = np.abs(edges.amount)
+    return edges.take(np.argsort(edges.first, kind="stable")), len(paired)
+
+
+class FlowNetting:
+    """
+    The settled flows of a run aggregated per channel and netted per pair of channel and return channel.
+    """
+
+    def __init__(self, chunks, nodes: list, short_channel_ids: list):
+        """
+        :param chunks: iterable over the chunks of a flow log (see `FlowLog.iter_chunks`)
+        :param nodes: node ids of the codes in the chunks
+        :type: list
+        :param short_channel_ids: short channel ids of the codes in the chunks
+        :type: list
+        """
+        self.nodes = nodes
+        self.short_channel_ids = short_channel_ids
+        self.number_of_flows = 0
+        self.number_of_settled_flows = 0
+        self.gross_flow = 0
+
+        edges = pending = EdgeFlows.empty()
+        for chunk in chunks:
+            settled = chunk["status"] == SETTLED
+            amount = chunk["amount"][settled].astype(np.int64)
+            positions = np.arange(self.number_of_settled_flows, self.number_of_settled_flows + len(amount))
+            self.number_of_flows += len(chunk["status"])
+            self.number_of_settled_flows += len(amount)
+            self.gross_flow += int(amount.sum())
+            hops = EdgeFlows(*(chunk[column][settled].astype(np.int64) for column in ("src", "dest", "scid")),
+                             amount, chunk["run"][settled].astype(np.int64),
+                             chunk["attempt"][settled].astype(np.int64), positions)
+            pending = EdgeFlows.concatenate(pending, aggregate(hops))
+            if len(pending) > len(edges):
+                # merged only when the pending channels outnumber the aggregated ones, so every entry is sorted a
+                # logarithmic number of times
+                edges, pending = aggregate(EdgeFlows.concatenate(edges, pending)), EdgeFlows.empty()
+        edges = aggregate(EdgeFlows.concatenate(edges, pending))
+        self.edges = edges.take(np.argsort(edges.first, kind="stable"))
+        self.netted_edges, self.edges_with_flow_on_return_channel = net(self.edges)
+
+    @classmethod
+    def from_flow_log(cls, directory: str) -> "FlowNetting":
+        nodes, short_channel_ids = read_dictionary(directory)
+        return cls(iter_chunks(directory), nodes, short_channel_ids)
+
+    @classmethod
+    def from_ndjson(cls, file: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> "FlowNetting":
+        """
+        reads the flows from an NDJSON file in the list format of earlier versions
+        """
+        nodes, short_channel_ids = [], []
+        return cls(iter_ndjson_chunks(file, nodes, short_channel_ids, chunk_size), nodes, short_channel_ids)
+
+    @property
+    def net_flow(self) -> int:
+        return int(self.netted_edges.amount.sum())
+
+    def edge_lists(self, edges: EdgeFlows = None) -> list:
+        """
+        returns the netted flows (or `edges`) in the list format of the flows of earlier versions
+        """
+        edges = self.netted_edges if edges is None else edges
+        return [[self.nodes[src], self.nodes[dest], self.short_channel_ids[scid], run, attempt, amount, "1",
+                 AttemptStatus.SETTLED.name]
+                for src, dest, scid, run, attempt, amount in zip(edges.src.tolist(), edges.dest.tolist(),
+                                                                 edges.scid.tolist(), edges.run.tolist(),
+                                                                 edges.attempt.tolist(), edges.amount.tolist())]
+
+    def node_totals(self) -> dict:
+        """
+        returns the flows of every node with flow: the gross amounts it sent (`gross_out`) and received (`gross_in`)
+        over all settled hops, the same after netting (`netted_out`, `netted_in`) and the net amount it received
+        (`net`, negative if it sent more than it received)
+        """
+        size = len(self.nodes)
+        totals = {"gross_out": np.bincount(self.edges.src, self.edges.amount, size),
+                  "gross_in": np.bincount(self.edges.dest, self.edges.amount, size),
+                  "netted_out": np.bincount(self.netted_edges.src, self.netted_edges.amount, size),
+                  "netted_in": np.bincount(self.netted_edges.dest, self.netted_edges.amount, size)}
+        totals = {name: np.rint(values).astype(np.int64) for name, values in totals.items()}
+        totals["net"] = totals["gross_in"] - totals["gross_out"]
+        with_flow = np.flatnonzero(totals["gross_out"] + totals["gross_in"])
+        return {self.nodes[k]: {name: int(values[k]) for name, values in totals.items()} for k in with_flow.tolist()}
+
+    def write_edges(self, file: str):
+        """
+        writes the netted flows as NDJSON in the list format of the flows of earlier versions
+        """
+        with open(file, "w") as f:
+            for edge in self.edge_lists():
+                f.write(json.dumps(edge) + "\n")
+
+    def write_node_totals(self, file: str):
+        """
+        writes the totals of every node with flow as NDJSON, see `node_totals`
+
+        :return: the number of nodes with flow
+        :rtype: int
+        """
+        node_totals = self.node_totals()
+        with open(file, "w") as f:
+            for node, totals in node_totals.items():
+                f.write(json.dumps(dict(node=node, **totals)) + "\n")
+        return len(node_totals)
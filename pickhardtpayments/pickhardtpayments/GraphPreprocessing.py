@@ -0,0 +1,228 @@
+"""
+GraphPreprocessing.py
+====================================
+Vectorized filters that prepare a ChannelGraph for a simulation.
+
+Every filter computes over the columns of the `ChannelTable` which channels (or nodes) of the network it keeps, so no
+channel is looked up through networkx. The filters are applied one after the other with `preprocess`, each filter
+sees the network that the previous filters left over, which reports how many channels and nodes every filter removed.
+
+    channel_graph = ChannelGraph("listchannels.json")
+    preprocess(channel_graph, [BaseFeeFilter(0), ReturnChannelFilter(), LargestComponentFilter()])
+"""
+import logging
+
+import numpy as np
+
+from .ChannelGraph import ChannelGraph
+
+
+def reverse_channel_positions(channel_graph: ChannelGraph, rows: np.ndarray = None) -> np.ndarray:
+    """
+    returns for every channel of `rows` the position of its return channel (same short channel id, opposite
+    direction) within `rows` or -1 if the return channel is not part of `rows`
+
+    :param rows: rows of the ChannelTable, defaults to the channels of the network
+    :type: np.ndarray
+    """
+    table = channel_graph.table
+    if rows is None:
+        rows = channel_graph.channel_indices()
+    src = table.src[rows].astype(np.int64)
+    dest = table.dest[rows].astype(np.int64)
+    scid = table.scid[rows].astype(np.int64)
+    number_of_nodes, number_of_scids = len(table.nodes), len(table.short_channel_ids)
+    keys = (src * number_of_nodes + dest) * number_of_scids + scid
+    reverse_keys = (dest * number_of_nodes + src) * number_of_scids + scid
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    positions = np.minimum(np.searchsorted(sorted_keys, reverse_keys), max(len(keys) - 1, 0))
+    found = sorted_keys[positions] == reverse_keys if len(keys) else np.zeros(0, dtype=bool)
+    return np.where(found, order[positions], -1)
+
+
+class ChannelFilter:
+    """
+    Base class of the filters. A filter either removes channels (`keep_channels`) or nodes together with their
+    channels (`remove_nodes`).
+    """
+    name = "filter"
+
+    @property
+    def parameters(self) -> dict:
+        """
+        json serializable description of the filter, e.g. for the key of a GraphSnapshot
+        """
+        return {"filter": self.name}
+
+    def keep_channels(self, channel_graph: ChannelGraph, rows: np.ndarray) -> np.ndarray:
+        """
+        returns a boolean mask over `rows` (the channels of the network in the order of `network.edges`) of the
+        channels that stay in the network
+        """
+        return np.ones(len(rows), dtype=bool)
+
+    def remove_nodes(self, channel_graph: ChannelGraph, rows: np.ndarray) -> list:
+        """
+        returns the node ids that are removed from the network together with all their channels
+        """
+        return []
+
+
+class BaseFeeFilter(ChannelFilter):
+    """
+    Removes every channel whose return channel has a base fee larger than `base_threshold`.
+    """
+    name = "base_fee"
+
+    def __init__(self, base_threshold: int = 0):
+        self.base_threshold = base_threshold
+
+    @property
+    def parameters(self) -> dict:
+        return {"filter": self.name, "base_threshold": self.base_threshold}
+
+    def keep_channels(self, channel_graph: ChannelGraph, rows: np.ndarray) -> np.ndarray:
+        reverse = reverse_channel_positions(channel_graph, rows)
+        reverse_base_fee = channel_graph.table.base_fee[rows[np.maximum(reverse, 0)]]
+        return (reverse < 0) | (reverse_base_fee <= self.base_threshold)
+
+
+class ReturnChannelFilter(ChannelFilter):
+    """
+    Removes every channel without return channel. Without return channels, no settlement is possible.
+    """
+    name = "return_channel"
+
+    def keep_channels(self, channel_graph: ChannelGraph, rows: np.ndarray) -> np.ndarray:
+        return reverse_channel_positions(channel_graph, rows) >= 0
+
+
+class MinCapacityFilter(ChannelFilter):
+    """
+    Removes every channel with a capacity smaller than `min_capacity`.
+    """
+    name = "min_capacity"
+
+    def __init__(self, min_capacity: int):
+        self.min_capacity = min_capacity
+
+    @property
+    def parameters(self) -> dict:
+        return {"filter": self.name, "min_capacity": self.min_capacity}
+
+    def keep_channels(self, channel_graph: ChannelGraph, rows: np.ndarray) -> np.ndarray:
+        return channel_graph.table.capacity[rows] >= self.min_capacity
+
+
+class CentralNodesFilter(ChannelFilter):
+    """
+    Removes the `number_of_nodes` first nodes of `ranked_nodes`, e.g. the nodes sorted by betweenness centrality.
+    """
+    name = "central_nodes"
+
+    def __init__(self, ranked_nodes: list, number_of_nodes: int):
+        self.ranked_nodes = list(ranked_nodes)
+        self.number_of_nodes = number_of_nodes
+
+    @property
+    def parameters(self) -> dict:
+        return {"filter": self.name, "nodes": self.ranked_nodes[:self.number_of_nodes]}
+
+    def remove_nodes(self, channel_graph: ChannelGraph, rows: np.ndarray) -> list:
+        return [node for node in self.ranked_nodes[:self.number_of_nodes] if node in channel_graph.network]
+
+
+def _reachable(indptr: np.ndarray, heads: np.ndarray, start: int) -> np.ndarray:
+    """
+    returns a boolean mask of the nodes that are reachable from `start` in the CSR graph (`indptr`, `heads`)
+    """
+    reached = np.zeros(len(indptr) - 1, dtype=bool)
+    reached[start] = True
+    frontier = np.array([start])
+    while len(frontier):
+        begin, end = indptr[frontier], indptr[frontier + 1]
+        lengths = end - begin
+        positions = np.repeat(begin - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        neighbors = np.unique(heads[positions])
+        frontier = neighbors[~reached[neighbors]]
+        reached[frontier] = True
+    return reached
+
+
+class LargestComponentFilter(ChannelFilter):
+    """
+    Restricts the network to its largest strongly connected component. All other nodes are removed.
+
+    The component of the node with the most channels is found with a forward and a backward search over the channel
+    arrays. If it contains more than half of the nodes it is the largest one, otherwise all strongly connected
+    components are computed with networkx.
+    """
+    name = "largest_component"
+
+    def remove_nodes(self, channel_graph: ChannelGraph, rows: np.ndarray) -> list:
+        table = channel_graph.table
+        network = channel_graph.network
+        number_of_nodes = len(table.nodes)
+        src, dest = table.src[rows], table.dest[rows]
+        if len(rows) == 0:
+            # every node is a component of its own
+            return list(network.nodes())[1:]
+
+        degree = np.bincount(src, minlength=number_of_nodes) + np.bincount(dest, minlength=number_of_nodes)
+        start = int(np.argmax(degree))
+        component = np.ones(number_of_nodes, dtype=bool)
+        for tails, heads in ((src, dest), (dest, src)):
+            order = np.argsort(tails, kind="stable")
+            indptr = np.concatenate(([0], np.cumsum(np.bincount(tails, minlength=number_of_nodes))))
+            component &= _reachable(indptr, heads[order], start)
+
+        if 2 * component.sum() <= network.number_of_nodes():
+            import networkx as nx
+
+            condensed = nx.DiGraph()
+            condensed.add_edges_from(np.unique(np.stack((src, dest), axis=1), axis=0).tolist())
+            component[:] = False
+            component[list(max(nx.strongly_connected_components(condensed), key=len))] = True
+        return [node for node in network.nodes() if not component[table.node_index(node)]]
+
+
+def preprocess(channel_graph: ChannelGraph, filters: list) -> list:
+    """
+    applies `filters` one after the other to the network of `channel_graph`
+
+    :param filters: list of ChannelFilter
+    :return: a report for every filter with the number of removed channels and nodes
+    :rtype: list
+    """
+    report = []
+    table = channel_graph.table
+    network = channel_graph.network
+    # removing nodes and channels keeps the order of the remaining channels, so `rows` stays in the order of
+    # `network.edges` without iterating the network again
+    rows = channel_graph.channel_indices()
+    for channel_filter in filters:
+        number_of_channels, number_of_nodes = len(rows), network.number_of_nodes()
+
+        nodes = channel_filter.remove_nodes(channel_graph, rows)
+        if nodes:
+            network.remove_nodes_from(nodes)
+            codes = [table.node_index(node) for node in nodes]
+            rows = rows[~(np.isin(table.src[rows], codes) | np.isin(table.dest[rows], codes))]
+        keep = channel_filter.keep_channels(channel_graph, rows)
+        if not keep.all():
+            removed = rows[~keep].tolist()
+            network.remove_edges_from([(table.nodes[table.src[k]], table.nodes[table.dest[k]],
+                                        table.short_channel_ids[table.scid[k]]) for k in removed])
+            rows = rows[keep]
+
+        stage = {"filter": channel_filter.name,
+                 "removed_channels": number_of_channels - len(rows),
+                 "removed_nodes": number_of_nodes - network.number_of_nodes(),
+                 "channels": len(rows),
+                 "nodes": network.number_of_nodes()}
+        logging.info("{}: removed {:,} channels and {:,} nodes, {:,} channels left".format(
+            stage["filter"], stage["removed_channels"], stage["removed_nodes"], stage["channels"]))
+        report.append(stage)
+    return report
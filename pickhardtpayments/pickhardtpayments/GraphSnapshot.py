@@ -0,0 +1,150 @@
+"""
+GraphSnapshot.py
+====================================
+Binary snapshots of a (filtered) ChannelGraph.
+
+Parsing the listchannels json dump and filtering the channels takes much longer than loading the resulting arrays.
+A snapshot is an uncompressed `.npz` file with the columns of the channels that are part of the network, a string
+table of the node ids and one of the short channel ids. The snapshot is stored under a key that is derived from the
+hash of the source file and the parameters of the filters, so changing either of them creates a new snapshot.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from .ChannelGraph import ChannelGraph
+from .ChannelTable import ChannelTable
+from .GraphPreprocessing import preprocess
+
+# increase whenever the layout of the snapshot changes
+SNAPSHOT_FORMAT = 1
+
+
+def source_hash(file: str) -> str:
+    """
+    returns the sha256 hex digest of the content of `file`
+    """
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_key(source_digest: str, parameters: dict = None) -> str:
+    """
+    returns the key of the snapshot of the source with hash `source_digest` after filtering with `parameters`
+    """
+    description = json.dumps({"format": SNAPSHOT_FORMAT, "source": source_digest, "parameters": parameters or {}},
+                             sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def network_hash(channel_graph: ChannelGraph) -> str:
+    """
+    returns the sha256 hex digest of the topology of the network of `channel_graph`: its nodes and the pairs of nodes
+    that are connected by at least one channel. The hash does not depend on the order of nodes and channels.
+    """
+    table = channel_graph.table
+    rows = channel_graph.channel_indices()
+    pairs = np.unique(np.stack((table.src[rows], table.dest[rows]), axis=1), axis=0)
+    digest = hashlib.sha256()
+    digest.update("\n".join(sorted(channel_graph.network.nodes())).encode())
+    digest.update("\n".join(sorted(f"{table.nodes[src]} {table.nodes[dest]}" for src, dest in pairs.tolist())).encode())
+    return digest.hexdigest()
+
+
+def save_graph_snapshot(channel_graph: ChannelGraph, file: str, key: str = ""):
+    """
+    writes the channels of the network of `channel_graph` to `file`. Nodes and channels are stored in the order of the
+    network, so that the loaded network iterates in the same order.
+    """
+    table = channel_graph.table
+    network = channel_graph.network
+    rows = channel_graph.channel_indices()
+    nodes = list(network.nodes())
+    node_codes = np.full(len(table.nodes), -1, dtype=np.int32)
+    node_codes[[table.node_index(node_id) for node_id in nodes]] = np.arange(len(nodes), dtype=np.int32)
+    scids, scid_codes = np.unique(table.scid[rows], return_inverse=True)
+
+    tmp_file = file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        np.savez(f,
+                 key=np.array(key),
+                 nodes=np.array(nodes, dtype=str),
+                 short_channel_ids=np.array([table.short_channel_ids[k] for k in scids.tolist()], dtype=str),
+                 src=node_codes[table.src[rows]],
+                 dest=node_codes[table.dest[rows]],
+                 scid=scid_codes.astype(np.int32),
+                 capacity=table.capacity[rows],
+                 ppm=table.ppm[rows],
+                 base_fee=table.base_fee[rows],
+                 cold=np.array(json.dumps([table.cold_values(row) for row in rows.tolist()])))
+    os.replace(tmp_file, file)
+
+
+def load_graph_snapshot(file: str, key: str = None):
+    """
+    loads a ChannelGraph from a snapshot
+
+    :param key: if given, the snapshot is only loaded if it was stored under this key
+    :type: str
+    :return: the ChannelGraph or None if the key does not match
+    """
+    with np.load(file) as data:
+        if key is not None and str(data["key"]) != key:
+            return None
+        nodes = data["nodes"].tolist()
+        table = ChannelTable(nodes, data["short_channel_ids"].tolist(), data["src"], data["dest"], data["scid"],
+                             data["capacity"], data["ppm"], data["base_fee"], str(data["cold"]))
+    return ChannelGraph.from_table(table, nodes)
+
+
+def load_channel_graph(listchannels_file: str, prepare=None, parameters: dict = None, snapshot_dir: str = None,
+                       base_threshold: int = None, return_channels_only: bool = False, filters: list = None):
+    """
+    returns the ChannelGraph of `listchannels_file` after applying `prepare` to it.
+
+    The prepared graph is cached in a snapshot next to the source file (or in `snapshot_dir`). The snapshot is used as
+    long as the content of the source file and `parameters` do not change. As `prepare` itself is not part of the key,
+    `parameters` has to describe everything `prepare` does.
+
+    :param prepare: function that receives the ChannelGraph and returns the filtered ChannelGraph
+    :param parameters: json serializable description of `prepare`, e.g. `{"min_capacity": 1000}`
+    :type: dict
+    :param base_threshold: filter of `ChannelGraph.from_listchannels` that is applied while the dump is read
+    :type: int
+    :param return_channels_only: filter of `ChannelGraph.from_listchannels` that is applied while the dump is read
+    :type: bool
+    :param filters: ChannelFilters of `GraphPreprocessing` that are applied before `prepare`. Their parameters are
+        part of the key of the snapshot.
+    :type: list
+    """
+    parameters = dict(parameters or {})
+    if filters:
+        parameters["filters"] = [channel_filter.parameters for channel_filter in filters]
+    if base_threshold is not None:
+        parameters["base_threshold"] = base_threshold
+    if return_channels_only:
+        parameters["return_channels"] = True
+    key = snapshot_key(source_hash(listchannels_file), parameters)
+    directory = snapshot_dir if snapshot_dir is not None else os.path.dirname(os.path.abspath(listchannels_file))
+    snapshot_file = os.path.join(directory, f"{os.path.basename(listchannels_file)}.{key[:16]}.npz")
+    if os.path.exists(snapshot_file):
+        channel_graph = load_graph_snapshot(snapshot_file, key)
+        if channel_graph is not None:
+            logging.info(f"channel graph loaded from snapshot {snapshot_file}")
+            return channel_graph
+
+    channel_graph = ChannelGraph.from_listchannels(listchannels_file, base_threshold, return_channels_only)
+    if filters:
+        preprocess(channel_graph, filters)
+    if prepare is not None:
+        channel_graph = prepare(channel_graph)
+    os.makedirs(directory, exist_ok=True)
+    save_graph_snapshot(channel_graph, snapshot_file, key)
+    logging.info(f"snapshot of channel graph written to {snapshot_file}")
+    return channel_graph
@@ -0,0 +1,182 @@
+"""
+LiquidityPriors.py
+====================================
+Distributions of the actual liquidity of the channels of an OracleLightningNetwork.
+
+The liquidity of all channels is drawn in one vectorized pass from a single seeded random generator. A channel and
+its return channel (same short channel id, opposite direction) share their capacity, so only the channel that comes
+first in the network draws its liquidity and the return channel gets `capacity - liquidity`.
+
+    oracle = OracleLightningNetwork(channel_graph, prior=BimodalPrior(0.1), seed=7)
+"""
+import random
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from .GraphPreprocessing import reverse_channel_positions
+
+DEFAULT_LIQUIDITY_SEED = 12345
+
+
+class LiquidityPrior(ABC):
+    """
+    Base class of the priors. A prior assigns the liquidity of all channels of a network.
+    """
+    name = "prior"
+
+    @abstractmethod
+    def assign(self, capacity: np.ndarray, reverse: np.ndarray, seed: int = DEFAULT_LIQUIDITY_SEED) -> np.ndarray:
+        """
+        returns the liquidity of the channels with `capacity` such that the liquidity of a channel and its return
+        channel add up to the capacity
+
+        :param reverse: position of the return channel of every channel or -1, see `reverse_channel_positions`
+        :type: np.ndarray
+        """
+
+
+class SamplingPrior(LiquidityPrior):
+    """
+    Base class of the priors that draw the liquidity of every channel from a random generator seeded with `seed`. The
+    return channel of a channel gets `capacity - liquidity`.
+    """
+
+    @abstractmethod
+    def sample(self, capacity: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """
+        returns a liquidity between 0 and the capacity for every channel
+        """
+
+    def assign(self, capacity: np.ndarray, reverse: np.ndarray, seed: int = DEFAULT_LIQUIDITY_SEED) -> np.ndarray:
+        liquidity = self.sample(capacity, np.random.default_rng(seed))
+        positions = np.arange(len(capacity))
+        second = (reverse >= 0) & (reverse < positions)
+        opposite_liquidity = capacity[second] - liquidity[reverse[second]]
+        # channels whose capacity differs from the capacity of the return channel keep their own liquidity
+        consistent = (opposite_liquidity >= 0) & (opposite_liquidity <= capacity[second])
+        liquidity[positions[second][consistent]] = opposite_liquidity[consistent]
+        return liquidity
+
+
+class SharePrior(SamplingPrior):
+    """
+    Base class of the priors that draw the share of the capacity that is on the side of a channel.
+    """
+
+    @abstractmethod
+    def sample_share(self, number_of_channels: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        returns the share of the capacity (between 0 and 1) that is liquidity for `number_of_channels` channels
+        """
+
+    def sample(self, capacity: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        liquidity = np.rint(self.sample_share(len(capacity), rng) * capacity).astype(np.int64)
+        return np.clip(liquidity, 0, capacity)
+
+
+class UniformPrior(SamplingPrior):
+    """
+    Every liquidity between 0 and the capacity is equally likely.
+    """
+    name = "uniform"
+
+    def sample(self, capacity: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        return rng.integers(0, capacity, endpoint=True)
+
+
+class BimodalPrior(SharePrior):
+    """
+    Most of the liquidity is on one side of the channel. The share on the emptier side follows an exponential
+    distribution with mean `scale` (relative to the capacity) truncated to the capacity.
+    """
+    name = "bimodal"
+
+    def __init__(self, scale: float = 0.1):
+        self.scale = scale
+
+    def sample_share(self, number_of_channels: int, rng: np.random.Generator) -> np.ndarray:
+        uniform = rng.random(number_of_channels)
+        share = -self.scale * np.log1p(-uniform * -np.expm1(-1 / self.scale))
+        return np.where(rng.random(number_of_channels) < 0.5, share, 1 - share)
+
+
+class OneSidedPrior(SharePrior):
+    """
+    With `probability` the complete capacity is on one (random) side of the channel, otherwise the liquidity is
+    uniformly distributed.
+    """
+    name = "one_sided"
+
+    def __init__(self, probability: float = 0.5):
+        self.probability = probability
+
+    def sample_share(self, number_of_channels: int, rng: np.random.Generator) -> np.ndarray:
+        one_sided = rng.random(number_of_channels) < self.probability
+        side = rng.integers(0, 1, size=number_of_channels, endpoint=True)
+        return np.where(one_sided, side, rng.random(number_of_channels))
+
+
+class EmpiricalPrior(SharePrior):
+    """
+    Draws the share of the capacity from observed shares, e.g. from probing results.
+    """
+    name = "empirical"
+
+    def __init__(self, shares: list):
+        self.shares = np.asarray(shares, dtype=float)
+
+    def sample_share(self, number_of_channels: int, rng: np.random.Generator) -> np.ndarray:
+        return rng.choice(self.shares, size=number_of_channels)
+
+
+class LegacyPrior(LiquidityPrior):
+    """
+    Reproduces the oracle of earlier versions: the global random module is seeded again for every channel without
+    liquidity of the return channel, and a liquidity that equals the capacity is drawn again from the global stream.
+    Only useful to compare with results that were created with these versions.
+    """
+    name = "legacy"
+
+    def assign(self, capacity: np.ndarray, reverse: np.ndarray, seed: int = DEFAULT_LIQUIDITY_SEED) -> np.ndarray:
+        liquidity = []
+        for k, (channel_capacity, reverse_position) in enumerate(zip(capacity.tolist(), reverse.tolist())):
+            if 0 <= reverse_position < k:
+                value = channel_capacity - liquidity[reverse_position]
+            else:
+                random.seed(seed)
+                value = random.randint(0, channel_capacity)
+            if value >= channel_capacity or value < 0:
+                value = random.randint(0, channel_capacity)
+            liquidity.append(value)
+        return np.array(liquidity, dtype=np.int64)
+
+
+LIQUIDITY_PRIORS = {prior.name: prior for prior in (UniformPrior, BimodalPrior, OneSidedPrior, EmpiricalPrior,
+                                                     LegacyPrior)}
+
+
+def prior_from_config(entry) -> LiquidityPrior:
+    """
+    returns the prior for the name of a prior (e.g. `"uniform"`) or a dictionary with the key `prior` and the
+    arguments of the prior (e.g. `{"prior": "bimodal", "scale": 0.05}`)
+    """
+    if isinstance(entry, LiquidityPrior):
+        return entry
+    if isinstance(entry, str):
+        return LIQUIDITY_PRIORS[entry]()
+    entry = dict(entry)
+    return LIQUIDITY_PRIORS[entry.pop("prior")](**entry)
+
+
+def initial_liquidity(channel_graph, prior: LiquidityPrior = None, seed: int = DEFAULT_LIQUIDITY_SEED) -> tuple:
+    """
+    draws the liquidity of all channels of the network of `channel_graph`
+
+    :return: the rows of the channels in the order of `network.edges` and their liquidity
+    :rtype: tuple
+    """
+    prior = prior if prior is not None else UniformPrior()
+    rows = channel_graph.channel_indices()
+    capacity = channel_graph.table.capacity[rows]
+    return rows, prior.assign(capacity, reverse_channel_positions(channel_graph, rows), seed)
@@ -0,0 +1,163 @@
+"""
+ListChannelsReader.py
+====================================
+Streaming ingestion of `lightning-cli listchannels` dumps.
+
+The channels are decoded one at a time from the `channels` array, so the complete json document is never held in
+memory. Dumps compressed with gzip or zstd are decompressed on the fly.
+"""
+import gzip
+import io
+import json
+import re
+
+import numpy as np
+
+from .Channel import ChannelFields
+from .ChannelTable import ChannelTable, COLD_FIELDS
+
+CHUNK_SIZE = 1 << 20
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_CHANNELS_ARRAY = re.compile(r'"channels"\s*:\s*\[')
+_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def open_listchannels(file: str):
+    """
+    opens a listchannels dump as text stream. gzip and zstd compressed files are detected by their magic bytes.
+    Reading zstd files needs the `zstandard` package.
+    """
+    raw = open(file, "rb")
+    magic = raw.read(4)
+    raw.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=raw), encoding="utf-8")
+    if magic.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError:
+            raw.close()
+            raise ImportError(f"{file} is compressed with zstd. Install the zstandard package to read it.")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8")
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def iter_channels(file: str):
+    """
+    yields the channel dictionaries of a listchannels dump one after the other
+    """
+    decoder = json.JSONDecoder()
+    with open_listchannels(file) as f:
+        buffer = ""
+        eof = False
+
+        def read_more():
+            nonlocal buffer, eof
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+
+        match = None
+        while match is None:
+            read_more()
+            match = _CHANNELS_ARRAY.search(buffer)
+            if match is None and eof:
+                raise ValueError(f"{file} does not contain a channels array")
+            if match is None:
+                # keep the end of the buffer in case the key is split between two chunks
+                buffer = buffer[-32:]
+        position = match.end()
+
+        while True:
+            position = _SEPARATOR.match(buffer, position).end()
+            if position == len(buffer):
+                if eof:
+                    raise ValueError(f"channels array of {file} is not terminated")
+                buffer = buffer[position:]
+                position = 0
+                read_more()
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                channel, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the channel is not complete yet
+                buffer = buffer[position:]
+                position = 0
+                read_more()
+                continue
+            yield channel
+            position = end
+
+
+def read_channel_table(file: str, base_threshold: int = None, return_channels_only: bool = False):
+    """
+    streams the channels of a listchannels dump into a ChannelTable and applies the filters of the simulation during
+    the ingestion:
+     - `base_threshold`: a channel is removed if its return channel has a base fee larger than `base_threshold`
+     - `return_channels_only`: a channel is removed if it has no return channel (after the base fee filter)
+
+    With both filters, channels with a too large base fee are dropped as soon as they are read.
+
+    The rows of the table are ordered such that a ChannelGraph built from the table iterates its nodes and channels
+    in the same order as a ChannelGraph of the complete dump from which the filtered channels were removed.
+
+    :return: the ChannelTable and the node ids of all channels of the dump in order of appearance
+    """
+    nodes, node_index = [], {}
+    short_channel_ids, scid_index = [], {}
+    pair_rank = {}
+    high_base_fee = set()
+    rows = []
+
+    def encode(value, values, index):
+        k = index.get(value)
+        if k is None:
+            k = len(values)
+            index[value] = k
+            values.append(value)
+        return k
+
+    for channel in iter_channels(file):
+        src = encode(channel[ChannelFields.SRC], nodes, node_index)
+        dest = encode(channel[ChannelFields.DEST], nodes, node_index)
+        scid = encode(channel[ChannelFields.SHORT_CHANNEL_ID], short_channel_ids, scid_index)
+        rank = pair_rank.setdefault((src, dest), len(pair_rank))
+        base_fee = channel[ChannelFields.BASE_FEE_MSAT]
+        if base_threshold is not None and base_fee > base_threshold:
+            high_base_fee.add((src, dest, scid))
+            if return_channels_only:
+                # the return channel is removed by the base fee filter, so this channel has no return channel
+                continue
+        rows.append((rank, src, dest, scid, channel[ChannelFields.CAP], channel[ChannelFields.FEE_RATE], base_fee,
+                     tuple(channel.get(field) for field in COLD_FIELDS)))
+
+    if base_threshold is not None or return_channels_only:
+        read = {(row[1], row[2], row[3]) for row in rows}
+        kept = []
+        for row in rows:
+            key, reverse = (row[1], row[2], row[3]), (row[2], row[1], row[3])
+            if reverse in high_base_fee:
+                continue
+            if return_channels_only and (reverse not in read or key in high_base_fee):
+                continue
+            kept.append(row)
+        rows = kept
+    rows.sort(key=lambda row: row[0])
+
+    columns = list(zip(*rows)) if rows else [()] * 8
+    table = ChannelTable(nodes, short_channel_ids,
+                         np.array(columns[1], dtype=np.int32),
+                         np.array(columns[2], dtype=np.int32),
+                         np.array(columns[3], dtype=np.int32),
+                         np.array(columns[4], dtype=np.int64),
+                         np.array(columns[5], dtype=np.int64),
+                         np.array(columns[6], dtype=np.int64),
+                         list(columns[7]))
+    return table, nodes
@@ -0,0 +1,68 @@
+"""
+LoggingSetup.py
+====================================
+Opt-in configuration of the log output of the payment simulations.
+
+Importing the modules of the package does not touch the logging configuration. Scripts that want the log file and
+the output on stdout of earlier versions call `configure_logging` once at start-up:
+
+    configure_logging("pickhardt_pay.log", level="debug")
+
+Worker processes that are forked after the call write to a log file of their own with the pid appended to the file
+name, so they do not overwrite each other's lines.
+"""
+import logging
+import os
+import sys
+
+DEFAULT_LOG_FILE = "pickhardt_pay.log"
+LOG_FORMAT = "%(asctime)s.%(msecs)03d | %(levelname)s | %(message)s"
+LOG_DATE_FORMAT = "%H:%M:%S"
+
+
+class ProcessFileHandler(logging.FileHandler):
+    """
+    A `FileHandler` that continues in the file `<file name>.<pid>` when it is used by a forked process
+    """
+
+    def __init__(self, filename: str, mode: str = "a"):
+        self._pid = os.getpid()
+        super().__init__(filename, mode, delay=True)
+        self._filename = self.baseFilename
+
+    def emit(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            # the inherited stream belongs to the parent process, it is not flushed or closed here
+            self._pid = os.getpid()
+            self.stream = None
+            self.baseFilename = "{}.{}".format(self._filename, self._pid)
+            self.mode = "w"
+        super().emit(record)
+
+
+def configure_logging(log_file: str = DEFAULT_LOG_FILE, level: str = "debug", stdout_level: str = "info",
+                      mode: str = "w"):
+    """
+    adds a handler for `log_file` and stdout to the root logger and sets the level of the root logger
+
+    :param log_file: file that receives the messages of `level` and above, None for no file
+    :type: str
+    :param level: level of the root logger, e.g. "debug"
+    :type: str
+    :param stdout_level: messages of this level and above are also printed to stdout, None for no output
+    :type: str
+    :param mode: "w" truncates the log file, "a" appends to it
+    :type: str
+    """
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+    logger = logging.getLogger()
+    logger.setLevel(level.upper())
+    if log_file is not None:
+        file_handler = ProcessFileHandler(log_file, mode)
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+    if stdout_level is not None:
+        stdout_handler = logging.StreamHandler(sys.stdout)
+        stdout_handler.setLevel(stdout_level.upper())
+        stdout_handler.setFormatter(formatter)
+        logger.addHandler(stdout_handler)
@@ -0,0 +1,240 @@
+import numpy as np
+
+from .NodeIndex import compact_node_ids
+
+# FIXME: Remove Magic Number for pruning
+PRUNING_AMOUNT = 250_000
+PRUNING_PROBABILITY = 0.9
+PRUNING_MAX_PIECES = 3
+
+
+def new_min_cost_flow():
+    """
+    returns an empty `SimpleMinCostFlow`. OR-Tools is imported on the first call and not when the module is imported.
+    """
+    from ortools.graph import pywrapgraph
+    return pywrapgraph.SimpleMinCostFlow()
+
+
+class MinCostFlowModel:
+    """
+    The MinCostFlowModel keeps the piecewise linearized arcs of all channels of an UncertaintyNetwork between
+    payments.
+
+    Building the arcs is the most expensive part of preparing the min cost flow problem as every channel of the
+    network has to be linearized. The belief about most channels however does not change between two payments.
+    Thus, the model caches the arcs of every channel and only linearizes the channels again that the
+    UncertaintyNetwork reported as changed (see `UncertaintyNetwork.channel_changed`).
+
+    If no arc changed since the last solve the `SimpleMinCostFlow` object is reused and only the supply of the
+    previous sender and receiver is reset. Otherwise, a new solver is filled from the cached arcs. The arcs are
+    always added in the order of `network.edges` so that the solver sees exactly the same problem as if it was
+    built from scratch.
+
+    With a `CandidateRegion` (see `UncertaintyNetwork.candidate_region`) `solve` only gives the arcs around the
+    cheapest paths of the payment to the solver. The nodes of the region are numbered contiguously, so the size of
+    the solver does not depend on the size of the network.
+    """
+
+    def __init__(self, uncertainty_network):
+        self._uncertainty_network = uncertainty_network
+        self._topology_version = None
+        self._parameters = None
+        self._mcf_id = {}
+        self._arcs = None
+        self._min_cost_flow = None
+        self._arc_to_channel = {}
+        self._supplies = {}
+
+    @property
+    def mcf_id(self) -> dict:
+        """
+        the look-up table from node_ids to the integers from [0,...,#number of nodes] that the solver uses
+        """
+        return self._mcf_id
+
+    def _refresh_topology(self) -> bool:
+        """
+        takes the node index of the network and recreates the list of channels if nodes or channels were added to or
+        removed from the network since the last call
+        """
+        network = self._uncertainty_network.network
+        version = (id(network), network.version)
+        if version == self._topology_version:
+            return False
+        table = self._uncertainty_network.table
+        node_index = self._uncertainty_network.node_index()
+        self._mcf_id = node_index.ids
+        self._node_to_mcf_id = node_index.table_ids
+
+        self._indices = self._uncertainty_network.channel_indices()
+        self._position = np.full(len(table), -1, dtype=np.int64)
+        self._position[self._indices] = np.arange(len(self._indices))
+        self._arc_entries = {channel.index: (s, d, channel, 0)
+                             for s, d, channel in network.edges(data="channel")}
+        self._topology_version = version
+        return True
+
+    def _linearize(self, indices: np.ndarray):
+        """
+        returns the arcs (row, capacity, cost) that are added to the solver for the channels in `indices`
+        """
+        mu, base_fee, prune = self._parameters
+        # ignore channels with too large base fee
+        indices = indices[self._uncertainty_network.table.base_fee[indices] <= base_fee]
+        # Prune channels away that have too low success probability! This is a huge runtime boost
+        # However the pruning would be much better to work on quantiles of normalized cost
+        # So as soon as we have better Scaling, Centralization and feature engineering we can
+        # probably have a more focused pruning
+        if prune:
+            probabilities = self._uncertainty_network.success_probabilities(PRUNING_AMOUNT, indices)
+            indices = indices[probabilities >= PRUNING_PROBABILITY]
+        rows, _, _, capacities, costs = self._uncertainty_network.get_piecewise_linearized_costs(mu=mu,
+                                                                                                indices=indices)
+        if prune:
+            first = np.ones(len(rows), dtype=bool)
+            first[1:] = rows[1:] != rows[:-1]
+            starts = np.maximum.accumulate(np.where(first, np.arange(len(rows)), 0))
+            keep = np.arange(len(rows)) - starts < PRUNING_MAX_PIECES
+            rows, capacities, costs = rows[keep], capacities[keep], costs[keep]
+        return rows, capacities, costs
+
+    def update(self, mu: int, base_fee: int) -> bool:
+        """
+        brings the cached arcs up to date with the UncertaintyNetwork.
+
+        :return: True if any arc changed since the last update
+        :rtype: bool
+        """
+        dirty_channels = self._uncertainty_network.pop_dirty_channels()
+        parameters = (mu, base_fee, self._uncertainty_network.prune)
+        if self._refresh_topology() or parameters != self._parameters:
+            self._parameters = parameters
+            self._arcs = self._linearize(self._indices)
+            self._min_cost_flow = None
+            return True
+
+        dirty = np.fromiter(dirty_channels, dtype=np.int64, count=len(dirty_channels))
+        dirty = dirty[self._position[dirty] >= 0]
+        if len(dirty) == 0:
+            return False
+        dirty = dirty[np.argsort(self._position[dirty])]
+        new_arcs = self._linearize(dirty)
+
+        rows, capacities, costs = self._arcs
+        is_dirty = np.isin(rows, dirty)
+        old_arcs = rows[is_dirty], capacities[is_dirty], costs[is_dirty]
+        if all(np.array_equal(old, new) for old, new in zip(old_arcs, new_arcs)):
+            return False
+
+        # replace the arcs of the dirty channels and restore the order of the network
+        merged = [np.concatenate((column[~is_dirty], new_column)) for column, new_column in zip(self._arcs, new_arcs)]
+        order = np.argsort(self._position[merged[0]], kind="stable")
+        self._arcs = tuple(column[order] for column in merged)
+        self._min_cost_flow = None
+        return True
+
+    def _fill(self, min_cost_flow, tails: np.ndarray, heads: np.ndarray, arcs: np.ndarray = None) -> dict:
+        """
+        adds the cached arcs (or only the arcs at the positions `arcs`) with the solver nodes `tails` and `heads` to
+        `min_cost_flow` and returns the look-up table from arc indices to channels
+        """
+        rows, capacities, costs = self._arcs
+        if arcs is not None:
+            rows, capacities, costs = rows[arcs], capacities[arcs], costs[arcs]
+        if hasattr(min_cost_flow, "add_arcs_with_capacity_and_unit_cost"):
+            # vectorized variant of newer OR-Tools versions
+            indices = min_cost_flow.add_arcs_with_capacity_and_unit_cost(
+                np.asarray(tails, dtype=np.int32), np.asarray(heads, dtype=np.int32),
+                np.asarray(capacities, dtype=np.int64), np.asarray(costs, dtype=np.int64)).tolist()
+        else:
+            indices = [min_cost_flow.AddArcWithCapacityAndUnitCost(tail, head, capacity, cost)
+                       for tail, head, capacity, cost in zip(tails.tolist(), heads.tolist(), capacities.tolist(),
+                                                             costs.tolist())]
+        arc_entries = self._arc_entries
+        return {index: arc_entries[row] for index, row in zip(indices, rows.tolist())}
+
+    def _arc_nodes(self) -> tuple:
+        """
+        returns the solver node of the tail and of the head of every cached arc
+        """
+        table = self._uncertainty_network.table
+        rows = self._arcs[0]
+        return self._node_to_mcf_id[table.src[rows]], self._node_to_mcf_id[table.dest[rows]]
+
+    def solver(self, sender: str, receiver: str, amount: int, mu: int, base_fee: int):
+        """
+        returns a `SimpleMinCostFlow` object that contains the piecewise linearized problem to send `amount` from
+        `sender` to `receiver` together with the look-up table from arc indices to channels
+
+        :param mu: controls the balance between uncertainty cost and fees in the solver
+        :type: int
+        :param base_fee: eliminates all channels with a base fee lower than `base_fee`
+        :type: int
+        """
+        self.update(mu, base_fee)
+        if self._min_cost_flow is None:
+            self._min_cost_flow = new_min_cost_flow()
+            self._arc_to_channel = self._fill(self._min_cost_flow, *self._arc_nodes())
+            self._supplies = {}
+
+        # reset the supply of the previous sender and receiver
+        for node in self._supplies:
+            self._min_cost_flow.SetNodeSupply(node, 0)
+        self._supplies = {self._mcf_id[sender]: int(amount), self._mcf_id[receiver]: -int(amount)}
+        for node, supply in self._supplies.items():
+            self._min_cost_flow.SetNodeSupply(node, supply)
+        return self._min_cost_flow, self._arc_to_channel
+
+    def solve(self, sender: str, receiver: str, amount: int, mu: int, base_fee: int) -> tuple:
+        """
+        solves the min cost flow problem to send `amount` from `sender` to `receiver`.
+
+        If the UncertaintyNetwork has a `CandidateRegion`, the problem is first solved on the regions around sender
+        and receiver, from the smallest to the largest, and only if the flow is infeasible on all of them on the full
+        network. Otherwise, the full problem of `solver` is solved.
+
+        :return: the status of the solver, the solved `SimpleMinCostFlow` object and the look-up table from arc
+            indices to channels
+        :rtype: tuple
+        """
+        region = self._uncertainty_network.candidate_region
+        if region is None:
+            min_cost_flow, arc_to_channel = self.solver(sender, receiver, amount, mu, base_fee)
+            return min_cost_flow.Solve(), min_cost_flow, arc_to_channel
+
+        self.update(mu, base_fee)
+        rows, capacities, costs = self._arcs
+        tails, heads = self._arc_nodes()
+        source, target = self._mcf_id[sender], self._mcf_id[receiver]
+        # the first arc of a channel is its cheapest one and decides the distances
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        regions = region.nodes(tails[first], heads[first], costs[first], len(self._mcf_id), source, target)
+        for slack, nodes in zip(region.slacks, regions):
+            arcs = np.flatnonzero(nodes[tails] & nodes[heads])
+            # skip regions that cannot carry the amount out of the sender or into the receiver
+            if capacities[arcs[tails[arcs] == source]].sum() < amount or \
+                    capacities[arcs[heads[arcs] == target]].sum() < amount:
+                continue
+            # the solver only sees the nodes of the region
+            _, region_tails, region_heads, terminals = compact_node_ids(tails[arcs], heads[arcs],
+                                                                        np.array([source, target]))
+            min_cost_flow = new_min_cost_flow()
+            arc_to_channel = self._fill(min_cost_flow, region_tails, region_heads, arcs)
+            min_cost_flow.SetNodeSupply(int(terminals[0]), int(amount))
+            min_cost_flow.SetNodeSupply(int(terminals[1]), -int(amount))
+            status = min_cost_flow.Solve()
+            if status == min_cost_flow.OPTIMAL:
+                gap = None
+                if region.report_gap:
+                    full_min_cost_flow, _ = self.solver(sender, receiver, amount, mu, base_fee)
+                    if full_min_cost_flow.Solve() == full_min_cost_flow.OPTIMAL:
+                        full_cost = full_min_cost_flow.OptimalCost()
+                        gap = (min_cost_flow.OptimalCost() - full_cost) / max(full_cost, 1)
+                region.record(slack, gap)
+                return status, min_cost_flow, arc_to_channel
+
+        region.record(None)
+        min_cost_flow, arc_to_channel = self.solver(sender, receiver, amount, mu, base_fee)
+        return min_cost_flow.Solve(), min_cost_flow, arc_to_channel
@@ -0,0 +1,36 @@
+import numpy as np
+
+
+class NodeIndex:
+    """
+    The positions of the nodes of a network, i.e. the integers from [0,...,#number of nodes] in the order of
+    `network.nodes`, as they are needed by the min cost flow solver and the CSR arrays of the RoutingGraph.
+
+    The index belongs to a ChannelGraph (see `ChannelGraph.node_index`) and is only built again if the topology of the
+    network changed, so payments and solvers share it instead of enumerating the nodes themselves.
+    """
+
+    def __init__(self, channel_graph):
+        network = channel_graph.network
+        table = channel_graph.table
+        self.version = (id(network), network.version)
+        self.nodes = list(network.nodes())
+        self.ids = {node_id: k for k, node_id in enumerate(self.nodes)}
+        # position of every node of the ChannelTable in the network or -1
+        self.table_ids = np.full(len(table.nodes), -1, dtype=np.int64)
+        self.table_ids[[table.node_index(node_id) for node_id in self.nodes]] = np.arange(len(self.nodes))
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def compact_node_ids(tails: np.ndarray, heads: np.ndarray, terminals: np.ndarray) -> tuple:
+    """
+    numbers only the nodes that appear in the arcs (`tails`, `heads`) or in `terminals` contiguously, keeping their
+    order, so that a solver of a part of the network does not allocate all nodes of the network
+
+    :return: the node ids of the compact numbers and the compact tails, heads and terminals
+    :rtype: tuple
+    """
+    used = np.unique(np.concatenate((tails, heads, terminals)))
+    return used, np.searchsorted(used, tails), np.searchsorted(used, heads), np.searchsorted(used, terminals)
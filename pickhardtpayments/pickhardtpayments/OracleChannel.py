@@ -8,15 +8,27 @@ class OracleChannel(Channel):
     """
     An OracleChannel us used in experiments and Simulations to form the (Oracle)LightningNetwork.
 
-    It contains a ground truth about the Liquidity of a channel
+    It contains a ground truth about the Liquidity of a channel which is stored in the `actual_liquidity` and
+    `in_flight` columns of the network's `ChannelTable`
     """
 
-    def __init__(self, channel: Channel, actual_liquidity: int = None):
-        super().__init__(channel.cln_jsn)
-        self._actual_liquidity = actual_liquidity
-        self._in_flight = 0
+    __slots__ = ()
+
+    def __init__(self, table, index: int, actual_liquidity: int = None):
+        super().__init__(table, index)
         if actual_liquidity is None or actual_liquidity >= self.capacity or actual_liquidity < 0:
-            self._actual_liquidity = random.randint(0, self.capacity)
+            actual_liquidity = random.randint(0, self.capacity)
+        self._table.actual_liquidity[index] = actual_liquidity
+        self._table.in_flight[index] = 0
+
+    @classmethod
+    def from_table(cls, table, index: int):
+        """
+        returns an OracleChannel for a row whose liquidity is already stored in `table`
+        """
+        channel = cls.__new__(cls)
+        Channel.__init__(channel, table, index)
+        return channel
 
     def __str__(self):
         return super().__str__() + " actual Liquidity: {}".format(self.actual_liquidity)
@@ -29,7 +41,7 @@ class OracleChannel(Channel):
         This is useful for experiments but must of course not be used in routing and is also
         not available if mainnet remote channels are being used.
         """
-        return self._actual_liquidity
+        return self._table.actual_liquidity.item(self._index)
 
     @actual_liquidity.setter
     def actual_liquidity(self, amt: int):
@@ -39,7 +51,8 @@ class OracleChannel(Channel):
         :type amt: int
         """
         if 0 <= amt <= self.capacity:
-            self._actual_liquidity = amt
+            self._table.actual_liquidity[self._index] = amt
+            self._table.changed_rows.add(self._index)
         else:
             raise ValueError(
                 f"Liquidity for channel {self.short_channel_id} cannot be set. "
@@ -53,7 +66,7 @@ class OracleChannel(Channel):
         This is useful for experiments but must of course not be used in routing and is also
         not available if mainnet remote channels are being used.
         """
-        return self._in_flight
+        return self._table.in_flight.item(self._index)
 
     @in_flight.setter
     def in_flight(self, in_flight_amt: int):
@@ -63,7 +76,8 @@ class OracleChannel(Channel):
         :type in_flight_amt: int
         """
         if 0 <= in_flight_amt <= self.capacity:
-            self._in_flight = in_flight_amt
+            self._table.in_flight[self._index] = in_flight_amt
+            self._table.changed_rows.add(self._index)
             # logging.debug("in_flight on {}-{} now {:,} ".format(self.src[:4], self.dest[:4], in_flight_amt))
         else:
             raise ValueError(f"inflight amount for channel {self.short_channel_id} cannot be set. "
@@ -1,47 +1,123 @@
 import logging
-import random
+
+import numpy as np
 
 from .Attempt import Attempt, AttemptStatus
-from .ChannelGraph import ChannelGraph
+from .ChannelGraph import ChannelGraph, new_network
+from .ChannelTable import StateSnapshot
+from .LiquidityPriors import LiquidityPrior, initial_liquidity, DEFAULT_LIQUIDITY_SEED
 from .OracleChannel import OracleChannel
-import networkx as nx
 
 DEFAULT_BASE_THRESHOLD = 0
 
 
 class OracleLightningNetwork(ChannelGraph):
 
-    def __init__(self, channel_graph: ChannelGraph):
-        self._channel_graph = channel_graph
-        self._network = nx.MultiDiGraph()
-        for src, dest, short_channel_id, channel in channel_graph.network.edges(data="channel", keys=True):
-            oracle_channel = None
-
-            # If Channel in opposite direction already exists with liquidity information match the channel
-            if self._network.has_edge(dest, src):
-                if short_channel_id in self._network[dest][src]:
-                    capacity = channel.capacity
-                    opposite_channel = self._network[dest][src][short_channel_id]["channel"]
-                    opposite_liquidity = opposite_channel.actual_liquidity
-                    oracle_channel = OracleChannel(channel, capacity - opposite_liquidity)
-
-            if oracle_channel is None:
-                random.seed(12345)
-                liquidity = random.randint(0, channel.capacity)
-                oracle_channel = OracleChannel(channel, liquidity)
+    # the columns of the ChannelTable that hold the state of the oracle
+    STATE_COLUMNS = ("actual_liquidity", "in_flight")
 
+    def __init__(self, channel_graph: ChannelGraph, prior: LiquidityPrior = None,
+                 seed: int = DEFAULT_LIQUIDITY_SEED):
+        """
+        :param prior: distribution of the actual liquidity of the channels, `UniformPrior` by default
+        :type: LiquidityPrior
+        :param seed: seed of the random generator that draws the liquidity
+        :type: int
+        """
+        self._channel_graph = channel_graph
+        self._network = new_network()
+        self._table = channel_graph.table.fork()
+        self._accessed_channels = None
+
+        # a channel and its return channel share the capacity, see LiquidityPriors
+        rows, liquidity = initial_liquidity(channel_graph, prior, seed)
+        self._table.actual_liquidity[rows] = liquidity
+        self._table.in_flight[rows] = 0
+        self._initial_liquidity = self._table.actual_liquidity.copy()
+        self._add_channels(channel_graph.network)
+
+    def _add_channels(self, network):
+        """
+        adds an OracleChannel for every channel of `network`
+        """
+        for src, dest, short_channel_id, channel in network.edges(data="channel", keys=True):
+            oracle_channel = OracleChannel.from_table(self._table, channel.index)
+            self._network.add_edge(src, dest, key=short_channel_id, channel=oracle_channel)
 
-            self._network.add_edge(oracle_channel.src,
-                                   oracle_channel.dest,
-                                   key=short_channel_id,
-                                   channel=oracle_channel)
+    def snapshot(self) -> StateSnapshot:
+        """
+        returns the liquidity and in_flight amounts of the channels that changed since the network was created. This
+        takes time proportional to the number of changed channels.
+        """
+        return StateSnapshot.capture(self._table, self.STATE_COLUMNS, self._table.changed_rows, self._network)
 
+    def initial_state(self, rows: np.ndarray) -> tuple:
+        """
+        returns the values of the STATE_COLUMNS in `rows` when the network was created
+        """
+        return self._initial_liquidity[rows], np.zeros(len(rows), dtype=self._table.in_flight.dtype)
 
+    def restore(self, snapshot: StateSnapshot):
+        """
+        sets the liquidity and in_flight amounts of all channels back to `snapshot`. Only the channels that changed
+        since the network was created are written.
+        """
+        snapshot.check_topology(self._network)
+        table = self._table
+        rows = np.fromiter(table.changed_rows, dtype=np.int64, count=len(table.changed_rows))
+        table.actual_liquidity[rows] = self._initial_liquidity[rows]
+        table.in_flight[rows] = 0
+        snapshot.write(table, self.STATE_COLUMNS)
+        table.changed_rows = set(snapshot.rows.tolist())
+
+    def fork(self):
+        """
+        returns a new OracleLightningNetwork with the same channels, initial state and current state. The fork has
+        its own state columns and its own topology, so nodes can be removed from it without changing this network.
+        The public columns of the ChannelTable are shared.
+        """
+        forked = self.__class__.__new__(self.__class__)
+        forked._channel_graph = self._channel_graph
+        forked._network = new_network()
+        forked._table = self._table.fork()
+        forked._accessed_channels = None
+        forked._initial_liquidity = self._initial_liquidity
+        np.copyto(forked._table.actual_liquidity, self._initial_liquidity)
+        forked._add_channels(self._network)
+        forked.restore(StateSnapshot.capture(self._table, self.STATE_COLUMNS, self._table.changed_rows,
+                                             forked._network))
+        return forked
 
     @property
     def network(self):
         return self._network
 
+    def get_channel(self, src: str, dest: str, short_channel_id: str):
+        """
+        returns a specific OracleChannel identified by source, destination and short_channel_id.
+        While access is recorded the row of the channel is added to the accessed channels.
+        """
+        channel = super().get_channel(src, dest, short_channel_id)
+        if self._accessed_channels is not None and channel is not None:
+            self._accessed_channels.add(channel.index)
+        return channel
+
+    def start_recording_access(self):
+        """
+        starts to record the rows of all channels that are retrieved with `get_channel`. As the payment methods only
+        read and write the liquidity of the oracle via `get_channel`, this is the set of channels that a payment
+        depends on.
+        """
+        self._accessed_channels = set()
+
+    def stop_recording_access(self) -> set:
+        """
+        stops recording and returns the rows of all channels that were retrieved since `start_recording_access`
+        """
+        accessed_channels = self._accessed_channels
+        self._accessed_channels = None
+        return accessed_channels
+
     def allocate_amount_as_inflight_on_path(self, attempt: Attempt):
         """
         allocates `amt` as in_flights to all channels of the path
@@ -78,11 +154,13 @@ class OracleLightningNetwork(ChannelGraph):
                 oracle_channel.in_flight += attempt.amount
                 uncertainty_channel.allocate_inflights(attempt.amount)
             if not success_of_probe:
-                logging.info("{:,} sats failed on channel {}-{} with actual liquidity of {:,} sats (cap: {:,})".
-                             format((oracle_channel.in_flight + attempt.amount), oracle_channel.src[0:4],
-                                    oracle_channel.dest[0:4], oracle_channel.actual_liquidity, oracle_channel.capacity))
+                if logging.getLogger().isEnabledFor(logging.INFO):
+                    logging.info("{:,} sats failed on channel {}-{} with actual liquidity of {:,} sats (cap: {:,})".
+                                 format((oracle_channel.in_flight + attempt.amount), oracle_channel.src[0:4],
+                                        oracle_channel.dest[0:4], oracle_channel.actual_liquidity,
+                                        oracle_channel.capacity))
                 attempt.status = AttemptStatus.FAILED
-                logging.info(f"Attempt status: {attempt}")
+                logging.info("Attempt status: %s", attempt)
                 return False, uncertainty_channel
 
         # setting AttemptStatus from PLANNED to INFLIGHT does not change in_flight amounts
@@ -96,6 +174,8 @@ class OracleLightningNetwork(ChannelGraph):
         This is only useful for experiments and simulations if one wants to know what would be 
         possible to actually send before starting the payment loop
         """
+        import networkx as nx
+
         test_network = nx.DiGraph()
         for src, dest, channel in self.network.edges(data="channel"):
             # liquidity = 0
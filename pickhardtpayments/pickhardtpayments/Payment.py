@@ -1,23 +1,20 @@
 import time
 from json import JSONEncoder
 # from logging import Logger
-from typing import List
-from ortools.graph import pywrapgraph
-import networkx as nx
+from typing import List, TYPE_CHECKING
+from .FlowDecomposition import FlowDecomposition, SHORTEST
 from .UncertaintyNetwork import UncertaintyNetwork
 from .OracleLightningNetwork import OracleLightningNetwork
 from .Attempt import Attempt, AttemptStatus
+from .Tracing import TRACER
 
 import logging
-import sys
 from itertools import islice
 
+if TYPE_CHECKING:
+    import networkx as nx
+
 logger = logging.getLogger()
-stdout_handler = logging.StreamHandler(sys.stdout)
-stdout_handler.setLevel(logging.INFO)
-file_handler = logging.FileHandler('pickhardt_pay.log', mode='a')
-file_handler.setLevel(logging.DEBUG)
-logger.addHandler(file_handler)
 
 
 class MCFSolverError(Exception):
@@ -41,7 +38,7 @@ class Payment:
     """
 
     def __init__(self, uncertainty_network: UncertaintyNetwork, oracle_network: OracleLightningNetwork, sender,
-                 receiver, total_amount: int, mu: int, base: int):
+                 receiver, total_amount: int, mu: int, base: int, decomposition: str = SHORTEST):
         """Constructor method
         Builds an instance of Payment
 
@@ -59,6 +56,8 @@ class Payment:
         :type mu: int
         :param base:
         :type base: int
+        :param decomposition: strategy that dissects the flows of the solver into paths, see `FlowDecomposition`
+        :type decomposition: str
         """
         self._successful = False
         self._ppm = None
@@ -71,9 +70,9 @@ class Payment:
         self._attempts = list()
         self._uncertainty_network = uncertainty_network
         self._oracle_network = oracle_network
-        self._prepare_integer_indices_for_nodes()
         self._mu = mu
         self._base = base
+        self._decomposition = decomposition
         self._pickhardt_payment_rounds = 0
         self._uncertainty_network_entropy = self._uncertainty_network.entropy()
 
@@ -284,19 +283,6 @@ class Payment:
                                                                             self.receiver[:4]))
         self._generate_candidate_paths()
 
-    def _prepare_integer_indices_for_nodes(self):
-        """
-        necessary for the OR-lib by google and the min cost flow solver
-
-        let's initialize the look-up tables for node_ids to integers from [0,...,#number of nodes]
-        this is necessary because of the API of the Google Operations Research min cost flow solver
-        """
-        self._mcf_id = {}
-        self._node_key = {}
-        for k, node_id in enumerate(self._uncertainty_network.network.nodes()):
-            self._mcf_id[node_id] = k
-            self._node_key[k] = node_id
-
     def _generate_candidate_paths(self) -> float:
         """
         computes the optimal payment split to deliver `amt` from `src` to `dest` and updates our belief about the
@@ -312,9 +298,8 @@ class Payment:
         """
         # First we prepare the min cost flow by getting arcs from the uncertainty network
         self._start_time = time.time()
-        self._prepare_mcf_solver(self._mu, self._base)
         logger.debug("solving mcf...")
-        status = self._min_cost_flow.Solve()
+        status = self._solve_mcf(self._mu, self._base)
 
         status_description = {
             0: "NOT_SOLVED",
@@ -334,156 +319,50 @@ class Payment:
 
         # Fixme MCF does not serve complete flow
         candidate_paths_in_round = self._dissect_flow_to_paths(self._sender, self._receiver)
-        for count, attempt in enumerate(candidate_paths_in_round):
-            logger.debug("path no. {} for {:,} sats".format(count, attempt.amount))
-            for channel in attempt.path:
-                logger.debug("(02) {}-{} Uncertainty Range:\t\t[{:>10,} ; {:>10,}]\t\tinflight {:>10,};\t"
-                             "cond_cap: {:>10,}".format(channel.src[:4],
-                                                        channel.dest[:4],
-                                                        channel.min_liquidity,
-                                                        channel.max_liquidity,
-                                                        channel.in_flight,
-                                                        channel.conditional_capacity))
+        if TRACER.enabled:
+            for count, attempt in enumerate(candidate_paths_in_round):
+                TRACER.channels("planned", self._uncertainty_network, attempt.path, path=count,
+                                amount=attempt.amount, probability=attempt.probability)
 
         self.attempts.extend(candidate_paths_in_round)
 
         self._end_time = time.time()
         return self._end_time - self._start_time
 
-    def _prepare_mcf_solver(self, mu: int, base_fee: int):
+    def _solve_mcf(self, mu: int, base_fee: int) -> int:
         """
-        computes the uncertainty network given our prior belief and prepares the min cost flow solver
+        computes the uncertainty network given our prior belief, prepares the min cost flow solver and solves it
 
         This function can define a value for mu to control how heavily we combine the uncertainty cost and fees. Also
         the function supports only taking channels into account that don't charge a base_fee higher or equal to `base`
 
-        returns the instantiated min_cost_flow object from the Google OR-lib that contains the piecewise linearized
-        problem
+        keeps the solved min_cost_flow object from the Google OR-lib that contains the piecewise linearized
+        problem and returns the status of the solver. The arcs are kept by the `MinCostFlowModel` of the
+        UncertaintyNetwork between payments and only the arcs of channels that changed are computed again. If the
+        UncertaintyNetwork has a `CandidateRegion`, only the arcs around sender and receiver are solved.
 
         :param mu: controls the balance between uncertainty cost and fees in the solver
         :type: int
         :param base_fee: eliminates all channels with a base fee lower than `base_fee`
         :type: int
         """
-        self._min_cost_flow = pywrapgraph.SimpleMinCostFlow()
-        self._arc_to_channel = {}
-
-        for s, d, channel in self._uncertainty_network.network.edges(data="channel"):
-            # ignore channels with too large base fee
-            if channel.base_fee > base_fee:
-                continue
-            # FIXME: Remove Magic Number for pruning
-            # Prune channels away that have too low success probability! This is a huge runtime boost
-            # However the pruning would be much better to work on quantiles of normalized cost
-            # So as soon as we have better Scaling, Centralization and feature engineering we can
-            # probably have a more focused pruning
-            if self._uncertainty_network.prune and channel.success_probability(250_000) < 0.9:
-                continue
-            cnt = 0
-            # QUANTIZATION):
-            for capacity, cost in channel.get_piecewise_linearized_costs(mu=mu):
-                index = self._min_cost_flow.AddArcWithCapacityAndUnitCost(self._mcf_id[s],
-                                                                          self._mcf_id[d],
-                                                                          capacity,
-                                                                          cost)
-                self._arc_to_channel[index] = (s, d, channel, 0)
-                if self._uncertainty_network.prune and cnt > 1:
-                    break
-                cnt += 1
-
-        # Add node supply to 0 for all nodes
-        for i in self._uncertainty_network.network.nodes():
-            self._min_cost_flow.SetNodeSupply(self._mcf_id[i], 0)
-
-        # add amount to sending node
-        self._min_cost_flow.SetNodeSupply(
-            self._mcf_id[self._sender], int(self._total_amount))  # /QUANTIZATION))
-
-        # add -amount to recipient nods
-        self._min_cost_flow.SetNodeSupply(
-            self._mcf_id[self._receiver], -int(self._total_amount))  # /QUANTIZATION))
-
-    def _make_channel_path(self, G: nx.MultiDiGraph, path: List[str]) -> object:
-        """
-        network x returns a path as a list of node_ids. However, we need a list of `UncertaintyChannels`
-        Since the graph has parallel edges it is quite some work to get the actual channels that the
-        min cost flow solver produced
-        """
-        channel_path = []
-        bottleneck = 2 ** 63
-        for src, dest in self._next_hop(path):
-            w = 2 ** 63
-            c = None
-            flow = 0
-            for sid in G[src][dest].keys():
-                if G[src][dest][sid]["weight"] < w:
-                    w = G[src][dest][sid]["weight"]
-                    c = G[src][dest][sid]["channel"]
-                    flow = G[src][dest][sid]["flow"]
-            channel_path.append(c)
-
-            if flow < bottleneck:
-                bottleneck = flow
-
-        return channel_path, bottleneck
+        status, self._min_cost_flow, self._arc_to_channel = self._uncertainty_network.mcf_model.solve(
+            self._sender, self._receiver, self._total_amount, mu, base_fee)
+        return status
 
     def _dissect_flow_to_paths(self, s, d) -> List[Attempt]:
         """
-        A standard algorithm to dissect a flow into several paths.
-        FIXME: Note that this dissection while accurate is probably not optimal in practice.
+        dissects the flow of the solver into paths from `s` to `d` with the decomposition strategy of the payment
+        (see `FlowDecomposition`) and returns an Attempt for every path.
+        FIXME: Note that the default dissection while accurate is probably not optimal in practice.
 
         As noted in our Probabilistic payment delivery paper the payment process is a bernoulli trial
         and I assume it makes sense to dissect the flow into paths of similar likelihood to make most
         progress but this is a mere conjecture at this point. I expect quite a bit of research will be
-        necessary to resolve this issue.
-        """
-        # first collect all linearized edges which are assigned a non-zero flow put them into a networkx graph
-        G = nx.MultiDiGraph()
-        for i in range(self._min_cost_flow.NumArcs()):
-            flow = self._min_cost_flow.Flow(i)  # *QUANTIZATION
-            if flow == 0:
-                continue
-
-            src, dest, channel, _ = self._arc_to_channel[i]
-            if G.has_edge(src, dest) and (channel.short_channel_id in G[src][dest]):
-                G[src][dest][channel.short_channel_id]["flow"] += flow
-            else:
-                # FIXME: cost is not reflecting exactly the piecewise linearization
-                # Probably not such a big issue as we just dissect flow
-                G.add_edge(src, dest, key=channel.short_channel_id, flow=flow,
-                           channel=channel, weight=channel.combined_linearized_unit_cost())
-        used_flow = 1
-        attempts = []
-
-        # allocate flow to shortest / cheapest paths from src to dest as long as this is possible
-        # decrease flow along those edges. This is a standard mechanism to dissect a flow into paths
-
-        while used_flow > 0:
-            try:
-                path = nx.shortest_path(G, s, d)
-            except Exception as e:
-                break
-            channel_path, used_flow = self._make_channel_path(G, path)
-            attempts.append(Attempt(channel_path, used_flow))
-            # reduce the flow from the selected path
-            for pos, hop in enumerate(self._next_hop(path)):
-                src, dest = hop
-                channel = channel_path[pos]
-                G[src][dest][channel.short_channel_id]["flow"] -= used_flow
-                if G[src][dest][channel.short_channel_id]["flow"] == 0:
-                    G.remove_edge(src, dest, key=channel.short_channel_id)
-        return attempts
-
-    def _next_hop(self, path):
-        """
-        generator to iterate through edges indexed by node id of paths
-
-        The path is a list of node ids. Each call returns a tuple src, dest of an edge in the path
+        necessary to resolve this issue. The strategy EQUAL_PROBABILITY is a first step in this direction.
         """
-        for i in range(1, len(path)):
-            src = path[i - 1]
-            dest = path[i]
-            yield src, dest
+        decomposition = FlowDecomposition(self._min_cost_flow, self._arc_to_channel)
+        return [Attempt(channel_path, amount) for channel_path, amount in decomposition.paths(s, d, self._decomposition)]
 
     def attempt_payments(self):
         """
@@ -502,14 +381,13 @@ class Payment:
             # in send_onion: in_flights placed on all oracle and uncertainty channels if successful
             # will be removed in PaymentSession at the end of the loop
             success_of_probe, erring_channel = self._oracle_network.send_onion(attempt)
-            logger.debug(f"attempting payments successful: {success_of_probe} for {attempt} ")
             for uncertainty_channel in iter(attempt.path):
                 return_channel = self.uncertainty_network.get_channel(uncertainty_channel.dest,
                                                                       uncertainty_channel.src,
                                                                       uncertainty_channel.short_channel_id)
 
                 if not return_channel:
-                    logger.warning("back channel missing for ", uncertainty_channel.short_channel_id)
+                    logger.warning("back channel missing for %s", uncertainty_channel.short_channel_id)
 
                 if uncertainty_channel == erring_channel:
                     uncertainty_channel.update_knowledge(attempt.amount, return_channel, False)
@@ -520,40 +398,10 @@ class Payment:
             if success_of_probe:
                 self._residual_amount -= attempt.amount
 
-            if not success_of_probe:
-                logger.debug("failed sending {:,} through {}-{}".format(attempt.amount + erring_channel.in_flight,
-                                                                        erring_channel.src[0:4],
-                                                                        erring_channel.dest[0:4]))
-                err_ch = self.oracle_network.get_channel(erring_channel.src, erring_channel.dest,
-                                                         erring_channel.short_channel_id)
-                logger.debug("which has {:,.0f} sats liquidity with capacity {:,} and {:,} sats in_flight".format(
-                    err_ch.actual_liquidity, err_ch.capacity, err_ch.in_flight))
-
-            for ch in iter(attempt.path):
-                liquidity = self.oracle_network.get_channel(ch.src, ch.dest, ch.short_channel_id).actual_liquidity
-                logger.debug(
-                    "(03) {}-{} Channel\t\tEst: [{:>10,} ; {:>11,}]\tliqui {:>11,}\ti_f {:>10,};"
-                    "\tcond_cap: {:>10,}".format(
-                        ch.src[:4],
-                        ch.dest[:4],
-                        ch.min_liquidity,
-                        ch.max_liquidity,
-                        liquidity,
-                        ch.in_flight,
-                        ch.conditional_capacity))
-
-                return_channel = self.uncertainty_network.get_channel(ch.dest, ch.src, ch.short_channel_id)
-                return_liquidity = self.oracle_network.get_channel(ch.dest, ch.src,
-                                                                   ch.short_channel_id).actual_liquidity
-                if return_channel:
-                    logger.debug("(03) {}-{} Ret Channel\tEst: [{:>10,} ; {:>11,}]\tliqui {:>11,}\ti_f "
-                                 "{:>10,};\tcond_cap: {:>10,}".format(return_channel.src[:4],
-                                                                     return_channel.dest[:4],
-                                                                     return_channel.min_liquidity,
-                                                                     return_channel.max_liquidity,
-                                                                     return_liquidity,
-                                                                     return_channel.in_flight,
-                                                                     return_channel.conditional_capacity))
+            if TRACER.enabled:
+                TRACER.channels("probed", self._uncertainty_network, attempt.path, self._oracle_network,
+                                amount=attempt.amount, success=success_of_probe,
+                                erring_channel=erring_channel.index if erring_channel is not None else None)
 
         return 0
 
@@ -562,6 +410,8 @@ class Payment:
         Helper function to collect statistics about attempts and sends info about the attempts to the logfile
 
         """
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         residual_amt = 0
         expected_sats_to_deliver = 0
         amt = 0
@@ -615,33 +465,15 @@ class Payment:
 
         """
         logger.info("Executing Payment...")
-        logger.debug("settling {} Attempts:".format(len(list(self.filter_attempts(AttemptStatus.INFLIGHT)))))
         for attempt in self.filter_attempts(AttemptStatus.INFLIGHT):
-            for channel in attempt.path:
-                logger.debug("(04) {}-{} Uncertainty Range:\t\t[{:>10,} ; {:>10,}]\t\tinflight {:>10,};"
-                             "\tcond_cap: {:>10,}".format(channel.src[:4],
-                                                          channel.dest[:4],
-                                                          channel.min_liquidity,
-                                                          channel.max_liquidity,
-                                                          channel.in_flight,
-                                                          channel.conditional_capacity))
-                return_channel = self.uncertainty_network.get_channel(channel.dest, channel.src,
-                                                                      channel.short_channel_id)
-                if return_channel:
-                    logger.debug("(05) {}-{} Uncertainty Range:\t\t[{:>10,} ; {:>10,}]\t\tinflight {:>10,};"
-                                 "\tcond_cap: {:>10,}".format(return_channel.src[:4],
-                                                              return_channel.dest[:4],
-                                                              return_channel.min_liquidity,
-                                                              return_channel.max_liquidity,
-                                                              return_channel.in_flight,
-                                                              return_channel.conditional_capacity))
+            if TRACER.enabled:
+                TRACER.channels("settling", self._uncertainty_network, attempt.path, amount=attempt.amount)
             try:
-                logger.debug("settling OracleNetwork...")
                 self._oracle_network.settle_attempt(attempt)  # updates in_flight and liquidity in both paths
-                logger.debug("settled. settling UncertaintyNetwork...")
                 self._uncertainty_network.settle_attempt(attempt)  # adjusting knowledge about channel
                 attempt.status = AttemptStatus.SETTLED
 
+                channel = attempt.path[-1]
                 oracle_channel = self.oracle_network.get_channel(channel.src, channel.dest, channel.short_channel_id)
                 if not ((oracle_channel.actual_liquidity <= channel.max_liquidity) and
                         (oracle_channel.actual_liquidity >= channel.min_liquidity)):
@@ -649,8 +481,8 @@ class Payment:
                                      "min is {:,}, liqui is {:,} max is {:,}".format(channel.min_liquidity,
                                                                                      oracle_channel.actual_liquidity,
                                                                                      channel.max_liquidity))
-
-                logger.debug("settled. Status changed to settled")
+                if TRACER.enabled:
+                    TRACER.channels("settled", self._uncertainty_network, attempt.path)
 
             except Exception as e:
                 logger.error("An error occurred when executing payment!")
@@ -660,25 +492,6 @@ class Payment:
 
         self.successful = True
         self._end_time = time.time()
-        logger.debug("payment executed!")
-        for channel in attempt.path:
-            logger.debug("(06) {}-{} Uncertainty Range:\t\t[{:>10,} ; {:>10,}]\t\tinflight {:>10,};"
-                         "\tcond_cap: {:>10,}".format(channel.src[:4],
-                                                      channel.dest[:4],
-                                                      channel.min_liquidity,
-                                                      channel.max_liquidity,
-                                                      channel.in_flight,
-                                                      channel.conditional_capacity))
-            return_channel = self.uncertainty_network.get_channel(channel.dest, channel.src,
-                                                                  channel.short_channel_id)
-            if return_channel:
-                logger.debug("(07) {}-{} Uncertainty Range:\t\t[{:>10,} ; {:>10,}]\t\tinflight {:>10,};"
-                             "\tcond_cap: {:>10,}".format(return_channel.src[:4],
-                                                          return_channel.dest[:4],
-                                                          return_channel.min_liquidity,
-                                                          return_channel.max_liquidity,
-                                                          return_channel.in_flight,
-                                                          return_channel.conditional_capacity))
         return 0
 
     def get_summary(self):
@@ -703,7 +516,7 @@ class Payment:
         logger.info("Payment was successful: %s", self.successful)
         logger.debug("")
 
-    def convert_node_path_to_attempt_path(self, graph: nx.MultiDiGraph, nodes: list) -> list:
+    def convert_node_path_to_attempt_path(self, graph: "nx.MultiDiGraph", nodes: list) -> list:
         path = []
         i = 0
         while i < len(nodes) - 1:
@@ -712,15 +525,20 @@ class Payment:
             i += 1
         return path
 
-    def get_dijkstra_path(self, graph, weight: str):
-        try:
-            node_path = nx.dijkstra_path(graph, self.sender,
-                                         self.receiver, weight=weight)
-        except:
+    def get_dijkstra_path(self, routing_graph, criteria: str, mask=None):
+        """
+        determines the cheapest path from sender to receiver in the `RoutingGraph` and adds it as an Attempt
+
+        :param criteria: 'fee', 'probability' or 'mixed'
+        :type: str
+        :param mask: boolean array over the channel ids. Only channels that are True are used.
+        :type: np.ndarray
+        """
+        channel_ids = routing_graph.dijkstra(self.sender, self.receiver, criteria, self._total_amount, mask)
+        if channel_ids is None:
             logging.error("no path found")
             raise DijkstraSolverError('Cannot determine path with Dijkstra.')
-        else:
-            logging.debug(f"shortest path: {node_path}")
-            path = self.convert_node_path_to_attempt_path(graph, node_path)
-            self.attempts.append(Attempt(path, self._total_amount))
-            return path
+        path = [routing_graph.channel(channel_id) for channel_id in channel_ids]
+        logging.debug("shortest path: %s", channel_ids)
+        self.attempts.append(Attempt(path, self._total_amount))
+        return path
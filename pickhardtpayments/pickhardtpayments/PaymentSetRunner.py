@@ -0,0 +1,382 @@
+"""
+PaymentSetRunner.py
+====================================
+Replays a set of payments with one delivery method and returns one record per payment.
+
+The payments can be distributed over several worker processes. Every worker gets a copy-on-write snapshot of the
+OracleLightningNetwork and the UncertaintyNetwork and works on a contiguous part of the payment set.
+"""
+import logging
+import math
+import os
+
+import numpy as np
+
+from .FlowDecomposition import SHORTEST
+from .FlowLog import FlowRecorder
+from .OracleLightningNetwork import OracleLightningNetwork
+from .SyncSimulatedPaymentSession import SyncSimulatedPaymentSession
+from .UncertaintyNetwork import UncertaintyNetwork
+
+# every payment starts from the initial liquidity of the OracleLightningNetwork
+INDEPENDENT = "independent"
+# the liquidity of the OracleLightningNetwork evolves with every settled payment (as in main.py)
+SEQUENTIAL = "sequential"
+MODES = (INDEPENDENT, SEQUENTIAL)
+
+
+class DeliveryMethod:
+    """
+    A DeliveryMethod describes how a single payment is delivered in a SyncSimulatedPaymentSession, either with
+    `dijkstra_pay` for a `criteria` or with `pickhardt_pay` for a value of `mu`.
+    """
+
+    def __init__(self, name: str, delivery_method: str, criteria: str = None, mu: int = None,
+                 retain_knowledge: bool = False, decomposition: str = SHORTEST):
+        """
+        :param name: name of the method, used for file names
+        :type: str
+        :param delivery_method: value of the field `delivery_method` in the records
+        :type: str
+        :param criteria: criteria of `dijkstra_pay`. If None, `pickhardt_pay` is used
+        :type: str
+        :param mu: mu of `pickhardt_pay`
+        :type: int
+        :param retain_knowledge: if set, the UncertaintyNetwork keeps what it learnt from earlier payments. Otherwise,
+        it forgets all information before every payment.
+        :type: bool
+        :param decomposition: strategy of `pickhardt_pay` that dissects the flows into paths, see `FlowDecomposition`
+        :type: str
+        """
+        self.name = name
+        self.delivery_method = delivery_method
+        self.criteria = criteria
+        self.mu = mu
+        self.retain_knowledge = retain_knowledge
+        self.decomposition = decomposition
+
+    def __repr__(self):
+        return f"DeliveryMethod({self.name})"
+
+    def pay(self, session: SyncSimulatedPaymentSession, payment_run: int, flow_list: FlowRecorder, payment: dict,
+            loglevel: str = "error"):
+        """
+        delivers `payment` and returns the residual amount (-1 if no path was found) and the fees
+        """
+        if self.criteria is not None:
+            return session.dijkstra_pay(payment["sender"], payment["receiver"], payment["amount"], self.criteria,
+                                        loglevel=loglevel)
+        return session.pickhardt_pay(payment_run, flow_list, payment["sender"], payment["receiver"],
+                                     payment["amount"], mu=self.mu, loglevel=loglevel,
+                                     decomposition=self.decomposition)
+
+
+DELIVERY_METHODS = {
+    "dijkstra_fee": DeliveryMethod("dijkstra_fee", "dijkstra_fees", criteria="fee"),
+    "dijkstra_probability": DeliveryMethod("dijkstra_probability", "dijkstra_probabilities", criteria="probability"),
+    "dijkstra_mixed": DeliveryMethod("dijkstra_mixed", "dijkstra_mixed", criteria="mixed"),
+    "pickhardtpay_fee": DeliveryMethod("pickhardtpay_fee", "pickhardt_pay_fees", mu=1000),
+    "pickhardtpay_prob": DeliveryMethod("pickhardtpay_prob", "pickhardt_pay_probability", mu=0),
+    "pickhardtpay_mixed": DeliveryMethod("pickhardtpay_mixed", "pickhardt_pay_mixed", mu=500),
+    "retained_knowledge_pickhardtpay_prob": DeliveryMethod("retained_knowledge_pickhardtpay_prob",
+                                                           "pickhardt_pay_probability_retained", mu=0,
+                                                           retain_knowledge=True),
+}
+
+
+def payment_record(payment: dict, delivery_method: str, ret: int, fees) -> dict:
+    """
+    returns the record of a payment as it is written to the results files
+
+    :param ret: the residual amount that was returned by the delivery method, -1 if no path was found
+    :type: int
+    """
+    record = dict(payment)
+    record["delivery_method"] = delivery_method
+    record["fees"] = fees
+    if ret == 0:
+        record["residual_amount"] = 0
+        record["success"] = "success"
+    elif ret > 0:
+        record["residual_amount"] = ret
+        record["success"] = "delivery_failure"
+    else:
+        record["residual_amount"] = payment["amount"]
+        record["success"] = "no_path_found"
+    return record
+
+
+class PaymentSetRunner:
+    """
+    Replays a payment set with one DeliveryMethod.
+
+    Before every payment the UncertaintyNetwork forgets all information unless the DeliveryMethod retains knowledge.
+    What happens to the OracleLightningNetwork depends on the mode:
+     - INDEPENDENT: every payment is made against the initial liquidity of the OracleLightningNetwork. As the payments
+       do not influence each other, they are distributed over `max_workers` processes.
+     - SEQUENTIAL: the liquidity of the OracleLightningNetwork evolves with every settled payment. This is what the
+       simulation in main.py does. With more than one worker the payments are executed speculatively: batches of
+       `batch_size` payments are made in parallel against a snapshot of both networks and every payment records the
+       oracle channels it accessed. The results are committed in payment order. A payment that accessed a channel
+       which an earlier payment of the batch changed is made again in the calling process. Records, flows and the
+       final state of the channels are identical to making the payments one after the other. A DeliveryMethod that
+       retains knowledge makes every payment depend on the beliefs of the previous one, so its payments are always
+       made one after the other.
+
+    The OracleLightningNetwork passed to the runner is not changed in INDEPENDENT mode. In SEQUENTIAL mode both
+    networks end up in the state after the last payment.
+    """
+
+    def __init__(self, oracle_network, uncertainty_network, method: DeliveryMethod, mode: str = INDEPENDENT,
+                 max_workers: int = None, prune_network: bool = False, loglevel: str = "error",
+                 batch_size: int = None):
+        if mode not in MODES:
+            raise ValueError(f"unknown mode {mode}, expected one of {MODES}")
+        if mode == INDEPENDENT and method.retain_knowledge:
+            raise ValueError(f"{method} retains knowledge between payments and needs mode {SEQUENTIAL}")
+        self._oracle_network = oracle_network
+        self._uncertainty_network = uncertainty_network
+        self._method = method
+        self._mode = mode
+        self._max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self._prune_network = prune_network
+        self._loglevel = loglevel
+        self._batch_size = batch_size if batch_size is not None else 4 * self._max_workers
+        self.flows = FlowRecorder()
+        # number of payments that were made again because of a conflict in SEQUENTIAL mode
+        self.reexecuted = 0
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    def run(self, payments: list) -> list:
+        """
+        delivers all payments and returns their records in the order of `payments`. The flows of `pickhardt_pay`
+        are collected in the FlowRecorder `flows`.
+        """
+        return list(self.iter_records(payments))
+
+    def iter_records(self, payments: list):
+        """
+        delivers all payments and yields their records in the order of `payments` as soon as they are final
+        """
+        self.flows = FlowRecorder()
+        for record, flows in self.iter_results(payments):
+            self.flows.extend(flows)
+            yield record
+
+    def iter_results(self, payments: list, start: int = 0):
+        """
+        delivers all payments and yields their records together with their flows in the order of `payments` as soon
+        as they are final. The flows are not collected in `flows`.
+
+        :param start: position of the first payment in the payment set, e.g. when a run is resumed
+        :type: int
+        """
+        self.reexecuted = 0
+        if self._max_workers > 1 and self._mode == SEQUENTIAL and self._method.retain_knowledge:
+            logging.info("%s retains knowledge, the payments are made one after the other", self._method)
+        if self._max_workers <= 1 or len(payments) <= 1 or self._method.retain_knowledge:
+            return _iter_payments(self._oracle_network, self._uncertainty_network, self._method, self._mode,
+                                  self._prune_network, self._loglevel, start, payments)
+        elif self._mode == SEQUENTIAL:
+            return self._iter_speculative(payments, start)
+        return self._iter_parallel(payments, start)
+
+    def _iter_parallel(self, payments: list, offset: int = 0):
+        """
+        makes the payments of INDEPENDENT mode in contiguous chunks on the workers
+        """
+        chunk_size = math.ceil(len(payments) / (4 * self._max_workers))
+        with self._executor() as executor:
+            futures = [executor.submit(_run_chunk, offset + start, payments[start:start + chunk_size])
+                       for start in range(0, len(payments), chunk_size)]
+            for future in futures:
+                yield from future.result()
+
+    def _executor(self) -> "ProcessPoolExecutor":
+        # imported here, so that importing the module does not load multiprocessing
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        if "fork" in multiprocessing.get_all_start_methods():
+            # the workers inherit the networks copy-on-write instead of unpickling them
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        return ProcessPoolExecutor(max_workers=self._max_workers, mp_context=context, initializer=_init_worker,
+                                   initargs=(self._oracle_network, self._uncertainty_network, self._method,
+                                             self._prune_network, self._loglevel))
+
+    def _iter_speculative(self, payments: list, offset: int = 0):
+        """
+        makes the payments of SEQUENTIAL mode speculatively in parallel batches and commits them in payment order
+        """
+        session = SyncSimulatedPaymentSession(self._oracle_network, self._uncertainty_network,
+                                              prune_network=self._prune_network)
+        chunk_size = math.ceil(self._batch_size / self._max_workers)
+        with self._executor() as executor:
+            for batch_start in range(0, len(payments), self._batch_size):
+                batch = payments[batch_start:batch_start + self._batch_size]
+                state = _snapshot(session, self._method)
+                futures = [executor.submit(_speculate, state, offset + batch_start + start,
+                                           batch[start:start + chunk_size])
+                           for start in range(0, len(batch), chunk_size)]
+
+                c = offset + batch_start
+                changed_oracle_channels = set()
+                for future in futures:
+                    for result in future.result():
+                        c += 1
+                        if not result[2].isdisjoint(changed_oracle_channels):
+                            # the payment depends on a change of an earlier payment of the batch
+                            result = _execute(session, self._method, c, payments[c - offset - 1], self._loglevel)
+                            self.reexecuted += 1
+                        else:
+                            _commit(session, self._method, result)
+                        record, flows, _, oracle_changes, _ = result
+                        changed_oracle_channels.update(oracle_changes[0].tolist())
+                        yield record, flows
+        logging.info("%d of %d payments were made again because of conflicts", self.reexecuted, len(payments))
+
+
+# the state columns of the networks that a payment can change
+ORACLE_COLUMNS = OracleLightningNetwork.STATE_COLUMNS
+UNCERTAINTY_COLUMNS = UncertaintyNetwork.STATE_COLUMNS
+
+
+def _iter_payments(oracle_network, uncertainty_network, method: DeliveryMethod, mode: str, prune_network: bool,
+                   loglevel: str, start: int, payments: list):
+    """
+    delivers `payments` one after the other and yields the record and the flows of every payment. `start` is the
+    position of the first payment in the payment set.
+    """
+    session = SyncSimulatedPaymentSession(oracle_network, uncertainty_network, prune_network=prune_network)
+    if mode == INDEPENDENT:
+        initial_state = oracle_network.snapshot()
+
+    try:
+        for c, payment in enumerate(payments, start + 1):
+            logging.debug("%d of %d", c, start + len(payments))
+            if mode == INDEPENDENT:
+                oracle_network.restore(initial_state)
+            if not method.retain_knowledge:
+                session.forget_information()
+            flows = FlowRecorder()
+            ret, fees = method.pay(session, c, flows, payment, loglevel)
+            yield payment_record(payment, method.delivery_method, ret, fees), flows
+    finally:
+        if mode == INDEPENDENT:
+            oracle_network.restore(initial_state)
+
+
+def _changes(network, before, after) -> tuple:
+    """
+    returns the rows in which the snapshots `before` and `after` of `network` differ together with the values of
+    `after`. Only the rows of the snapshots are compared, all other rows are in their initial state in both.
+    """
+    rows = np.union1d(before.rows, after.rows)
+    changed = np.zeros(len(rows), dtype=bool)
+    values = []
+    for old, new, old_values, new_values in zip(network.initial_state(rows), network.initial_state(rows),
+                                                before.values, after.values):
+        old[np.searchsorted(rows, before.rows)] = old_values
+        new[np.searchsorted(rows, after.rows)] = new_values
+        changed |= old != new
+        values.append(new)
+    return (rows[changed],) + tuple(new[changed] for new in values)
+
+
+def _apply(table, columns: tuple, changes: tuple, uncertainty_network=None):
+    """
+    writes `changes` as returned by `_changes` to `table` and notifies the UncertaintyNetwork about the changes
+    """
+    rows = changes[0]
+    for column, values in zip(columns, changes[1:]):
+        getattr(table, column)[rows] = values
+    table.changed_rows.update(rows.tolist())
+    if uncertainty_network is not None:
+        for row in rows.tolist():
+            uncertainty_network.channel_changed(row)
+
+
+def _execute(session: SyncSimulatedPaymentSession, method: DeliveryMethod, c: int, payment: dict, loglevel: str):
+    """
+    delivers a single payment and returns the record, the flows, the accessed oracle channels and the changes to the
+    oracle and the uncertainty network. The changes are found with the snapshots of the networks, which only hold
+    the channels in the journals of the networks.
+    """
+    oracle_network, uncertainty_network = session.oracle_network, session.uncertainty_network
+    if not method.retain_knowledge:
+        session.forget_information()
+    oracle_before, uncertainty_before = oracle_network.snapshot(), uncertainty_network.snapshot()
+
+    flows = FlowRecorder()
+    oracle_network.start_recording_access()
+    try:
+        ret, fees = method.pay(session, c, flows, payment, loglevel)
+    finally:
+        accessed = oracle_network.stop_recording_access()
+    return (payment_record(payment, method.delivery_method, ret, fees), flows, accessed,
+            _changes(oracle_network, oracle_before, oracle_network.snapshot()),
+            _changes(uncertainty_network, uncertainty_before, uncertainty_network.snapshot()))
+
+
+def _commit(session: SyncSimulatedPaymentSession, method: DeliveryMethod, result: tuple):
+    """
+    applies the changes of a speculatively executed payment to the networks of `session`
+    """
+    if not method.retain_knowledge:
+        session.forget_information()
+    _apply(session.oracle_network.table, ORACLE_COLUMNS, result[3])
+    _apply(session.uncertainty_network.table, UNCERTAINTY_COLUMNS, result[4], session.uncertainty_network)
+
+
+def _snapshot(session: SyncSimulatedPaymentSession, method: DeliveryMethod) -> tuple:
+    """
+    returns the snapshots of the networks that a speculatively executed payment can depend on
+    """
+    oracle_state = session.oracle_network.snapshot()
+    if not method.retain_knowledge:
+        # the UncertaintyNetwork forgets all information before every payment
+        return oracle_state, None
+    return oracle_state, session.uncertainty_network.snapshot()
+
+
+def _restore(session: SyncSimulatedPaymentSession, state: tuple):
+    """
+    sets the networks of `session` back to a state returned by `_snapshot`
+    """
+    oracle_state, uncertainty_state = state
+    session.oracle_network.restore(oracle_state)
+    if uncertainty_state is not None:
+        session.uncertainty_network.restore(uncertainty_state)
+
+
+# state of a worker process, set by `_init_worker`
+_worker_args = None
+_worker_session = None
+
+
+def _init_worker(oracle_network, uncertainty_network, method: DeliveryMethod, prune_network: bool, loglevel: str):
+    global _worker_args, _worker_session
+    _worker_args = (oracle_network, uncertainty_network, method, INDEPENDENT, prune_network, loglevel)
+    _worker_session = SyncSimulatedPaymentSession(oracle_network, uncertainty_network, prune_network=prune_network)
+
+
+def _run_chunk(start: int, payments: list) -> list:
+    return list(_iter_payments(*_worker_args, start, payments))
+
+
+def _speculate(state: tuple, start: int, payments: list) -> list:
+    """
+    executes every payment against `state` and returns the results of `_execute`
+    """
+    method, loglevel = _worker_args[2], _worker_args[5]
+    _restore(_worker_session, state)
+    results = []
+    for c, payment in enumerate(payments, start + 1):
+        results.append(_execute(_worker_session, method, c, payment, loglevel))
+        _restore(_worker_session, state)
+    return results
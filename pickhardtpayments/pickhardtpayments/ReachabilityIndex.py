@@ -0,0 +1,145 @@
+"""
+ReachabilityIndex.py
+====================================
+Answers whether a receiver can be reached from a sender without searching a path for every payment.
+
+The strongly connected components of the network are computed once. Every component stores the set of components it
+can reach as a row of a bit matrix, so a payment set is checked with a few array lookups.
+"""
+import numpy as np
+
+from .RoutingGraph import RoutingGraph
+
+
+def _strongly_connected_components(indptr: list, heads: list) -> tuple:
+    """
+    iterative version of Tarjan's algorithm on the CSR graph (`indptr`, `heads`).
+
+    :return: the component of every node and the number of components. The components are numbered in reverse
+        topological order, i.e. a component only reaches components with a smaller number.
+    :rtype: tuple
+    """
+    number_of_nodes = len(indptr) - 1
+    index = [-1] * number_of_nodes
+    low = [0] * number_of_nodes
+    on_stack = [False] * number_of_nodes
+    component = [-1] * number_of_nodes
+    stack = []
+    counter = 0
+    number_of_components = 0
+    for root in range(number_of_nodes):
+        if index[root] >= 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, indptr[root])]
+        while work:
+            v, k = work[-1]
+            end = indptr[v + 1]
+            while k < end:
+                w = heads[k]
+                k += 1
+                if index[w] < 0:
+                    # descend into w and continue with the next channel of v afterwards
+                    work[-1] = (v, k)
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, indptr[w]))
+                    break
+                elif on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+            else:
+                work.pop()
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component[w] = number_of_components
+                        if w == v:
+                            break
+                    number_of_components += 1
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+    return component, number_of_components
+
+
+class ReachabilityIndex:
+    """
+    Reachability between the nodes of a ChannelGraph over channels with a capacity larger than `min_capacity`.
+
+    The index is built from the current network and does not follow later changes of the network. It needs one bit
+    for every pair of strongly connected components.
+    """
+
+    def __init__(self, channel_graph, min_capacity: int = None):
+        """
+        :param min_capacity: only channels with a capacity larger than `min_capacity` connect nodes
+        :type: int
+        """
+        routing_graph = RoutingGraph(channel_graph)
+        self._nodes = routing_graph.routing_ids()
+        self._min_capacity = min_capacity
+
+        indptr, heads = routing_graph.indptr, routing_graph.heads
+        tails = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        if min_capacity is not None:
+            usable = channel_graph.table.capacity[routing_graph.channel_ids] > min_capacity
+            tails, heads = tails[usable], heads[usable]
+            indptr = np.concatenate(([0], np.cumsum(np.bincount(tails, minlength=len(indptr) - 1))))
+
+        component, self._number_of_components = _strongly_connected_components(indptr.tolist(), heads.tolist())
+        self._component = np.array(component, dtype=np.int64)
+
+        # every component reaches itself and everything its successors reach. Successors have smaller numbers, so
+        # their rows are final when a component is processed.
+        reach = np.zeros((self._number_of_components, (self._number_of_components + 7) // 8), dtype=np.uint8)
+        components = np.arange(self._number_of_components)
+        reach[components, components >> 3] = 1 << (components & 7)
+        successors = np.unique(np.stack((self._component[tails], self._component[heads]), axis=1), axis=0)
+        successors = successors[successors[:, 0] != successors[:, 1]]
+        bounds = np.searchsorted(successors[:, 0], np.arange(self._number_of_components + 1))
+        for c in range(self._number_of_components):
+            if bounds[c] < bounds[c + 1]:
+                reach[c] |= np.bitwise_or.reduce(reach[successors[bounds[c]:bounds[c + 1], 1]], axis=0)
+        self._reach = reach
+
+    @property
+    def min_capacity(self) -> int:
+        return self._min_capacity
+
+    @property
+    def number_of_components(self) -> int:
+        return self._number_of_components
+
+    def reachable_pairs(self, senders: list, receivers: list) -> np.ndarray:
+        """
+        returns for every pair of sender and receiver whether the receiver can be reached from the sender. Nodes that
+        are not part of the network are not reachable.
+
+        :rtype: np.ndarray
+        """
+        sender_ids = np.array([self._nodes.get(node, -1) for node in senders], dtype=np.int64)
+        receiver_ids = np.array([self._nodes.get(node, -1) for node in receivers], dtype=np.int64)
+        known = (sender_ids >= 0) & (receiver_ids >= 0)
+        sender_components = self._component[sender_ids[known]]
+        receiver_components = self._component[receiver_ids[known]]
+        result = np.zeros(len(sender_ids), dtype=bool)
+        result[known] = (self._reach[sender_components, receiver_components >> 3] >> (receiver_components & 7)) & 1
+        return result
+
+    def reachable(self, sender: str, receiver: str) -> bool:
+        return bool(self.reachable_pairs([sender], [receiver])[0])
+
+    def filter_payments(self, payments: list) -> list:
+        """
+        returns the payments (dictionaries with `sender` and `receiver`) whose receiver is reachable from the sender
+        """
+        connected = self.reachable_pairs([payment["sender"] for payment in payments],
+                                         [payment["receiver"] for payment in payments])
+        return [payment for payment, is_connected in zip(payments, connected.tolist()) if is_connected]
@@ -0,0 +1,250 @@
+"""
+ResultWriter.py
+====================================
+Streams the records of a simulation run to an NDJSON file as the payments are made, so that a crashed run keeps its
+results and can be resumed.
+
+The records are appended to their file and optionally the flows of every payment to a columnar flow log (see
+`FlowLog`). Both are written to disk with `fsync` every `sync_every` payments. After every sync a checkpoint is stored
+next to the results file: the number of records, the size of the results file, the number of chunks of the flow log
+and the snapshots of the networks after the last payment. A manifest (`<results>.manifest.json`)
+describes the run and its progress and is replaced atomically.
+
+A run that is opened with `resume=True` cuts the files back to the last checkpoint and returns it, the payments up to
+the checkpoint are then skipped:
+
+    writer = ResultWriter("data/run_pickhardtpay_prob.ndjson", "data/run_pickhardtpay_prob_flow", table,
+                          metadata={"method": "pickhardtpay_prob"})
+    checkpoint = writer.open(resume=True)
+    for record, flows in runner.iter_results(payments[checkpoint.records:], checkpoint.records):
+        writer.write(record, flows, snapshot)
+    writer.close()
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from .ChannelTable import StateSnapshot
+from .FlowLog import FlowLogWriter, FlowRecorder
+
+# payments between two syncs of the files
+DEFAULT_SYNC_EVERY = 100
+
+RUNNING = "running"
+COMPLETE = "complete"
+
+
+class Checkpoint:
+    """
+    The progress of a run at the last sync: the number of records, the size of the results file and the number of
+    chunks of the flow log as well as the snapshots of the OracleLightningNetwork and the UncertaintyNetwork after
+    the last record (None if the state was not recorded).
+    """
+
+    __slots__ = ("records", "results_size", "flow_chunks", "oracle_state", "uncertainty_state")
+
+    def __init__(self, records: int = 0, results_size: int = 0, flow_chunks: int = 0,
+                 oracle_state: StateSnapshot = None, uncertainty_state: StateSnapshot = None):
+        self.records = records
+        self.results_size = results_size
+        self.flow_chunks = flow_chunks
+        self.oracle_state = oracle_state
+        self.uncertainty_state = uncertainty_state
+
+
+def _state_arrays(prefix: str, snapshot: StateSnapshot) -> dict:
+    if snapshot is None:
+        return {}
+    arrays = {f"{prefix}_rows": snapshot.rows, f"{prefix}_topology": np.array(snapshot.topology)}
+    for k, values in enumerate(snapshot.values):
+        arrays[f"{prefix}_values_{k}"] = values
+    return arrays
+
+
+def _state_from_arrays(prefix: str, data) -> StateSnapshot:
+    if f"{prefix}_rows" not in data:
+        return None
+    number_of_columns = sum(1 for name in data.files if name.startswith(f"{prefix}_values_"))
+    values = tuple(data[f"{prefix}_values_{k}"] for k in range(number_of_columns))
+    return StateSnapshot(data[f"{prefix}_rows"], values, int(data[f"{prefix}_topology"]))
+
+
+def _fsync_directory(file: str):
+    """
+    makes a rename in the directory of `file` durable (not supported on every platform)
+    """
+    try:
+        descriptor = os.open(os.path.dirname(os.path.abspath(file)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
+class ResultWriter:
+    """
+    Appends the records of a run to `results_file` (NDJSON) and the flows of the payments to the flow log in
+    `flows_file`.
+    """
+
+    def __init__(self, results_file: str, flows_file: str = None, channel_table=None,
+                 sync_every: int = DEFAULT_SYNC_EVERY, metadata: dict = None):
+        """
+        :param flows_file: directory of the flow log of the payments, None to drop the flows
+        :type: str
+        :param channel_table: the ChannelTable of the channels of the flows, needed with `flows_file`
+        :type: ChannelTable
+        :param sync_every: number of payments between two syncs of the files and checkpoints
+        :type: int
+        :param metadata: json serializable description of the run (method, payment set, ...). A run is only resumed
+            if the metadata in its manifest is the same.
+        :type: dict
+        """
+        self.results_file = results_file
+        self.flows_file = flows_file
+        self.manifest_file = results_file + ".manifest.json"
+        self.checkpoint_file = results_file + ".checkpoint.npz"
+        self.sync_every = sync_every
+        self.metadata = metadata or {}
+        self.records = 0
+        self._results = None
+        self._flows = FlowLogWriter(flows_file, channel_table) if flows_file is not None else None
+        self._buffer = []
+        self._started = None
+
+    def open(self, resume: bool = False) -> Checkpoint:
+        """
+        opens the files. Without `resume` (or without a checkpoint) the files are truncated, otherwise they are cut
+        back to the last checkpoint.
+
+        :return: the checkpoint the run continues from
+        :rtype: Checkpoint
+        :raises ValueError: if the run that is resumed was started with other metadata
+        """
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint is None:
+            checkpoint = Checkpoint()
+            self._started = time.time()
+            mode = "w"
+            if os.path.exists(self.checkpoint_file):
+                # the checkpoint of an earlier run must not be resumed with the records of this run
+                os.remove(self.checkpoint_file)
+        else:
+            mode = "r+"
+        self._results = open(self.results_file, mode)
+        self._results.truncate(checkpoint.results_size)
+        self._results.seek(checkpoint.results_size)
+        if self._flows is not None:
+            self._flows.open(checkpoint.flow_chunks)
+        self.records = checkpoint.records
+        self._write_manifest(RUNNING)
+        return checkpoint
+
+    def _load_checkpoint(self):
+        if not (os.path.exists(self.manifest_file) and os.path.exists(self.results_file)):
+            return None
+        with open(self.manifest_file) as f:
+            manifest = json.load(f)
+        if manifest["metadata"] != json.loads(json.dumps(self.metadata)):
+            raise ValueError(f"{self.results_file} belongs to a different run: {manifest['metadata']}")
+        if manifest["flows_file"] != self.flows_file:
+            raise ValueError(f"{self.results_file} was written with the flows file {manifest['flows_file']}")
+        self._started = manifest["started"]
+        if not os.path.exists(self.checkpoint_file):
+            return None
+        with np.load(self.checkpoint_file) as data:
+            return Checkpoint(int(data["records"]), int(data["results_size"]), int(data["flow_chunks"]),
+                              _state_from_arrays("oracle", data), _state_from_arrays("uncertainty", data))
+
+    def write(self, record: dict, flows: FlowRecorder = None, snapshot=None):
+        """
+        appends the record of a payment and its flows. Every `sync_every` records the files are synced and a
+        checkpoint is stored.
+
+        :param snapshot: function without arguments that returns the snapshots of the OracleLightningNetwork and the
+            UncertaintyNetwork after this payment. It is only called for a checkpoint.
+        """
+        self._buffer.append(json.dumps(record) + "\n")
+        if self._flows is not None and flows is not None:
+            self._flows.write(flows)
+        self.records += 1
+        if self.records % self.sync_every == 0:
+            self.sync(snapshot)
+
+    def sync(self, snapshot=None):
+        """
+        writes the buffered records to disk and stores a checkpoint
+        """
+        results_size = self._flush(self._results, self._buffer)
+        flow_chunks = self._flows.flush() if self._flows is not None else 0
+        arrays = {"records": np.array(self.records), "results_size": np.array(results_size),
+                  "flow_chunks": np.array(flow_chunks)}
+        if snapshot is not None:
+            oracle_state, uncertainty_state = snapshot()
+            arrays.update(_state_arrays("oracle", oracle_state))
+            arrays.update(_state_arrays("uncertainty", uncertainty_state))
+        tmp_file = self.checkpoint_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.checkpoint_file)
+        self._write_manifest(RUNNING)
+
+    @staticmethod
+    def _flush(output, buffer: list) -> int:
+        output.write("".join(buffer))
+        buffer.clear()
+        output.flush()
+        os.fsync(output.fileno())
+        return output.tell()
+
+    def _write_manifest(self, status: str):
+        manifest = {"results_file": self.results_file, "flows_file": self.flows_file, "metadata": self.metadata,
+                    "status": status, "records": self.records, "started": self._started, "updated": time.time()}
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.manifest_file)
+        _fsync_directory(self.manifest_file)
+
+    def close(self, snapshot=None, complete: bool = True):
+        """
+        syncs the files and marks the run as complete. With `complete=False` (e.g. after an error) the buffered
+        records are dropped and the run can be resumed from the last checkpoint.
+        """
+        if self._results is None:
+            return
+        if complete:
+            self.sync(snapshot)
+            self._write_manifest(COMPLETE)
+        self._results.close()
+        self._results = None
+        self._buffer.clear()
+        if self._flows is not None:
+            self._flows.clear()
+
+    def iter_records(self):
+        """
+        yields the records that are stored in the results file, e.g. those before the checkpoint of a resumed run
+        """
+        with open(self.results_file) as f:
+            for line in f:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+
+
+def read_manifest(results_file: str) -> dict:
+    """
+    returns the manifest of the run that wrote `results_file`
+    """
+    with open(results_file + ".manifest.json") as f:
+        return json.load(f)
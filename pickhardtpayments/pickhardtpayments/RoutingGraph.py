@@ -0,0 +1,149 @@
+import math
+from heapq import heappush, heappop
+from itertools import count
+
+import numpy as np
+
+
+class RoutingGraph:
+    """
+    The RoutingGraph is a compiled view of a ChannelGraph that is used for 'classic' single path routing with
+    Dijkstra.
+
+    The channels of the network are compiled into CSR arrays: the outgoing channels of the node with routing id `v`
+    are the entries `indptr[v]` to `indptr[v+1]` of `heads` (routing id of the destination) and `channel_ids` (row of
+    the channel in the `ChannelTable`). Parallel channels are stored next to each other. The arrays are only compiled
+    again if the topology of the network changed. All amount dependent weights are computed lazily while Dijkstra
+    explores the graph, so that no graph has to be copied per payment.
+
+    Dijkstra returns the path as a list of channel ids. The search visits the nodes and breaks ties exactly like
+    `nx.dijkstra_path` on a graph that contains the usable channels, so results do not change.
+    """
+
+    CRITERIA = ("fee", "probability", "mixed")
+
+    def __init__(self, channel_graph):
+        self._channel_graph = channel_graph
+        self._version = None
+
+    def _compile(self):
+        network = self._channel_graph.network
+        version = (id(network), network.version)
+        if self._version == version:
+            return
+        table = self._channel_graph.table
+        node_index = self._channel_graph.node_index()
+        self._nodes = node_index.nodes
+        self._routing_id = node_index.ids
+        table_to_routing_id = node_index.table_ids
+
+        # network.edges is grouped by source node and destination node
+        channel_ids = self._channel_graph.channel_indices()
+        tails = table_to_routing_id[table.src[channel_ids]]
+        order = np.argsort(tails, kind="stable")
+        channel_ids, tails = channel_ids[order], tails[order]
+
+        self.indptr = np.searchsorted(tails, np.arange(len(self._nodes) + 1))
+        self.heads = table_to_routing_id[table.dest[channel_ids]]
+        self.channel_ids = channel_ids
+        self._indptr = self.indptr.tolist()
+        self._heads = self.heads.tolist()
+        self._channel_ids = channel_ids.tolist()
+        self._capacity = table.capacity[channel_ids].tolist()
+        self._ppm = table.ppm[channel_ids].tolist()
+        self._channels = {channel.index: channel for _, _, channel in network.edges(data="channel")}
+        self._version = version
+
+    def routing_ids(self) -> dict:
+        """
+        returns the routing id of every node of the network, i.e. its position in `indptr` and in the `NodeIndex` of
+        the network
+        """
+        self._compile()
+        return self._routing_id
+
+    def channel(self, channel_id: int):
+        """
+        returns the channel of the network for a channel id (row of the `ChannelTable`)
+        """
+        self._compile()
+        return self._channels[channel_id]
+
+    def _usable(self, k: int, amt: int, allowed: list) -> bool:
+        if allowed is not None and not allowed[k]:
+            return False
+        return amt is None or self._capacity[k] > amt
+
+    def _weight(self, k: int, criteria: str, amt: int) -> float:
+        if criteria == "fee":
+            return self._ppm[k]
+        w = -math.log(1 - amt / self._capacity[k])
+        if criteria == "mixed":
+            w = w * self._ppm[k]
+        return w
+
+    def dijkstra(self, source: str, target: str, criteria: str = "fee", amt: int = None,
+                 mask: np.ndarray = None):
+        """
+        computes the cheapest path from `source` to `target`. Between two nodes the cheapest channel determines the
+        weight of the edge, the path uses the first usable channel.
+
+        :param criteria: 'fee' (ppm), 'probability' (-log(1 - amt/capacity)) or 'mixed' (product of both)
+        :type: str
+        :param amt: amount in satoshi to be sent. Only channels with a capacity larger than `amt` are used.
+        :type: int
+        :param mask: boolean array over the rows of the `ChannelTable`. Only channels that are True are used.
+        :type: np.ndarray
+        :return: the channel ids of the path or None if there is no path
+        :rtype: list[int]
+        """
+        if criteria not in self.CRITERIA:
+            raise ValueError(f"unknown criteria {criteria}, expected one of {self.CRITERIA}")
+        if amt is None and criteria != "fee":
+            raise ValueError(f"criteria {criteria} needs an amount")
+        self._compile()
+        if source not in self._routing_id or target not in self._routing_id:
+            return None
+        allowed = None if mask is None else mask[self.channel_ids].tolist()
+        indptr, heads = self._indptr, self._heads
+        s, t = self._routing_id[source], self._routing_id[target]
+
+        dist = {}
+        seen = {s: 0}
+        pred = {s: None}
+        c = count()
+        fringe = [(0, next(c), s)]
+        while fringe:
+            d, _, v = heappop(fringe)
+            if v in dist:
+                continue
+            dist[v] = d
+            if v == t:
+                break
+            k, end = indptr[v], indptr[v + 1]
+            while k < end:
+                u, first = heads[k], k
+                cost = None
+                while k < end and heads[k] == u:
+                    if self._usable(k, amt, allowed):
+                        w = self._weight(k, criteria, amt)
+                        if cost is None or w < cost:
+                            cost = w
+                    k += 1
+                if cost is None or u in dist:
+                    continue
+                vu_dist = d + cost
+                if u not in seen or vu_dist < seen[u]:
+                    seen[u] = vu_dist
+                    heappush(fringe, (vu_dist, next(c), u))
+                    pred[u] = (v, first, k)
+
+        if t not in dist:
+            return None
+        path = []
+        v = t
+        while pred[v] is not None:
+            v, first, end = pred[v]
+            path.append(next(self._channel_ids[k] for k in range(first, end) if self._usable(k, amt, allowed)))
+        path.reverse()
+        return path
@@ -0,0 +1,274 @@
+"""
+Simulation.py
+====================================
+Runs several delivery methods side by side on one ChannelGraph and aggregates their statistics.
+"""
+import copy
+import hashlib
+import json
+import logging
+
+from .CandidateRegion import CandidateRegion
+from .ChannelGraph import ChannelGraph
+from .LiquidityPriors import LiquidityPrior, prior_from_config, DEFAULT_LIQUIDITY_SEED
+from .OracleLightningNetwork import OracleLightningNetwork
+from .PaymentSetRunner import PaymentSetRunner, DeliveryMethod, DELIVERY_METHODS, INDEPENDENT, SEQUENTIAL
+from .ResultWriter import ResultWriter, DEFAULT_SYNC_EVERY
+from .UncertaintyNetwork import UncertaintyNetwork
+
+
+def methods_from_config(entries: list) -> list:
+    """
+    returns the DeliveryMethods for the entries of the `methods` list of a simulation config.
+
+    An entry is either the name of one of the DELIVERY_METHODS, a dictionary with the key `method` that names one of
+    the DELIVERY_METHODS and overwrites some of its attributes (e.g. `{"method": "pickhardtpay_prob", "mu": 100}` or
+    `{"method": "pickhardtpay_prob", "decomposition": "widest"}`) or a dictionary with the arguments of a new
+    DeliveryMethod.
+    """
+    methods = []
+    for entry in entries:
+        if isinstance(entry, str):
+            methods.append(DELIVERY_METHODS[entry])
+        elif "method" in entry:
+            entry = dict(entry)
+            method = copy.copy(DELIVERY_METHODS[entry.pop("method")])
+            if "name" not in entry:
+                name = method.name
+                if "mu" in entry and entry["mu"] != method.mu:
+                    name += f"_mu{entry['mu']}"
+                if "decomposition" in entry and entry["decomposition"] != method.decomposition:
+                    name += f"_{entry['decomposition']}"
+                if name != method.name:
+                    entry["name"] = name
+            for attribute, value in entry.items():
+                setattr(method, attribute, value)
+            methods.append(method)
+        else:
+            methods.append(DeliveryMethod(**entry))
+    return methods
+
+
+class PaymentStatistics:
+    """
+    Aggregates the records of the payments of one delivery method
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.payments = 0
+        self.successful = 0
+        self.failed = 0
+        self.total_amount = 0
+        self.sent_amount = 0
+        self.failed_amount = 0
+        self.fees = 0
+
+    def add(self, record: dict):
+        self.payments += 1
+        self.total_amount += record["amount"]
+        self.fees += record["fees"]
+        if record["success"] == "success":
+            self.successful += 1
+            self.sent_amount += record["amount"]
+        else:
+            self.failed += 1
+            self.failed_amount += record["residual_amount"]
+
+    @property
+    def ppm(self) -> float:
+        """
+        fees in ppm of the amount of all successful payments
+        """
+        return self.fees * 1000 / self.sent_amount if self.sent_amount else 0.
+
+    def as_dict(self) -> dict:
+        return {"method": self.name, "payments": self.payments, "successful": self.successful, "failed": self.failed,
+                "total_amount": self.total_amount, "sent_amount": self.sent_amount,
+                "failed_amount": self.failed_amount, "fees": self.fees, "ppm": self.ppm}
+
+    def log_summary(self):
+        logging.error(f"=== {self.payments} payments. {self.successful} successful, {self.failed} failed. ===")
+        if self.sent_amount:
+            logging.error(f"=== fee paid for {self.successful} successful payments: {self.fees:,.0f} sats; "
+                          f"ppm =  {self.ppm :,.0f}===")
+        logging.error("=== of {:,} total sats, {:,} sats successful, {:,} sats failed. ===".format(
+            self.total_amount, self.sent_amount, self.failed_amount))
+
+
+class Simulation:
+    """
+    Runs delivery methods side by side on one ChannelGraph.
+
+    The OracleLightningNetwork and the UncertaintyNetwork are built only once. Before every delivery method both
+    networks are restored to a snapshot of their initial state: the liquidity of the oracle is restored and the
+    UncertaintyNetwork forgets all information. The topology and the public information of the channels are shared
+    by all methods.
+    """
+
+    def __init__(self, channel_graph: ChannelGraph, removed_nodes=(), mode: str = SEQUENTIAL, max_workers: int = 1,
+                 prune_network: bool = False, loglevel: str = "error", batch_size: int = None,
+                 liquidity_prior: LiquidityPrior = None, liquidity_seed: int = DEFAULT_LIQUIDITY_SEED,
+                 candidate_region: CandidateRegion = None, sync_every: int = DEFAULT_SYNC_EVERY):
+        """
+        :param removed_nodes: node ids that are removed from both networks, e.g. the most central nodes
+        :param mode: INDEPENDENT or SEQUENTIAL, see PaymentSetRunner
+        :type: str
+        :param liquidity_prior: distribution of the liquidity of the OracleLightningNetwork, see LiquidityPriors
+        :type: LiquidityPrior
+        :param candidate_region: solves the min cost flow problems on the region around sender and receiver first
+        :type: CandidateRegion
+        :param sync_every: number of payments between two checkpoints of the results files, see ResultWriter
+        :type: int
+        """
+        self._uncertainty_network = UncertaintyNetwork(channel_graph)
+        self._uncertainty_network.candidate_region = candidate_region
+        self._oracle_network = OracleLightningNetwork(channel_graph, liquidity_prior, liquidity_seed)
+        for node in removed_nodes:
+            self._oracle_network.network.remove_node(node)
+            self._uncertainty_network.network.remove_node(node)
+        logging.warning("deleting {} nodes done".format(len(removed_nodes)))
+
+        self._initial_oracle_state = self._oracle_network.snapshot()
+        self._initial_uncertainty_state = self._uncertainty_network.snapshot()
+        self._mode = mode
+        self._max_workers = max_workers
+        self._prune_network = prune_network
+        self._loglevel = loglevel
+        self._batch_size = batch_size
+        self._sync_every = sync_every
+        # describes the oracle in the manifests of the results files
+        self._liquidity = {"liquidity_prior": liquidity_prior.name if liquidity_prior is not None else "uniform",
+                           "liquidity_seed": liquidity_seed, "removed_nodes": list(removed_nodes)}
+        self.statistics = {}
+
+    @classmethod
+    def from_config(cls, channel_graph: ChannelGraph, config: dict, removed_nodes=()):
+        """
+        creates a Simulation with the keys `mode`, `max_workers`, `prune_network`, `loglevel`, `batch_size`,
+        `liquidity_prior` (see `prior_from_config`), `liquidity_seed`, `candidate_region` (see
+        `CandidateRegion.from_config`) and `sync_every` of `config`
+        """
+        keys = ("mode", "max_workers", "prune_network", "loglevel", "batch_size", "liquidity_seed", "sync_every")
+        arguments = {key: config[key] for key in keys if key in config}
+        if config.get("liquidity_prior") is not None:
+            arguments["liquidity_prior"] = prior_from_config(config["liquidity_prior"])
+        if config.get("candidate_region"):
+            arguments["candidate_region"] = CandidateRegion.from_config(config["candidate_region"])
+        return cls(channel_graph, removed_nodes, **arguments)
+
+    @property
+    def oracle_network(self) -> OracleLightningNetwork:
+        return self._oracle_network
+
+    @property
+    def uncertainty_network(self) -> UncertaintyNetwork:
+        return self._uncertainty_network
+
+    def reset(self):
+        """
+        sets both networks back to their initial state. Only the channels that the previous method changed are
+        written.
+        """
+        self._oracle_network.restore(self._initial_oracle_state)
+        self._uncertainty_network.restore(self._initial_uncertainty_state)
+
+    def _metadata(self, payments: list, method: DeliveryMethod, mode: str) -> dict:
+        """
+        returns the description of a run of `method` in `mode` that is stored in the manifest of its results file
+        """
+        payment_set = hashlib.sha256(json.dumps(payments, sort_keys=True).encode()).hexdigest()
+        return dict(self._liquidity, method=method.name, delivery_method=method.delivery_method,
+                    criteria=method.criteria, mu=method.mu, retain_knowledge=method.retain_knowledge,
+                    decomposition=method.decomposition, mode=mode, payments=len(payments),
+                    payment_set=payment_set)
+
+    def _snapshot(self) -> tuple:
+        return self._oracle_network.snapshot(), self._uncertainty_network.snapshot()
+
+    def run_method(self, payments: list, method: DeliveryMethod, results_file: str = None, flows_file: str = None,
+                   resume: bool = False, mode: str = None) -> PaymentStatistics:
+        """
+        delivers all payments with `method`, starting from the initial state of the networks. The records are
+        streamed to an NDJSON file (and the flows to a flow log if `flows_file` is given) while the payments are
+        made, see ResultWriter.
+
+        :param resume: continue a crashed run of the same method and payments after its last checkpoint in
+            `results_file`
+        :type: bool
+        :param mode: INDEPENDENT or SEQUENTIAL for this method instead of the mode of the simulation, e.g. SEQUENTIAL
+            for a method that retains knowledge
+        :type: str
+        """
+        mode = mode if mode is not None else self._mode
+        logging.error("===== {} =====".format(method.name))
+        self.reset()
+        region = self._uncertainty_network.candidate_region
+        if region is not None:
+            region.reset_statistics()
+        runner = PaymentSetRunner(self._oracle_network, self._uncertainty_network, method, mode=mode,
+                                  max_workers=self._max_workers, prune_network=self._prune_network,
+                                  loglevel=self._loglevel, batch_size=self._batch_size)
+        statistics = PaymentStatistics(method.name)
+        # in SEQUENTIAL mode a payment depends on the state the earlier payments left behind
+        snapshot = self._snapshot if mode == SEQUENTIAL else None
+        writer = None
+        start = 0
+        if results_file is not None:
+            writer = ResultWriter(results_file, flows_file, self._uncertainty_network.table, self._sync_every,
+                                  self._metadata(payments, method, mode))
+            checkpoint = writer.open(resume)
+            start = checkpoint.records
+            for record in writer.iter_records():
+                statistics.add(record)
+            if checkpoint.oracle_state is not None:
+                self._oracle_network.restore(checkpoint.oracle_state)
+                self._uncertainty_network.restore(checkpoint.uncertainty_state)
+            if start:
+                logging.error("resuming after {} of {} payments".format(start, len(payments)))
+
+        try:
+            for c, (record, flows) in enumerate(runner.iter_results(payments[start:], start), start + 1):
+                statistics.add(record)
+                if writer is not None:
+                    writer.write(record, flows, snapshot)
+                logging.warning("{:4d}: {}: residual amount: {:,}, original amount {:,}".format(
+                    c, record["success"], record["residual_amount"], record["amount"]))
+        except BaseException:
+            if writer is not None:
+                # the records after the last checkpoint are made again when the run is resumed
+                writer.close(complete=False)
+            raise
+        if writer is not None:
+            writer.close(snapshot)
+
+        statistics.log_summary()
+        if region is not None and region.number_of_solves:
+            logging.error("candidate regions: {}".format(region.summary()))
+        self.statistics[method.name] = statistics
+        return statistics
+
+    def run(self, payments: list, methods: list, results_prefix: str = None, write_flows: bool = False,
+            resume: bool = False) -> dict:
+        """
+        delivers all payments with every method. The records of a method are written to
+        `<results_prefix>_<method name>.ndjson` and with `write_flows` its flows to the flow log
+        `<results_prefix>_<method name>_flow/` (see FlowLog).
+
+        :param resume: continue the runs of the methods after their last checkpoints, see `run_method`
+        :type: bool
+        :return: the statistics of every method by name
+        :rtype: dict
+        :raises ValueError: in INDEPENDENT mode if a method retains knowledge, before any payment is made
+        """
+        for method in methods:
+            if self._mode == INDEPENDENT and method.retain_knowledge:
+                raise ValueError(f"{method} retains knowledge between payments and needs mode {SEQUENTIAL}")
+        for method in methods:
+            results_file = flows_file = None
+            if results_prefix is not None:
+                results_file = f"{results_prefix}_{method.name}.ndjson"
+                if write_flows:
+                    flows_file = f"{results_prefix}_{method.name}_flow"
+            self.run_method(payments, method, results_file, flows_file, resume)
+        return {method.name: self.statistics[method.name] for method in methods}
@@ -4,27 +4,19 @@ SyncSimulatedPaymentSession.py
 The core module of the pickhardt payment project.
 An example payment is executed and statistics are run.
 """
-import math
+import numpy as np
 
-import networkx as nx
+from .FlowDecomposition import SHORTEST
+from .FlowLog import FlowRecorder, attempt_flow_lists
 from .Payment import Payment, MCFSolverError, DijkstraSolverError
 from .UncertaintyNetwork import UncertaintyNetwork
 from .OracleLightningNetwork import OracleLightningNetwork
+from .Tracing import TRACER
 
 import logging
-import sys
 
+# the handlers of the root logger are configured by the scripts, see LoggingSetup.configure_logging
 session_logger = logging.getLogger()
-session_logger.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s.%(msecs)03d | %(levelname)s | %(message)s', datefmt='%H:%M:%S')
-stdout_handler = logging.StreamHandler(sys.stdout)
-stdout_handler.setLevel(logging.INFO)
-stdout_handler.setFormatter(formatter)
-file_handler = logging.FileHandler('pickhardt_pay.log', mode='w')
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(formatter)
-session_logger.addHandler(file_handler)
-session_logger.addHandler(stdout_handler)
 
 DEFAULT_BASE_THRESHOLD = 0
 
@@ -72,7 +64,7 @@ class SyncSimulatedPaymentSession:
             n, self._oracle_network)
 
     def pickhardt_pay(self, payment_run, flow_list, src, dest, amt=1, mu=0, base=DEFAULT_BASE_THRESHOLD,
-                      loglevel="error"):
+                      loglevel="error", decomposition=SHORTEST):
         """
         Conducts one payment with the pickhardt payment methodology.
 
@@ -96,6 +88,9 @@ class SyncSimulatedPaymentSession:
         UncertaintyNetwork.
 
         amt=1, mu=1, base=DEFAULT_BASE_THRESHOLD, loglevel="info"
+        :param flow_list: receives every hop of the attempts, either a `FlowRecorder` or a list of hops in the list
+        format of `attempt_flow_lists`
+        :type: FlowRecorder
         :param src: node id of the sending node
         :type: str
         :param dest: node id of the receiving node
@@ -108,6 +103,8 @@ class SyncSimulatedPaymentSession:
         :type: int
         :param loglevel: determines verbosity,
         :type: str
+        :param decomposition: strategy that dissects the flows into paths, see `FlowDecomposition`
+        :type: str
 
         """
         # session_logger.info('*** new pickhardt payment ***')
@@ -118,8 +115,11 @@ class SyncSimulatedPaymentSession:
             raise ValueError('Invalid log level: %s' % loglevel)
         session_logger.setLevel(numeric_level)
 
+        if TRACER.enabled:
+            TRACER.event("payment", run=payment_run, sender=src, receiver=dest, amount=amt, mu=mu)
+
         # Initialise Payment
-        payment = Payment(self.uncertainty_network, self.oracle_network, src, dest, amt, mu, base)
+        payment = Payment(self.uncertainty_network, self.oracle_network, src, dest, amt, mu, base, decomposition)
 
         # This is the main payment loop. It is currently blocking and synchronous but may be
         # implemented in a concurrent way. Also, we stop after 10 rounds which is pretty arbitrary
@@ -128,7 +128,7 @@ class SyncSimulatedPaymentSession:
         while payment.residual_amount > 0 and payment.pickhardt_payment_rounds < 1 and not probability_too_low:
             payment.increment_pickhardt_payment_rounds()
             sub_payment = Payment(self.uncertainty_network, self.oracle_network, payment.sender, payment.receiver,
-                                  payment.residual_amount, mu, base)
+                                  payment.residual_amount, mu, base, decomposition)
 
             # transfer to a min cost flow problem and run the solver. Attempts for payment are generated.
             try:
@@ -159,6 +159,8 @@ class SyncSimulatedPaymentSession:
             #        logging.debug("- " + channel.src[0:4] + " to " + channel.dest[0:4] + ", " + str(attempt.amount))
             payment.execute()
             logging.debug("Payment successful.")
+            if TRACER.enabled:
+                TRACER.event("payment_settled", run=payment_run, attempts=len(payment.attempts))
         else:
             session_logger.info("Payment failed!")
             session_logger.info("residual amount: {:>10,} sats".format(payment.residual_amount))
@@ -174,11 +176,10 @@ class SyncSimulatedPaymentSession:
         #payment.get_summary()
 
         # changed for simulation
-        for c, attempt in enumerate(payment.attempts):
-            for channel in attempt.path:
-                flow_list.append(
-                    [channel.src, channel.dest, channel.short_channel_id, payment_run, c + 1, attempt.amount,
-                     "1", attempt.status.name])
+        if isinstance(flow_list, FlowRecorder):
+            flow_list.add_attempts(payment_run, payment.attempts)
+        else:
+            flow_list.extend(attempt_flow_lists(payment_run, payment.attempts))
 
         if payment.residual_amount:
             return payment.residual_amount, 0
@@ -212,43 +213,47 @@ class SyncSimulatedPaymentSession:
             raise ValueError('Invalid log level: %s' % loglevel)
         session_logger.setLevel(numeric_level)
 
+        if TRACER.enabled:
+            TRACER.event("payment", sender=src, receiver=dest, amount=amt, criteria=criteria)
+
         # Initialise Payment
         payment = Payment(self.uncertainty_network, self.oracle_network, src, dest, amt, 1, base)
         fee = 0
         _round = 0
         success = False
 
-        G = nx.MultiDiGraph()
-        for edge in self.uncertainty_network.network.edges(data="channel", keys=True):
-            if edge[3].capacity > amt:
-                prob = -math.log(1 - amt / edge[3].capacity)
-                G.add_edge(edge[0], edge[1], fee=edge[3].ppm, probability=prob, capacity=edge[3].capacity,
-                           mixed=prob*edge[3].ppm,
-                           short_id=edge[2])
+        # the routing graph is cached by the UncertaintyNetwork. Failing channels are only removed for this payment
+        routing_graph = self.uncertainty_network.routing_graph
+        mask = None
 
         while payment.residual_amount > 0 and _round < 1 and not success:
             _round += 1
             logging.debug(f"round: {_round}")
             try:
-                path = payment.get_dijkstra_path(G, criteria)  # payment now has the Attempt
+                path = payment.get_dijkstra_path(routing_graph, criteria, mask)
+                # payment now has the Attempt
             except DijkstraSolverError as err:
                 logging.warning(err)
                 logging.warning("Payment failed. No path found.")
                 return -1, 0
             else:
                 attempt = payment.attempts[len(payment.attempts) - 1]
-                logging.debug("attempt: {}".format(attempt))
+                logging.debug("attempt: %s", attempt)
                 success = True
                 for channel in attempt.path:
                     ch = self.oracle_network.get_channel(channel.src, channel.dest, channel.short_channel_id)
                     liqui = ch.actual_liquidity
                     if attempt.amount >= liqui:
                         success = False
-                        logging.debug(f"Failing channel: {ch}")
-                        G.remove_edge(channel.src, channel.dest)
-
-                    logging.debug("- channel {}-{} with capacity {:,.0f}, liquidity {:,.0f} and fees {:,.0f}"
-                                  .format(channel.src[0:4], channel.dest[0:4], channel.capacity, liqui, channel.ppm))
+                        logging.debug("Failing channel: %s", ch)
+                        if mask is None:
+                            mask = np.ones(len(self.uncertainty_network.table), dtype=bool)
+                        mask[channel.index] = False
+
+                    if session_logger.isEnabledFor(logging.DEBUG):
+                        logging.debug("- channel {}-{} with capacity {:,.0f}, liquidity {:,.0f} and fees {:,.0f}"
+                                      .format(channel.src[0:4], channel.dest[0:4], channel.capacity, liqui,
+                                              channel.ppm))
                 payment.attempt_payments()
 
         if payment.residual_amount:
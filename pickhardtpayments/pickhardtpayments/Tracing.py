@@ -0,0 +1,169 @@
+"""
+Tracing.py
+====================================
+Structured trace of the payment loop for debugging.
+
+The payment loop reports what it does as events: the attempts of every round with their channels, the result of
+every probe and the belief about the channels before and after settlement. An event only holds the rows of the
+channels in the `ChannelTable` and numbers, it is written as one line of NDJSON. Call sites check `TRACER.enabled`
+before they build an event, so a disabled tracer costs one attribute look-up.
+
+    start_tracing("trace.ndjson")
+    ... run payments ...
+    stop_tracing()
+    replay("trace.ndjson", channel_graph)
+
+Every process writes its own file: a worker process that inherited an enabled tracer appends its pid to the file
+name.
+"""
+import atexit
+import json
+import os
+import sys
+
+# number of events that are buffered before they are written
+BUFFER_SIZE = 1024
+
+
+class Tracer:
+    """
+    Writes trace events to an NDJSON file. Use the module level `TRACER`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._file = None
+        self._output = None
+        self._pid = None
+        self._buffer = []
+
+    def start(self, file: str):
+        """
+        starts to write the events to `file`, which is overwritten
+        """
+        self.stop()
+        self._file = file
+        self._pid = os.getpid()
+        self._output = open(file, "w")
+        self.enabled = True
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+        writes the buffered events and closes the trace file
+        """
+        atexit.unregister(self.stop)
+        if self._output is not None:
+            if self._pid == os.getpid():
+                self.flush()
+                self._output.close()
+        self._output = None
+        self._buffer = []
+        self.enabled = False
+
+    def flush(self):
+        if self._buffer:
+            self._output.write("".join(self._buffer))
+            self._output.flush()
+            self._buffer = []
+
+    def event(self, kind: str, **fields):
+        """
+        records an event of type `kind`. Only call this if `enabled` is set.
+        """
+        if self._pid != os.getpid():
+            # forked worker process: continue in a file of its own
+            self._pid = os.getpid()
+            self._buffer = []
+            self._output = open(f"{self._file}.{self._pid}", "w")
+            # worker processes do not run atexit handlers
+            import multiprocessing.util
+            multiprocessing.util.Finalize(None, self.stop, exitpriority=10)
+        fields["event"] = kind
+        self._buffer.append(json.dumps(fields, separators=(",", ":")) + "\n")
+        if len(self._buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def channels(self, kind: str, uncertainty_network, channels: list, oracle_network=None, **fields):
+        """
+        records the belief (`min_liquidity`, `max_liquidity`, `in_flight`) about `channels` and their return channels
+        and, if `oracle_network` is given, their actual liquidity. Only call this if `enabled` is set.
+        """
+        table = uncertainty_network.table
+        rows = [channel.index for channel in channels]
+        reverse = table.reverse[rows].tolist()
+        fields["rows"] = rows
+        fields["reverse"] = reverse
+        for column in ("min_liquidity", "max_liquidity", "in_flight"):
+            values = getattr(table, column)
+            fields[column] = values[rows].tolist()
+            fields["reverse_" + column] = [values.item(row) if row >= 0 else None for row in reverse]
+        if oracle_network is not None:
+            liquidity = oracle_network.table.actual_liquidity
+            fields["liquidity"] = liquidity[rows].tolist()
+            fields["reverse_liquidity"] = [liquidity.item(row) if row >= 0 else None for row in reverse]
+        self.event(kind, **fields)
+
+
+TRACER = Tracer()
+
+
+def start_tracing(file: str):
+    TRACER.start(file)
+
+
+def stop_tracing():
+    TRACER.stop()
+
+
+def iter_trace(file: str):
+    """
+    yields the events of a trace file
+    """
+    with open(file) as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def format_event(event: dict, channel_graph=None) -> list:
+    """
+    returns the lines of text that describe `event`. With `channel_graph` the rows of the channels are replaced by
+    the first characters of the node ids of the channel.
+    """
+    def name(row):
+        if row is None or row < 0:
+            return "-"
+        if channel_graph is None:
+            return f"#{row}"
+        table = channel_graph.table
+        return "{}-{}".format(table.nodes[table.src[row]][:4], table.nodes[table.dest[row]][:4])
+
+    fields = {key: value for key, value in event.items() if key != "event" and not isinstance(value, list)}
+    if "erring_channel" in fields:
+        fields["erring_channel"] = name(fields["erring_channel"])
+    lines = ["{}: {}".format(event["event"], ", ".join(f"{key}={value}" for key, value in fields.items()))]
+    if "rows" not in event:
+        return lines
+
+    for k, row in enumerate(event["rows"]):
+        for prefix, channel in (("", row), ("reverse_", event["reverse"][k])):
+            if channel is None or channel < 0:
+                continue
+            minimum, maximum = event[prefix + "min_liquidity"][k], event[prefix + "max_liquidity"][k]
+            in_flight = event[prefix + "in_flight"][k]
+            line = "  {:>9} {:<9}\tEst: [{:>10,} ; {:>11,}]\ti_f {:>10,};\tcond_cap: {:>10,}".format(
+                "return" if prefix else "", name(channel), minimum, maximum, in_flight,
+                max(maximum - max(minimum, in_flight), 0))
+            if prefix + "liquidity" in event:
+                line += "\tliqui {:>11,}".format(event[prefix + "liquidity"][k])
+            lines.append(line)
+    return lines
+
+
+def replay(file: str, channel_graph=None, output=sys.stdout):
+    """
+    writes the events of the trace `file` as text to `output`
+    """
+    for event in iter_trace(file):
+        for line in format_event(event, channel_graph):
+            output.write(line + "\n")
@@ -24,7 +24,8 @@ class UncertaintyChannel(Channel):
     This is done by reducing the uncertainty interval from [0,`capacity`] to 
     [`min_liquidity`, `max_liquidity`].
     Additionally, we need to know how many sats we currently have allocated via outstanding onions
-    to the channel which is stored in `in_flight`.
+    to the channel which is stored in `in_flight`. The belief is stored in the columns of the UncertaintyNetwork's
+    `ChannelTable`.
 
     The most important API call is the `get_piecewise_linearized_costs` function that computes the
     piecewise linearized cost for a channel rising from uncertainty as well as routing fees.
@@ -33,12 +34,11 @@ class UncertaintyChannel(Channel):
     TOTAL_NUMBER_OF_SATS = 21_000_000 * 100_000_000
     MAX_CHANNEL_SIZE = 15_000_000_000  # 150 BTC
 
-    def __init__(self, channel: Channel):
-        super().__init__(channel.cln_jsn)
-        self._short_channel_id = channel.short_channel_id
-        self._in_flight = None
-        self._min_liquidity = None
-        self._max_liquidity = None
+    __slots__ = ("_network",)
+
+    def __init__(self, uncertainty_network, index: int):
+        super().__init__(uncertainty_network.table, index)
+        self._network = uncertainty_network
         self.forget_information()
 
     def __str__(self):
@@ -47,25 +47,27 @@ class UncertaintyChannel(Channel):
             self.entropy(),
             self.min_liquidity,
             self.max_liquidity,
-            self._in_flight)
+            self.in_flight)
 
     @property
     def max_liquidity(self):
-        return self._max_liquidity
+        return self._table.max_liquidity.item(self._index)
 
     # FIXME: store timestamps when using setters so that we know when we learnt our belief
     @max_liquidity.setter
     def max_liquidity(self, value: int):
-        self._max_liquidity = value
+        self._table.max_liquidity[self._index] = value
+        self._network.channel_changed(self._index)
 
     @property
     def min_liquidity(self):
-        return self._min_liquidity
+        return self._table.min_liquidity.item(self._index)
 
     # FIXME: store timestamps when using setters so that we know when we learnt our belief
     @min_liquidity.setter
     def min_liquidity(self, value: int):
-        self._min_liquidity = value
+        self._table.min_liquidity[self._index] = value
+        self._network.channel_changed(self._index)
 
     @property
     def in_flight(self):
@@ -75,12 +77,13 @@ class UncertaintyChannel(Channel):
 
         :return: in_flight amount on the UncertaintyChannel
         """
-        return self._in_flight
+        return self._table.in_flight.item(self._index)
 
     # FIXME: store timestamps when using setters so that we know when we learnt our belief
     @in_flight.setter
     def in_flight(self, value: int):
-        self._in_flight = value
+        self._table.in_flight[self._index] = value
+        self._network.channel_changed(self._index)
 
     @property
     def conditional_capacity(self, respect_inflight=True):
@@ -105,7 +108,7 @@ class UncertaintyChannel(Channel):
         self.in_flight += amt
         if self.in_flight < 0:
             raise Exception(
-                "Can't remove in flight HTLC of amt {} current inflight: {}".format(-amt, self._in_flight - amt))
+                "Can't remove in flight HTLC of amt {} current inflight: {}".format(-amt, self.in_flight - amt))
 
     # FIXME: store timestamps when using setters so that we know when we learnt our belief
     def forget_information(self):
@@ -115,7 +118,7 @@ class UncertaintyChannel(Channel):
         self.min_liquidity = 0
         self.max_liquidity = self.capacity
         # FIXME: Is there a case where we want to keep inflight information but reset information?
-        self._in_flight = 0
+        self.in_flight = 0
 
     def entropy(self):
         """
@@ -1,11 +1,16 @@
 import logging
 
+import numpy as np
+from math import isclose, log2 as log
+
 from .Attempt import Attempt
-from .ChannelGraph import ChannelGraph
-from .UncertaintyChannel import UncertaintyChannel
+from .ChannelGraph import ChannelGraph, new_network
+from .ChannelTable import StateSnapshot
+from .UncertaintyChannel import UncertaintyChannel, DEFAULT_MU, DEFAULT_N
 from .OracleLightningNetwork import OracleLightningNetwork
-
-import networkx as nx
+from .CandidateRegion import CandidateRegion
+from .MinCostFlowModel import MinCostFlowModel
+from .RoutingGraph import RoutingGraph
 
 DEFAULT_BASE_THRESHOLD = 0
 
@@ -22,12 +27,27 @@ class UncertaintyNetwork(ChannelGraph):
     Paths cannot be probed against the UncertaintyNetwork as it lacks an Oracle
     """
 
+    # the columns of the ChannelTable that hold our belief about the channels
+    STATE_COLUMNS = ("min_liquidity", "max_liquidity", "in_flight")
+
     def __init__(self, channel_graph: ChannelGraph, base_threshold: int = DEFAULT_BASE_THRESHOLD,
-                 prune_network: bool = True):
-        self._channel_graph = nx.MultiDiGraph()
+                 prune_network: bool = True, verify_entropy: bool = False):
+        self._channel_graph = new_network()
+        self._table = channel_graph.table.fork()
+        self._dirty_channels = set()
+        self._touched_channels = set()
+        self._mcf_model = None
+        self._routing_graph = None
+
+        # the entropy of the network is tracked by the change of the entropy of every channel
+        self._channel_entropy = np.zeros(len(self._table))
+        self._in_entropy = np.zeros(len(self._table), dtype=bool)
+        self._entropy = 0.
+        self._entropy_version = None
+        self._verify_entropy = verify_entropy
 
         for src, dest, keys, channel in channel_graph.network.edges(data="channel", keys=True):
-            uncertainty_channel = UncertaintyChannel(channel)
+            uncertainty_channel = UncertaintyChannel(self, channel.index)
             # Fixme base_fee correction for thesis simulation
             # if channel.base_fee <= base_threshold:
             self._channel_graph.add_edge(uncertainty_channel.src,
@@ -35,7 +55,10 @@ class UncertaintyNetwork(ChannelGraph):
                                          key=uncertainty_channel.short_channel_id,
                                          channel=uncertainty_channel)
 
+        # all channels start without any belief. From now on the journal records every channel that changes
+        self._touched_channels = set()
         self._prune = prune_network
+        self._candidate_region = None
 
     @property
     def network(self):
@@ -49,18 +72,230 @@ class UncertaintyNetwork(ChannelGraph):
     def prune(self, value: bool):
         self._prune = value
 
+    @property
+    def candidate_region(self) -> CandidateRegion:
+        return self._candidate_region
+
+    @candidate_region.setter
+    def candidate_region(self, value: CandidateRegion):
+        """
+        if set, the min cost flow problem of a payment is solved on the region around sender and receiver first
+        """
+        self._candidate_region = value
+
+    @property
+    def mcf_model(self) -> MinCostFlowModel:
+        """
+        the persistent min cost flow model of the network that is used by all payments
+        """
+        if self._mcf_model is None:
+            self._mcf_model = MinCostFlowModel(self)
+        return self._mcf_model
+
+    @property
+    def verify_entropy(self):
+        return self._verify_entropy
+
+    @verify_entropy.setter
+    def verify_entropy(self, value: bool):
+        """
+        if set, every call of `entropy` cross-checks the tracked entropy against the sum over all channels
+        """
+        self._verify_entropy = value
+
+    @property
+    def routing_graph(self) -> RoutingGraph:
+        """
+        the cached graph that is used for single path routing with Dijkstra
+        """
+        if self._routing_graph is None:
+            self._routing_graph = RoutingGraph(self)
+        return self._routing_graph
+
+    def channel_changed(self, index: int):
+        """
+        is called by the UncertaintyChannels whenever `min_liquidity`, `max_liquidity` or `in_flight` change.
+
+        It registers that the channel in row `index` of the `ChannelTable` needs new arcs in the min cost flow model,
+        records the channel in the journal of channels to reset and updates the entropy of the network by the change
+        of the entropy of the channel.
+        """
+        self._dirty_channels.add(index)
+        self._touched_channels.add(index)
+
+        table = self._table
+        min_liquidity = max(table.min_liquidity.item(index), table.in_flight.item(index))
+        entropy = log(max(table.max_liquidity.item(index) - min_liquidity, 0) + 1)
+        if self._in_entropy[index]:
+            self._entropy += entropy - self._channel_entropy.item(index)
+        self._channel_entropy[index] = entropy
+
+    def pop_dirty_channels(self) -> set:
+        """
+        returns the rows of all channels that changed since the last call and starts a new, empty dirty set
+        """
+        dirty_channels = self._dirty_channels
+        self._dirty_channels = set()
+        return dirty_channels
+
+    def conditional_capacities(self, indices: np.ndarray = None) -> np.ndarray:
+        """
+        vectorized version of `UncertaintyChannel.conditional_capacity` for the channels in the rows `indices` of the
+        `ChannelTable` (default: all channels of the network)
+        """
+        if indices is None:
+            indices = self.channel_indices()
+        min_liquidity = np.maximum(self._table.min_liquidity[indices], self._table.in_flight[indices])
+        return np.maximum(self._table.max_liquidity[indices] - min_liquidity, 0)
+
+    def success_probabilities(self, amt: int = None, indices: np.ndarray = None) -> np.ndarray:
+        """
+        vectorized version of `UncertaintyChannel.success_probability` for the channels in the rows `indices` of the
+        `ChannelTable` (default: all channels of the network)
+        """
+        if indices is None:
+            indices = self.channel_indices()
+        if amt is None:
+            amt = 0
+        min_liquidity = self._table.min_liquidity[indices]
+        max_liquidity = self._table.max_liquidity[indices]
+        tested_liquidity = amt + self._table.in_flight[indices]
+        conditional_amount = tested_liquidity - min_liquidity
+        conditional_capacity = max_liquidity - min_liquidity
+        with np.errstate(divide="ignore", invalid="ignore"):
+            probabilities = (conditional_capacity + 1 - conditional_amount) / (conditional_capacity + 1)
+        probabilities[(tested_liquidity >= max_liquidity) | (conditional_amount >= conditional_capacity)] = 0.
+        probabilities[tested_liquidity <= min_liquidity] = 1.
+        return probabilities
+
+    def get_piecewise_linearized_costs(self, number_of_pieces: int = DEFAULT_N, mu: int = DEFAULT_MU,
+                                       indices: np.ndarray = None):
+        """
+        vectorized version of `UncertaintyChannel.get_piecewise_linearized_costs` that linearizes the channels in
+        the rows `indices` of the `ChannelTable` (default: all channels of the network) in one pass.
+
+        The arcs are returned as flat arrays in the order of `indices` and for every channel in the same order as
+        the pieces of `UncertaintyChannel.get_piecewise_linearized_costs`.
+
+        :return: the row of the channel, the tail and head (as node index of the `ChannelTable`), the capacity and
+        the unit cost of every arc
+        :rtype: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        """
+        if indices is None:
+            indices = self.channel_indices()
+        indices = np.asarray(indices, dtype=np.int64)
+        min_liquidity = self._table.min_liquidity[indices]
+        in_flight = self._table.in_flight[indices]
+        routing_cost = mu * self._table.ppm[indices]
+
+        # using certainly available liquidity costs us nothing but fees
+        certain_liquidity = min_liquidity - in_flight
+        has_certain_piece = certain_liquidity > 0
+        uncertain_pieces = number_of_pieces - has_certain_piece
+
+        conditional_capacity = self.conditional_capacities(indices)
+        has_uncertain_pieces = (conditional_capacity > 0) & (uncertain_pieces > 0)
+        uncertain_pieces = np.where(has_uncertain_pieces, uncertain_pieces, 0)
+        arc_capacity = (conditional_capacity / np.maximum(uncertain_pieces, 1)).astype(np.int64)
+        uncertainty_unit_cost = (UncertaintyChannel.MAX_CHANNEL_SIZE /
+                                 np.maximum(conditional_capacity, 1)).astype(np.int64)
+
+        # expand every channel to its arcs
+        pieces = has_certain_piece + uncertain_pieces
+        positions = np.repeat(np.arange(len(indices)), pieces)
+        piece = np.arange(len(positions)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        certain = has_certain_piece[positions] & (piece == 0)
+        uncertain_piece = piece + 1 - has_certain_piece[positions]
+
+        capacities = np.where(certain, certain_liquidity[positions], arc_capacity[positions])
+        costs = np.where(certain, 0, uncertain_piece * uncertainty_unit_cost[positions]) + routing_cost[positions]
+        rows = indices[positions]
+        return rows, self._table.src[rows], self._table.dest[rows], capacities, costs
+
+    def _recompute_entropy(self) -> float:
+        """
+        sums the entropy of all channels of the network
+        """
+        indices = self.channel_indices()
+        self._channel_entropy[indices] = np.log2(self.conditional_capacities(indices) + 1)
+        return float(self._channel_entropy[indices].sum())
+
     def entropy(self):
         """
-        computes to total uncertainty in the network summing the entropy of all channels
+        returns the total uncertainty in the network which is the sum of the entropy of all channels.
+
+        The entropy is tracked whenever our belief about a channel changes so that this call takes constant time.
+        Only if the topology of the network changed, the entropy is summed over all channels again.
         """
-        return sum(channel.entropy() for src, dest, channel in self.network.edges(data="channel"))
+        version = (id(self.network), self.network.version)
+        if self._entropy_version != version:
+            self._in_entropy[:] = False
+            self._in_entropy[self.channel_indices()] = True
+            self._entropy = self._recompute_entropy()
+            self._entropy_version = version
+        elif self._verify_entropy:
+            entropy = self._recompute_entropy()
+            if not isclose(entropy, self._entropy, rel_tol=1e-9, abs_tol=1e-6):
+                raise ValueError(f"tracked entropy {self._entropy} differs from entropy {entropy} of the network")
+        return self._entropy
 
     def reset_uncertainty_network(self):
         """
         resets our belief about the liquidity & inflight information of all channels on the UncertaintyNetwork
+
+        Only the channels that changed since the last reset are touched as all other channels are still in their
+        initial state. Thus, the reset takes time proportional to the channels the previous payments modified.
         """
-        for src, dest, channel in self.network.edges(data="channel"):
-            channel.forget_information()
+        indices = np.fromiter(self._touched_channels, dtype=np.int64, count=len(self._touched_channels))
+        self._touched_channels = set()
+        self._table.min_liquidity[indices] = 0
+        self._table.max_liquidity[indices] = self._table.capacity[indices]
+        self._table.in_flight[indices] = 0
+        self._dirty_channels.update(indices.tolist())
+
+        entropy = np.log2(self._table.capacity[indices] + 1)
+        tracked = self._in_entropy[indices]
+        self._entropy += float(entropy[tracked].sum() - self._channel_entropy[indices][tracked].sum())
+        self._channel_entropy[indices] = entropy
+
+    def snapshot(self) -> StateSnapshot:
+        """
+        returns our belief about the channels that changed since the last reset. This takes time proportional to the
+        number of changed channels.
+        """
+        return StateSnapshot.capture(self._table, self.STATE_COLUMNS, self._touched_channels, self._channel_graph)
+
+    def initial_state(self, rows: np.ndarray) -> tuple:
+        """
+        returns the values of the STATE_COLUMNS in `rows` after a reset, i.e. without any information
+        """
+        table = self._table
+        return (np.zeros(len(rows), dtype=table.min_liquidity.dtype), table.capacity[rows].copy(),
+                np.zeros(len(rows), dtype=table.in_flight.dtype))
+
+    def restore(self, snapshot: StateSnapshot):
+        """
+        sets our belief about all channels back to `snapshot`. Only the channels that changed since the last reset and
+        the channels of the snapshot are written.
+        """
+        snapshot.check_topology(self._channel_graph)
+        self._write_snapshot(snapshot)
+
+    def _write_snapshot(self, snapshot: StateSnapshot):
+        self.reset_uncertainty_network()
+        snapshot.write(self._table, self.STATE_COLUMNS)
+        for index in snapshot.rows.tolist():
+            self.channel_changed(index)
+
+    def fork(self):
+        """
+        returns a new UncertaintyNetwork with the same channels and the same belief about them. The fork has its own
+        state columns and its own topology, the public columns of the ChannelTable are shared.
+        """
+        forked = UncertaintyNetwork(self, prune_network=self._prune, verify_entropy=self._verify_entropy)
+        forked.candidate_region = self._candidate_region
+        forked._write_snapshot(self.snapshot())
+        return forked
 
     def activate_network_wide_uncertainty_reduction(self, n, oracle: OracleLightningNetwork):
         """
@@ -22,5 +22,5 @@ setuptools.setup(
     python_requires='>=3.6',
     # py_modules=["pickhardtpayments"],
     package_dir={'': 'pickhardtpayments'},
-    install_requires=["networkx=2.8.8", "ortools=9.3"]
+    install_requires=["networkx=2.8.8", "ortools=9.3", "numpy"]
 )
@@ -0,0 +1,76 @@
+"""
+Checks that the speculative execution of SEQUENTIAL mode gives the same results as making the payments one after the
+other.
+"""
+import json
+import random
+
+import pytest
+
+from pickhardtpayments.ChannelGraph import ChannelGraph
+from pickhardtpayments.OracleLightningNetwork import OracleLightningNetwork
+from pickhardtpayments.PaymentSetRunner import DELIVERY_METHODS, SEQUENTIAL, PaymentSetRunner
+from pickhardtpayments.UncertaintyNetwork import UncertaintyNetwork
+
+NUMBER_OF_NODES = 60
+NUMBER_OF_CHANNELS = 240
+NUMBER_OF_PAYMENTS = 40
+
+
+@pytest.fixture(scope="module")
+def channel_graph(tmp_path_factory):
+    """
+    a random channel graph in which every channel has a return channel
+    """
+    rng = random.Random(7)
+    nodes = ["%066x" % rng.getrandbits(264) for _ in range(NUMBER_OF_NODES)]
+    channels = []
+    for k in range(NUMBER_OF_CHANNELS):
+        # a few hubs make the payments share channels
+        a, b = rng.randrange(NUMBER_OF_NODES), rng.randrange(5)
+        if a == b:
+            continue
+        capacity = rng.randint(50_000, 5_000_000)
+        fee = rng.choice([1, 10, 100, 1000])
+        for src, dest in ((a, b), (b, a)):
+            channels.append({"source": nodes[src], "destination": nodes[dest],
+                             "short_channel_id": "700000x{}x0".format(k), "public": True, "satoshis": capacity,
+                             "amount_msat": "{}msat".format(capacity * 1000), "message_flags": 1,
+                             "channel_flags": int(src > dest), "active": True, "last_update": 1673000000 + k,
+                             "base_fee_millisatoshi": 0, "fee_per_millionth": fee, "delay": 40,
+                             "htlc_minimum_msat": "1000msat", "htlc_maximum_msat": "{}msat".format(capacity * 990),
+                             "features": ""})
+    listchannels = tmp_path_factory.mktemp("graph") / "listchannels.json"
+    listchannels.write_text(json.dumps({"channels": channels}))
+    return ChannelGraph(str(listchannels))
+
+
+@pytest.fixture(scope="module")
+def payments(channel_graph):
+    rng = random.Random(1337)
+    nodes = sorted(channel_graph.network.nodes)
+    return [dict(zip(("sender", "receiver"), rng.sample(nodes, 2)), amount=rng.randint(10_000, 1_000_000))
+            for _ in range(NUMBER_OF_PAYMENTS)]
+
+
+def run(channel_graph, payments, method, max_workers):
+    oracle_network = OracleLightningNetwork(channel_graph)
+    uncertainty_network = UncertaintyNetwork(channel_graph)
+    runner = PaymentSetRunner(oracle_network, uncertainty_network, DELIVERY_METHODS[method], mode=SEQUENTIAL,
+                              max_workers=max_workers, batch_size=6)
+    records = runner.run(payments)
+    state = [getattr(oracle_network.table, column).tolist() for column in oracle_network.STATE_COLUMNS] + \
+            [getattr(uncertainty_network.table, column).tolist() for column in uncertainty_network.STATE_COLUMNS]
+    return records, runner.flows, state, runner.reexecuted
+
+
+@pytest.mark.parametrize("method", ["dijkstra_fee", "pickhardtpay_prob", "retained_knowledge_pickhardtpay_prob"])
+def test_speculative_equals_sequential(channel_graph, payments, method):
+    records, flows, state, _ = run(channel_graph, payments, method, 1)
+    speculative_records, speculative_flows, speculative_state, reexecuted = run(channel_graph, payments, method, 3)
+    assert speculative_records == records
+    assert speculative_flows == flows
+    assert speculative_state == state
+    if DELIVERY_METHODS[method].retain_knowledge:
+        # retained knowledge is never speculated
+        assert reexecuted == 0